@@ -0,0 +1,206 @@
+import argparse
+import concurrent.futures
+import datetime
+import fileutils
+import itertools
+import json
+import multiprocessing
+import nutrition_accessor
+import nutrition_information
+import os
+import sqlite3
+import status
+import storage
+import storage_backend
+
+REPORT_FILE_EXTENSION='.jsonl'
+DEFAULT_USER_REPORT_FILENAME='user' + REPORT_FILE_EXTENSION
+USERS_REPORT_DIRNAME='users'
+# Shards handed to each worker at a time, per worker, so that workers are rarely idle without paying for a round trip per shard.
+CHUNKS_PER_WORKER=4
+
+# Simple class to hold one unit of work for a worker process: the days of a single user between start_date and end_date
+# inclusive, at most a month, read from the data directory at data_dirpath.
+class ReportShard:
+    def __init__(self, data_dirpath, user_name, start_date, end_date, detailed):
+        self.data_dirpath = data_dirpath
+        self.user_name = user_name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.detailed = detailed
+
+# Simple class to hold the outcome of writing the reports of a single user to their output file.
+class UserReport:
+    def __init__(self, user_name, filepath):
+        self.user_name = user_name
+        self.filepath = filepath
+        self.days = 0
+        self.total = nutrition_information.NutritionInformation(0, 0, 0, 0)
+        self.error = None
+
+    # Counts the provided StatusReport towards the summary of the user.
+    def add(self, report):
+        self.days += 1
+        self.total += report.total
+
+    def to_string(self):
+        user_name = 'default user' if self.user_name is None else self.user_name
+        if self.error is not None:
+            return '{0}: FAILED: {1}'.format(user_name, self.error.error())
+        return '{0}: {1} days written to {2}'.format(user_name, self.days, self.filepath)
+
+# Returns the provided date or datetime as a datetime.date, or None if it is None.
+def as_date(date):
+    return None if date is None else datetime.date(date.year, date.month, date.day)
+
+# Returns the last date of the given month.
+def last_day_of_month(year, month):
+    return datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+
+# Returns the ReportShards of the given user, one per month with entries between start_date and end_date inclusive,
+# either of which may be None to leave the range open. Months line up with the partitions of the CSV backend,
+# so that each shard reads a single manifest.
+def user_shards(data_dirpath, user_name, start_date, end_date, detailed):
+    previous_user = fileutils.current_user()
+    fileutils.set_current_user(user_name)
+    try:
+        dates = storage_backend.current().consumption_dates()
+    finally:
+        fileutils.set_current_user(previous_user)
+    months = sorted(set((date.year, date.month) for date in dates
+        if (start_date is None or date >= start_date) and (end_date is None or date <= end_date)))
+    shards = []
+    for year, month in months:
+        shard_start = datetime.date(year, month, 1) if start_date is None else max(datetime.date(year, month, 1), start_date)
+        shard_end = last_day_of_month(year, month) if end_date is None else min(last_day_of_month(year, month), end_date)
+        shards.append(ReportShard(data_dirpath, user_name, shard_start, shard_end, detailed))
+    return shards
+
+# Runs in a worker process. Returns the chronological StatusReports of every day of the shard with entries,
+# or a Status indicating why they could not be read. Day totals come from the daily rollups, and the day files are
+# only read for the per-item breakdown of a detailed report.
+def report_shard(shard):
+    fileutils.set_custom_data_dirpath(shard.data_dirpath)
+    fileutils.set_current_user(shard.user_name)
+    backend = storage_backend.current()
+    try:
+        daily_rollups = backend.daily_rollups(shard.start_date, shard.end_date)
+        if isinstance(daily_rollups, status.Status):
+            return daily_rollups
+        goal_nutrition_info = backend.get_goal_nutrition_information()
+        if isinstance(goal_nutrition_info, status.Status):
+            goal_nutrition_info = None
+        reports = []
+        for date, rollup in daily_rollups:
+            if rollup.entries == 0:
+                continue
+            total = rollup.nutrition_information
+            breakdown = {} if shard.detailed else None
+            if shard.detailed:
+                total = backend.get_daily_nutrition_information(date, breakdown)
+                if isinstance(total, status.Status):
+                    return total
+            reports.append(nutrition_accessor.StatusReport(date, total, goal_nutrition_info, breakdown))
+        return reports
+    except (OSError, sqlite3.Error) as error: # Fails this shard alone rather than the whole pool
+        return status.Status(False, error)
+
+# Generates the StatusReports of the given users, every user with data by default, for each day with entries between
+# start_date and end_date inclusive. The work is split into a shard per user and month, run on a pool of `workers`
+# processes, one per core by default, which each open their own storage backend. Yields a (user name, reports) pair per
+# shard as soon as it and every shard before it are done, users in order and each user's days in chronological order,
+# where reports is a list of StatusReports or a Status indicating why the shard failed.
+def generate_reports(user_names=None, start_date=None, end_date=None, detailed=False, workers=None):
+    data_dirpath = os.path.abspath(fileutils.custom_filepath(''))
+    if user_names is None:
+        user_names = storage_backend.current().user_names()
+    shards = []
+    for user_name in user_names:
+        shards += user_shards(data_dirpath, user_name, as_date(start_date), as_date(end_date), detailed)
+    if len(shards) == 0:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    # Workers are spawned rather than forked, so that they never share the database connections of this process
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        chunksize = max(1, len(shards) // (workers * CHUNKS_PER_WORKER))
+        for shard, reports in zip(shards, executor.map(report_shard, shards, chunksize=chunksize)):
+            yield (shard.user_name, reports)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+# Returns the provided NutritionInformation as a dictionary suitable for JSON, or None if it is None.
+def nutrition_to_json(nutrition_info):
+    if nutrition_info is None:
+        return None
+    return {'calories': nutrition_info.calories, 'carbs': nutrition_info.carbs, 'fats': nutrition_info.fats, 'proteins': nutrition_info.proteins}
+
+# Returns the provided StatusReport as a single line of JSON.
+def report_to_json(report):
+    reply = {'date': fileutils.datetime_to_string(report.date), 'total': nutrition_to_json(report.total),
+        'goal_delta': nutrition_to_json(report.goal_delta())}
+    if report.breakdown is not None:
+        reply['items'] = {name: nutrition_to_json(nutrition_info) for name, nutrition_info in report.breakdown.items()}
+    return json.dumps(reply) + '\n'
+
+# Returns the filepath of the report file of the given user under output_dirpath, e.g. reports/users/alice.jsonl,
+# or reports/user.jsonl for the default user.
+def report_filepath(output_dirpath, user_name):
+    if user_name is None:
+        return os.path.join(output_dirpath, DEFAULT_USER_REPORT_FILENAME)
+    return os.path.join(output_dirpath, USERS_REPORT_DIRNAME, user_name + REPORT_FILE_EXTENSION)
+
+# Writes the reports generated with generate_reports to a file per user under output_dirpath, one line of JSON per day.
+# Each user's reports are streamed to a temporary file as their shards complete, which replaces their report file once
+# all of them are written, so that a report file is never partially written. Users without entries get an empty file.
+# Returns a dictionary mapping each user name to their UserReport.
+def write_reports(output_dirpath, user_names=None, start_date=None, end_date=None, detailed=False, workers=None):
+    if user_names is None:
+        user_names = storage_backend.current().user_names()
+    user_reports = {user_name: UserReport(user_name, report_filepath(output_dirpath, user_name)) for user_name in user_names}
+    for user_name in user_names:
+        fileutils.instantiate_path_if_necessary(os.path.dirname(user_reports[user_name].filepath))
+    for user_name, shard_results in itertools.groupby(generate_reports(user_names, start_date, end_date, detailed, workers), lambda result: result[0]):
+        user_report = user_reports[user_name]
+        with storage.temp_writer(user_report.filepath) as (output, temp_filepath):
+            for _, reports in shard_results:
+                if isinstance(reports, status.Status):
+                    user_report.error = user_report.error or reports
+                    continue
+                for report in reports:
+                    output.write(report_to_json(report))
+                    user_report.add(report)
+        if user_report.error is None:
+            storage.replace(temp_filepath, user_report.filepath)
+        else:
+            storage.remove_if_exists(temp_filepath)
+    for user_report in user_reports.values():
+        if user_report.days == 0 and user_report.error is None:
+            storage.atomic_write(user_report.filepath, '')
+    return user_reports
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes the daily reports of many users at once, one line of JSON per day in a file per user.')
+    parser.add_argument('output_dirpath', help='directory to write user.jsonl and users/<user>.jsonl to')
+    parser.add_argument('--users', help='comma separated user names, every user with data by default, where "-" is the default user')
+    parser.add_argument('--start', help='first date to report, formatted m-d-yyyy')
+    parser.add_argument('--end', help='last date to report, formatted m-d-yyyy')
+    parser.add_argument('--detail', action='store_true', help='include the breakdown of each food item')
+    parser.add_argument('--workers', type=int, help='number of worker processes, one per core by default')
+    args = parser.parse_args()
+    dates = []
+    for date_string in [args.start, args.end]:
+        date = None if date_string is None else fileutils.string_to_datetime(date_string)
+        if date_string is not None and date is None:
+            parser.error('Expected a date formatted m-d-yyyy: {0}'.format(date_string))
+        dates.append(date)
+    user_names = None
+    if args.users is not None:
+        user_names = list(dict.fromkeys(None if user_name == '-' else user_name for user_name in args.users.split(',')))
+        for user_name in user_names:
+            if user_name is not None and not fileutils.valid_user_name(user_name):
+                parser.error('Invalid user name: {0}'.format(user_name))
+    user_reports = write_reports(args.output_dirpath, user_names, dates[0], dates[1], args.detail, args.workers)
+    for user_report in user_reports.values():
+        print(user_report.to_string())
+    raise SystemExit(1 if any(user_report.error is not None for user_report in user_reports.values()) else 0)
\ No newline at end of file
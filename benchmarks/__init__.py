@@ -0,0 +1 @@
+# Reproducible benchmarks of the food and report functions, run with "python -m benchmarks --help" from the repository root.
\ No newline at end of file
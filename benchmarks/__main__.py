@@ -0,0 +1,188 @@
+import argparse
+import columnar_history
+import contextlib
+import datetime
+import fileutils
+import food_processor
+import io
+import nutrition_accessor
+import nutrition_analytics
+import os
+import platform
+import random
+import shutil
+import storage_backend
+import sys
+import tempfile
+from benchmarks import generator
+from benchmarks import harness
+
+BENCHMARKS_DIRPATH=os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_FILEPATH=os.path.join(BENCHMARKS_DIRPATH, 'results.json')
+DEFAULT_BASELINE_FILEPATH=os.path.join(BENCHMARKS_DIRPATH, 'baseline.json')
+IMPORT_ROWS=1000
+
+# Simple class to hold what the benchmark cases of a single catalog size operate on.
+class BenchmarkContext:
+    def __init__(self, size, fooditems, history, seed):
+        self.size = size
+        self.names = list(fooditems)
+        self.dates = [date for date, _ in history]
+        self.rng = random.Random(seed)
+        self.import_filepath = None
+        self.export_filepath = None
+
+    # Returns a random food name from the catalog.
+    def random_name(self):
+        return self.names[self.rng.randrange(len(self.names))]
+
+    # Returns a random date of the history.
+    def random_date(self):
+        return self.dates[self.rng.randrange(len(self.dates))]
+
+    # Returns a random food name with one character dropped, as if mistyped.
+    def mistyped_name(self):
+        name = self.random_name()
+        index = self.rng.randrange(len(name))
+        return name[:index] + name[index + 1:]
+
+# Runs the function with its printed output discarded, as the reports print rather than return.
+def quietly(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+# Writes a file of IMPORT_ROWS food items to import, half of them already in the catalog.
+def write_import_file(context, dirpath):
+    context.import_filepath = os.path.join(dirpath, 'import_foods.csv')
+    with open(context.import_filepath, 'w') as output:
+        for i in range(IMPORT_ROWS):
+            name = context.names[i] if i % 2 == 0 and i < len(context.names) else 'imported_food_{0}'.format(i)
+            output.write('{0},{1},{2},{3},{4}\n'.format(name, 100 + i, 10, 5, 3))
+
+# Returns the (case name, operation(iteration)) pairs to benchmark, in the order they are run.
+def benchmark_cases(context):
+    return [
+        ('load-catalog', lambda i: cold_lookup(context.random_name())),
+        ('get-food', lambda i: food_processor.try_get_food_item(context.random_name())),
+        ('search-prefix', lambda i: food_processor.try_search_food_items(context.random_name()[:4], 10)),
+        ('search-typo', lambda i: food_processor.try_search_food_items(context.mistyped_name(), 10)),
+        ('add-food', lambda i: food_processor.try_add_food_item('benchmark_food_{0}-100-10-5-3'.format(i + 1), True)),
+        ('import-foods', lambda i: food_processor.try_import_food_items(context.import_filepath, True)),
+        ('compact-foods', lambda i: food_processor.compact_food_items()),
+        ('eat', lambda i: food_processor.try_process_food_eaten(context.random_name(), 100, context.random_date())),
+        ('eat-batch-20', lambda i: food_processor.try_process_foods_eaten(
+            [food_processor.resolve_food_eaten(context.random_name(), 100, context.random_date()) for _ in range(20)])),
+        ('set-goal', lambda i: nutrition_accessor.set_goals(2000 + i, 250, 70, 100)),
+        ('report-day', lambda i: quietly(nutrition_accessor.print_status_report, context.random_date(), True)),
+        ('report-month', lambda i: quietly(report_range, context, 30)),
+        ('report-year', lambda i: quietly(report_range, context, 365)),
+        ('export-history', lambda i: columnar_history.export_history(context.export_filepath, food_processor.backend())),
+        ('columnar-year', lambda i: columnar_range(context, 365)),
+    ]
+
+# Looks up a food item through a newly created backend, so that the catalog is loaded from storage.
+def cold_lookup(food_name):
+    backend = storage_backend.create_backend(storage_backend.configured_backend_name())
+    try:
+        return backend.get_food_item(food_name)
+    finally:
+        backend.close()
+
+# Prints the range report of the given number of days ending on a random date of the history.
+def report_range(context, days):
+    end_date = context.random_date()
+    return nutrition_accessor.print_range_report(end_date - datetime.timedelta(days=days - 1), end_date)
+
+# Maps the exported history and totals each day of the given number of days ending on a random date of the history,
+# the columnar counterpart of report_range.
+def columnar_range(context, days):
+    end_date = context.random_date()
+    history = columnar_history.open_history(context.export_filepath)
+    try:
+        return history.date_range(end_date - datetime.timedelta(days=days - 1), end_date).daily_totals()
+    finally:
+        history.close()
+
+# Generates a catalog of the given size and a consumption history in a scratch data directory, then runs
+# every selected case against it. Returns the list of CaseResults.
+def run_size(size, args):
+    dirpath = tempfile.mkdtemp(prefix='food_in_me_benchmark_')
+    fileutils.set_custom_data_dirpath(dirpath)
+    try:
+        print('Generating {0} food items and {1} years of history...'.format(size, args.years))
+        fooditems, history = generator.populate(size, args.years, args.entries_per_day, args.seed)
+        context = BenchmarkContext(size, fooditems, history, args.seed)
+        write_import_file(context, dirpath)
+        context.export_filepath = os.path.join(dirpath, 'history.fim')
+        columnar_history.export_history(context.export_filepath, food_processor.backend())
+        print(harness.header())
+        results = []
+        for case, operation in benchmark_cases(context):
+            if args.cases is not None and case not in args.cases:
+                continue
+            operation(-1) # Warm up caches such as the catalog index, which are otherwise paid for once per process
+            result = harness.measure(case, size, operation, args.iterations, args.max_seconds)
+            print(result.to_string())
+            results.append(result)
+        food_processor.backend().wait_for_background_work()
+        food_processor.backend().close()
+        return results
+    finally:
+        if args.keep:
+            print('Data kept in {0}'.format(dirpath))
+        else:
+            shutil.rmtree(dirpath, ignore_errors=True)
+
+# Returns a description of the environment the benchmarks run in, stored alongside the results.
+def environment(args):
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'numpy': nutrition_analytics.available(),
+        'backend': storage_backend.configured_backend_name(), 'seed': args.seed, 'years': args.years, 'entries_per_day': args.entries_per_day,
+        'date': datetime.datetime.now().isoformat(timespec='seconds')}
+
+# Example invocation: python -m benchmarks --sizes 1000,10000,100000 --baseline benchmarks/baseline.json
+# Generates deterministic catalogs of each size with a multi-year consumption history, times the public functions
+# of food_processor and nutrition_accessor against them, writes the results to JSON and compares them with a baseline.
+# Exits with status 1 if any case regressed past its threshold, or if there is no baseline to compare against, since
+# timings are only comparable on the same machine. Use --update-baseline to store the results as the baseline.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks the food and report functions at several catalog sizes.')
+    parser.add_argument('--sizes', default='1000,10000', help='comma separated catalog sizes, e.g. 1000,10000,100000,1000000')
+    parser.add_argument('--years', type=int, default=2, help='years of consumption history')
+    parser.add_argument('--entries-per-day', type=int, default=6, help='average entries recorded per day of history')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backend', choices=storage_backend.BACKEND_NAMES, help='storage backend, otherwise the configured one')
+    parser.add_argument('--cases', help='comma separated cases to run, all by default')
+    parser.add_argument('--iterations', type=int, default=200, help='maximum iterations per case')
+    parser.add_argument('--max-seconds', type=float, default=2.0, help='time budget per case, once it has run a few iterations')
+    parser.add_argument('--output', default=DEFAULT_RESULTS_FILEPATH)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILEPATH)
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline instead of comparing')
+    parser.add_argument('--throughput-threshold', type=float, default=0.25, help='allowed fractional drop in ops/sec')
+    parser.add_argument('--latency-threshold', type=float, default=0.25, help='allowed fractional growth in p50 latency')
+    parser.add_argument('--tail-latency-threshold', type=float, default=0.5, help='allowed fractional growth in p99 latency')
+    parser.add_argument('--memory-threshold', type=float, default=0.5, help='allowed fractional growth in peak memory')
+    parser.add_argument('--keep', action='store_true', help='keep the generated data directories for inspection')
+    args = parser.parse_args()
+    args.cases = None if args.cases is None else set(args.cases.split(','))
+    if args.backend is not None:
+        os.environ[storage_backend.BACKEND_ENVIRONMENT_VARIABLE] = args.backend
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        results += run_size(size, args)
+    harness.write_results(args.output, environment(args), results)
+    print('Results written to {0}'.format(args.output))
+
+    if args.update_baseline:
+        harness.write_results(args.baseline, environment(args), results)
+        print('Baseline updated at {0}'.format(args.baseline))
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print('No baseline at {0} to compare against. Run with --update-baseline to store one.'.format(args.baseline))
+        sys.exit(1)
+    regressions = harness.compare(harness.read_results(args.baseline), results,
+        args.throughput_threshold, args.latency_threshold, args.tail_latency_threshold, args.memory_threshold)
+    for key, metric, expected, current, change in regressions:
+        print('REGRESSION {0} {1}: {2:.3f} -> {3:.3f} ({4:+.0%})'.format(key, metric, expected, current, change if metric != 'ops_per_sec' else -change))
+    print('{0} regressions against {1}'.format(len(regressions), args.baseline))
+    sys.exit(1 if regressions else 0)
\ No newline at end of file
@@ -0,0 +1,82 @@
+import datetime
+import food_item
+import food_processor
+import random
+import storage
+
+FOOD_WORDS=['apple', 'banana', 'bagel', 'bean', 'beef', 'bread', 'broccoli', 'burrito', 'butter', 'carrot', 'cheese', 'chicken',
+    'chili', 'cod', 'coffee', 'cookie', 'corn', 'cracker', 'curry', 'egg', 'granola', 'grape', 'ham', 'hummus', 'juice', 'kale',
+    'lentil', 'mango', 'milk', 'muffin', 'noodle', 'oatmeal', 'omelette', 'orange', 'pancake', 'pasta', 'peach', 'pear', 'pizza',
+    'pork', 'potato', 'quinoa', 'rice', 'salad', 'salmon', 'sandwich', 'shrimp', 'soup', 'spinach', 'steak', 'taco', 'tofu',
+    'tomato', 'tuna', 'turkey', 'waffle', 'wrap', 'yogurt']
+FOOD_MODIFIERS=['baked', 'boiled', 'brown', 'creamy', 'fried', 'frozen', 'greek', 'grilled', 'homemade', 'lean', 'light', 'low_fat',
+    'organic', 'roasted', 'smoked', 'spicy', 'steamed', 'sweet', 'whole', 'whole_wheat']
+FOOD_DISHES=['bake', 'bar', 'bites', 'bowl', 'burger', 'casserole', 'chips', 'crumble', 'dip', 'fritters', 'hash', 'kebab',
+    'loaf', 'pie', 'platter', 'puree', 'roll', 'scramble', 'skewers', 'smoothie', 'stew', 'stir_fry', 'tart', 'toast']
+CONSUMED_PERCENTS=[25, 50, 75, 100, 100, 100, 150, 200]
+# Most entries are drawn from a small set of favourite foods, as people tend to eat the same things.
+FAVOURITE_FOODS=50
+FAVOURITE_SHARE=0.8
+HISTORY_END_DATE=datetime.date(2024, 12, 31)
+
+# Returns a generated food name, e.g. "smoked_spicy_salmon_rice_bowl_with_kale": a modifier, then an optional second
+# modifier, a food word, an optional second food word, an optional dish and an optional side, each picked independently.
+# That makes hundreds of millions of distinct names, so that even a catalog of millions of food items is made of distinct
+# word combinations, as in a real catalog, rather than of numbered copies of a few names.
+def generate_name(rng):
+    words = [rng.choice(FOOD_MODIFIERS), rng.choice(FOOD_MODIFIERS + ['']), rng.choice(FOOD_WORDS), rng.choice(FOOD_WORDS + ['']),
+        rng.choice(FOOD_DISHES + [''])]
+    side = rng.choice(FOOD_WORDS + [''])
+    if side != '' and side not in words:
+        words += ['with', side]
+    return '_'.join(word for index, word in enumerate(words) if word != '' and word not in words[:index])
+
+# Returns a dictionary of `size` generated food items keyed by name, which is the same for the same size and seed.
+def generate_catalog(size, seed):
+    rng = random.Random(seed)
+    fooditems = {}
+    while len(fooditems) < size:
+        name = generate_name(rng)
+        if name in fooditems:
+            name = '{0}_{1}'.format(name, len(fooditems))
+        fooditems[name] = food_item.FoodItem(name, round(rng.uniform(5, 900), 1), round(rng.uniform(0, 120), 1),
+            round(rng.uniform(0, 60), 1), round(rng.uniform(0, 70), 1))
+    return fooditems
+
+# Returns the dates covered by a history of the given number of years, ending on HISTORY_END_DATE.
+def history_dates(years):
+    start_date = HISTORY_END_DATE - datetime.timedelta(days=365 * years - 1)
+    return [start_date + datetime.timedelta(days=offset) for offset in range(365 * years)]
+
+# Returns a list of (date, [(fooditem, consumed_percent)]) pairs covering every day of the history, which is
+# the same for the same catalog, seed and arguments. Days hold between 1 and 2 * entries_per_day - 1 entries.
+def generate_history(fooditems, years, entries_per_day, seed):
+    rng = random.Random(seed)
+    catalog = list(fooditems.values())
+    favourites = rng.sample(catalog, min(FAVOURITE_FOODS, len(catalog)))
+    history = []
+    for date in history_dates(years):
+        consumptions = []
+        for _ in range(rng.randint(1, 2 * entries_per_day - 1)):
+            fooditem = rng.choice(favourites) if rng.random() < FAVOURITE_SHARE else rng.choice(catalog)
+            consumptions.append((fooditem, rng.choice(CONSUMED_PERCENTS)))
+        history.append((date, consumptions))
+    return history
+
+# Writes a generated catalog of `size` food items and a consumption history for the current user into the
+# configured storage backend of the current data directory, e.g. data/custom_foods.csv and data/user/.
+# Writes are not flushed to disk one by one, since the data can always be generated again.
+# Returns the (food items, history) written.
+def populate(size, years, entries_per_day, seed):
+    fsync = storage.FSYNC
+    storage.FSYNC = False
+    try:
+        fooditems = generate_catalog(size, seed)
+        food_processor.backend().merge_food_items(fooditems, True)
+        history = generate_history(fooditems, years, entries_per_day, seed)
+        for date, consumptions in history:
+            food_processor.process_foods_eaten(date, consumptions)
+        food_processor.backend().wait_for_background_work()
+    finally:
+        storage.FSYNC = fsync
+    return (fooditems, history)
\ No newline at end of file
@@ -0,0 +1,105 @@
+import json
+import time
+import tracemalloc
+
+RESULTS_FORMAT_VERSION=1
+# Every case runs at least this many iterations, however long they take.
+MIN_ITERATIONS=5
+# Peak memory is measured over a separate run of at most this many iterations, as tracing slows everything down.
+MEMORY_ITERATIONS=20
+METRICS=['ops_per_sec', 'p50_ms', 'p99_ms', 'peak_memory_bytes']
+
+# Simple class to hold the measurements of a single benchmark case at a single catalog size.
+class CaseResult:
+    def __init__(self, case, size, latencies, peak_memory_bytes):
+        ordered = sorted(latencies)
+        self.case = case
+        self.size = size
+        self.iterations = len(ordered)
+        self.ops_per_sec = len(ordered) / sum(ordered) if sum(ordered) > 0 else 0.0
+        self.p50_ms = percentile(ordered, 50) * 1000
+        self.p99_ms = percentile(ordered, 99) * 1000
+        self.peak_memory_bytes = peak_memory_bytes
+
+    # Returns the key identifying this case and size across result files.
+    def key(self):
+        return '{0}@{1}'.format(self.case, self.size)
+
+    def to_json(self):
+        return {'case': self.case, 'size': self.size, 'iterations': self.iterations, 'ops_per_sec': self.ops_per_sec,
+            'p50_ms': self.p50_ms, 'p99_ms': self.p99_ms, 'peak_memory_bytes': self.peak_memory_bytes}
+
+    def to_string(self):
+        return '{0:<22} {1:>9} {2:>7} {3:>12.1f} {4:>10.3f} {5:>10.3f} {6:>12}'.format(
+            self.case, self.size, self.iterations, self.ops_per_sec, self.p50_ms, self.p99_ms, self.peak_memory_bytes)
+
+# Returns the header line matching CaseResult.to_string.
+def header():
+    return '{0:<22} {1:>9} {2:>7} {3:>12} {4:>10} {5:>10} {6:>12}'.format(
+        'case', 'size', 'runs', 'ops/sec', 'p50 (ms)', 'p99 (ms)', 'peak bytes')
+
+# Returns the given percentile of an already sorted list of numbers, using the nearest rank.
+def percentile(ordered, percent):
+    if len(ordered) == 0:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))]
+
+# Times operation(iteration) until it has run `iterations` times, or for max_seconds once it has run
+# MIN_ITERATIONS times, then measures the peak memory allocated by a few more runs.
+# Returns a CaseResult.
+def measure(case, size, operation, iterations, max_seconds):
+    latencies = []
+    started = time.perf_counter()
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        operation(iteration)
+        latencies.append(time.perf_counter() - start)
+        if len(latencies) >= MIN_ITERATIONS and time.perf_counter() - started > max_seconds:
+            break
+    tracemalloc.start()
+    try:
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        for iteration in range(len(latencies), len(latencies) + min(len(latencies), MEMORY_ITERATIONS)):
+            operation(iteration)
+        peak_memory_bytes = tracemalloc.get_traced_memory()[1] - baseline_bytes
+    finally:
+        tracemalloc.stop()
+    return CaseResult(case, size, latencies, peak_memory_bytes)
+
+# Writes the results, along with a description of the environment they were measured in, to a JSON file.
+def write_results(filepath, environment, results):
+    with open(filepath, 'w') as output:
+        json.dump({'version': RESULTS_FORMAT_VERSION, 'environment': environment, 'results': [result.to_json() for result in results]},
+            output, indent=2, sort_keys=True)
+        output.write('\n')
+
+# Returns a dictionary mapping each "case@size" key of a results file to its measurements.
+def read_results(filepath):
+    with open(filepath, 'r') as input:
+        contents = json.load(input)
+    return {'{0}@{1}'.format(result['case'], result['size']): result for result in contents['results']}
+
+# Returns the relative change from the baseline value to the current one, e.g. 0.25 for 25% higher.
+def relative_change(baseline_value, current_value):
+    if baseline_value == 0:
+        return 0.0
+    return (current_value - baseline_value) / float(baseline_value)
+
+# Compares the results against the baseline. A result regresses if its throughput dropped, or its p50 latency,
+# p99 latency or peak memory grew, by more than the given fractions. Cases missing from either side are not compared.
+# Returns a list of (key, metric, baseline value, current value, relative change) tuples, one per regression.
+def compare(baseline, results, throughput_threshold, latency_threshold, tail_latency_threshold, memory_threshold):
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.key())
+        if expected is None:
+            continue
+        current = result.to_json()
+        checks = [('ops_per_sec', -relative_change(expected['ops_per_sec'], current['ops_per_sec']), throughput_threshold),
+            ('p50_ms', relative_change(expected['p50_ms'], current['p50_ms']), latency_threshold),
+            ('p99_ms', relative_change(expected['p99_ms'], current['p99_ms']), tail_latency_threshold),
+            ('peak_memory_bytes', relative_change(expected['peak_memory_bytes'], current['peak_memory_bytes']), memory_threshold)]
+        for metric, change, threshold in checks:
+            if change > threshold:
+                regressions.append((result.key(), metric, expected[metric], current[metric], change))
+    return regressions
\ No newline at end of file
@@ -0,0 +1,239 @@
+import array
+import bisect
+import datetime
+import fileutils
+import mmap
+import nutrition_information
+import status
+import storage
+import struct
+import sys
+try:
+    import numpy
+except ImportError: # NumPy is optional, columns are summed with the builtins without it
+    numpy = None
+
+# File layout, every section starting on an 8 byte boundary and every number in the byte order of the writer:
+#   header       magic, format version, byte order, then the number of entries, food names and days
+#   days         one int32 date ordinal per day with entries, ascending
+#   day offsets  days + 1 int64 entry indexes, the entries of days[i] being rows day_offsets[i] to day_offsets[i + 1]
+#   columns      one float64 per entry for each of calories, carbs, fats and proteins, one column after the other
+#   name codes   one uint32 per entry, indexing the food name dictionary
+#   dictionary   names + 1 uint64 byte offsets into the UTF-8 blob of every food name, followed by the blob
+MAGIC=b'FIMCOLS\x00'
+FORMAT_VERSION=1
+HEADER=struct.Struct('<8sIIQQQ')
+BYTE_ORDERS={'little': 1, 'big': 2}
+ALIGNMENT=8
+NUTRIENT_COLUMNS=['calories', 'carbs', 'fats', 'proteins']
+
+# Returns the offset rounded up to the next ALIGNMENT boundary.
+def aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+# Returns a dictionary mapping each section name to its (start, end) byte offsets, for a file with the given counts.
+def section_offsets(entries, names, days):
+    sizes = [('days', 4 * days), ('day_offsets', 8 * (days + 1))]
+    sizes += [(column, 8 * entries) for column in NUTRIENT_COLUMNS]
+    sizes += [('name_codes', 4 * entries), ('name_offsets', 8 * (names + 1))]
+    offsets = {}
+    offset = aligned(HEADER.size)
+    for section, size in sizes:
+        offsets[section] = (offset, offset + size)
+        offset = aligned(offset + size)
+    offsets['name_blob'] = (offset, None)
+    return offsets
+
+# Writes the consumption history of the current user, between start_date and end_date inclusive if provided,
+# from the given storage backend to a columnar file at filepath, replacing it atomically.
+# Returns a (days, entries) tuple of counts exported, or a Status if the file could not be written.
+def export_history(filepath, backend, start_date=None, end_date=None):
+    days = array.array('i')
+    day_offsets = array.array('q', [0])
+    columns = [array.array('d') for _ in NUTRIENT_COLUMNS]
+    name_codes = array.array('I')
+    name_dictionary = {}
+    first_date = datetime.date.min if start_date is None else datetime.date(start_date.year, start_date.month, start_date.day)
+    last_date = datetime.date.max if end_date is None else datetime.date(end_date.year, end_date.month, end_date.day)
+    for date in backend.consumption_dates():
+        if date < first_date or date > last_date:
+            continue
+        batch = backend.consumption_entries(date)
+        if len(batch) == 0:
+            continue
+        for index, column in enumerate(columns):
+            column.extend(batch.values[index::len(NUTRIENT_COLUMNS)])
+        for name in batch.names:
+            name_codes.append(name_dictionary.setdefault(name, len(name_dictionary)))
+        days.append(date.toordinal())
+        day_offsets.append(len(name_codes))
+    encoded_names = [name.encode() for name in name_dictionary]
+    name_offsets = array.array('Q', [0])
+    for encoded_name in encoded_names:
+        name_offsets.append(name_offsets[-1] + len(encoded_name))
+
+    sections = [days, day_offsets] + columns + [name_codes, name_offsets, b''.join(encoded_names)]
+    offsets = section_offsets(len(name_codes), len(encoded_names), len(days))
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDERS[sys.byteorder], len(name_codes), len(encoded_names), len(days))
+    try:
+        with storage.atomic_writer(filepath, 'wb') as output:
+            output.write(header)
+            position = HEADER.size
+            for section in sections:
+                output.write(b'\0' * (aligned(position) - position))
+                position = aligned(position)
+                contents = section.tobytes() if isinstance(section, array.array) else section
+                output.write(contents)
+                position += len(contents)
+    except OSError as error:
+        return status.Status(False, 'Unable to export to {0}: {1}'.format(filepath, error))
+    return (len(days), len(name_codes))
+
+# Memory maps a columnar file written by export_history, see open_history. The file is never parsed: the days,
+# offsets and columns are memoryviews over the mapping, and only the food name dictionary is decoded.
+class ColumnarHistory:
+    def __init__(self, file_object, mapped, entries, names, days):
+        self.file = file_object
+        self.mapped = mapped
+        self.buffer = memoryview(mapped)
+        offsets = section_offsets(entries, names, days)
+        self.days = self.section(offsets, 'days', 'i')
+        self.day_offsets = self.section(offsets, 'day_offsets', 'q')
+        self.columns = {column: self.section(offsets, column, 'd') for column in NUTRIENT_COLUMNS}
+        self.name_codes = self.section(offsets, 'name_codes', 'I')
+        name_offsets = self.section(offsets, 'name_offsets', 'Q')
+        blob_start = offsets['name_blob'][0]
+        self.names = [bytes(self.buffer[blob_start + name_offsets[i]:blob_start + name_offsets[i + 1]]).decode() for i in range(names)]
+        name_offsets.release()
+
+    # Returns a view of the named section, cast to the given array format.
+    def section(self, offsets, section, format):
+        start, end = offsets[section]
+        return self.buffer[start:end].cast(format)
+
+    def __len__(self):
+        return len(self.name_codes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    # Returns the HistorySlice of the days between start_date and end_date inclusive, without copying any entries.
+    def date_range(self, start_date, end_date):
+        first_day = bisect.bisect_left(self.days, datetime.date(start_date.year, start_date.month, start_date.day).toordinal())
+        last_day = bisect.bisect_right(self.days, datetime.date(end_date.year, end_date.month, end_date.day).toordinal())
+        return HistorySlice(self, first_day, max(first_day, last_day))
+
+    # Returns the HistorySlice of every day in the file.
+    def everything(self):
+        return HistorySlice(self, 0, len(self.days))
+
+    # Unmaps the file. Views obtained from the history, such as slices and their columns, cannot be used afterwards.
+    # If any of them are still referenced, the mapping is only released once they are garbage collected.
+    def close(self):
+        for view in [self.days, self.day_offsets, self.name_codes] + list(self.columns.values()) + [self.buffer]:
+            view.release()
+        try:
+            self.mapped.close()
+        except BufferError: # Views are still exported
+            pass
+        self.file.close()
+
+# Opens the columnar file at filepath, written by export_history on a machine of the same byte order.
+# Returns a ColumnarHistory, which should be closed once done, or a Status indicating why the file could not be read.
+def open_history(filepath):
+    try:
+        file_object = fileutils.open_file(filepath, 'rb')
+    except OSError as error:
+        return status.Status(False, 'Unable to open {0}: {1}'.format(filepath, error))
+    try:
+        mapped = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as error: # ValueError for an empty file
+        file_object.close()
+        return status.Status(False, 'Unable to map {0}: {1}'.format(filepath, error))
+    problem = None
+    if len(mapped) < HEADER.size:
+        problem = 'it is too short'
+    else:
+        magic, version, byte_order, entries, names, days = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            problem = 'it is not a consumption history export'
+        elif version != FORMAT_VERSION:
+            problem = 'its format version {0} is not supported'.format(version)
+        elif byte_order != BYTE_ORDERS[sys.byteorder]:
+            problem = 'it was written on a machine of a different byte order'
+        elif section_offsets(entries, names, days)['name_blob'][0] > len(mapped):
+            problem = 'it is truncated'
+    if problem is not None:
+        mapped.close()
+        file_object.close()
+        return status.Status(False, 'Unable to read {0}: {1}.'.format(filepath, problem))
+    return ColumnarHistory(file_object, mapped, entries, names, days)
+
+# The entries of a run of consecutive days of a ColumnarHistory. Columns are views over the mapped file.
+class HistorySlice:
+    def __init__(self, history, first_day, last_day):
+        self.history = history
+        self.days = history.days[first_day:last_day]
+        self.day_offsets = history.day_offsets[first_day:last_day + 1]
+        self.start = self.day_offsets[0] if last_day > first_day else 0
+        self.end = self.day_offsets[-1] if last_day > first_day else 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    # Returns the dates of the slice which have entries, in order.
+    def dates(self):
+        return [datetime.date.fromordinal(day) for day in self.days]
+
+    # Returns a zero-copy view of the named nutrient column, e.g. "calories", one float per entry.
+    def column(self, name):
+        return self.history.columns[name][self.start:self.end]
+
+    # Returns a zero-copy view of the food name codes, one per entry, indexing history.names.
+    def name_codes(self):
+        return self.history.name_codes[self.start:self.end]
+
+    # Returns the named nutrient column as a zero-copy NumPy array. Requires NumPy.
+    def numpy_column(self, name):
+        return numpy.frombuffer(self.column(name), dtype=numpy.float64)
+
+    # Returns the NutritionInformation summing every entry, with NumPy if available.
+    def total(self):
+        if numpy is not None:
+            return nutrition_information.NutritionInformation(*[float(self.numpy_column(column).sum()) for column in NUTRIENT_COLUMNS])
+        return nutrition_information.NutritionInformation(*[sum(self.column(column)) for column in NUTRIENT_COLUMNS])
+
+    # Returns a list of (date, NutritionInformation) pairs summing the entries of each day, in order.
+    def daily_totals(self):
+        if len(self.days) == 0:
+            return []
+        if numpy is not None:
+            starts = numpy.frombuffer(self.day_offsets, dtype=numpy.int64)[:-1] - self.start
+            sums = [numpy.add.reduceat(self.numpy_column(column), starts) for column in NUTRIENT_COLUMNS]
+            return [(date, nutrition_information.NutritionInformation(*[float(column_sums[i]) for column_sums in sums]))
+                for i, date in enumerate(self.dates())]
+        columns = [self.history.columns[column] for column in NUTRIENT_COLUMNS]
+        return [(date, nutrition_information.NutritionInformation(*[sum(column[self.day_offsets[i]:self.day_offsets[i + 1]]) for column in columns]))
+            for i, date in enumerate(self.dates())]
+
+    # Returns a dictionary mapping each food name to the NutritionInformation summing its entries, in order of first appearance.
+    def totals_by_name(self):
+        codes = self.name_codes()
+        if numpy is not None:
+            code_array = numpy.frombuffer(codes, dtype=numpy.uint32)
+            unique_codes, first_index = numpy.unique(code_array, return_index=True)
+            sums = [numpy.bincount(code_array, weights=self.numpy_column(column), minlength=len(self.history.names)) for column in NUTRIENT_COLUMNS]
+            return {self.history.names[code]: nutrition_information.NutritionInformation(*[float(column_sums[code]) for column_sums in sums])
+                for code in unique_codes[numpy.argsort(first_index, kind='stable')].tolist()}
+        sums = {}
+        columns = [self.column(column) for column in NUTRIENT_COLUMNS]
+        for index, code in enumerate(codes):
+            code_sums = sums.get(code)
+            if code_sums is None:
+                code_sums = sums[code] = [0.0] * len(NUTRIENT_COLUMNS)
+            for column_index, column in enumerate(columns):
+                code_sums[column_index] += column[index]
+        return {self.history.names[code]: nutrition_information.NutritionInformation(*code_sums) for code, code_sums in sums.items()}
\ No newline at end of file
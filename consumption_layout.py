@@ -0,0 +1,167 @@
+import datetime
+import fileutils
+import os
+import re
+import shutil
+import storage
+
+DAYS_DIRNAME='days/'
+DAY_FILE_EXTENSION='.csv'
+ISO_DATE_LENGTH=len('yyyy-mm-dd')
+# Day files of the layout before partitioning were named m-d-yyyy.csv, directly in the user's directory,
+# with their rollups in a rollups/ directory alongside them.
+LEGACY_DAY_FILENAME=re.compile('^[0-9]{1,2}-[0-9]{1,2}-[0-9]{4}\\.csv$')
+LEGACY_ROLLUP_DIRNAME='rollups/'
+# Suffix of a legacy day file staged next to the day file it is being merged into, see merge_legacy_day_file.
+STAGED_DAY_FILE_SUFFIX='.legacy'
+
+# Returns the directory path holding the year/month partitions of the current user's day files.
+def days_dirpath():
+    return fileutils.user_consumption_dirpath() + DAYS_DIRNAME
+
+# Returns the directory path of the partition holding the day files of the given month, e.g. days/2024/09/.
+def partition_dirpath(year, month):
+    return '{0}{1:04d}/{2:02d}/'.format(days_dirpath(), year, month)
+
+# Returns the ISO 8601 filename of the day file for the given date, e.g. 2024-09-20.csv, so that names sort chronologically.
+def day_filename(date):
+    return '{0:04d}-{1:02d}-{2:02d}{3}'.format(date.year, date.month, date.day, DAY_FILE_EXTENSION)
+
+# Returns the date named by the provided day filename, or None if it is not the name of a day file.
+def parse_day_filename(filename):
+    if len(filename) != ISO_DATE_LENGTH + len(DAY_FILE_EXTENSION) or not filename.endswith(DAY_FILE_EXTENSION):
+        return None
+    try:
+        return datetime.date.fromisoformat(filename[:ISO_DATE_LENGTH])
+    except ValueError:
+        return None
+
+# Returns the filepath to the current user's day file for the given date, e.g. data/user/days/2024/09/2024-09-20.csv.
+# The partition directory is created if `create` is true, e.g. before appending to the file.
+def day_filepath(date, create=False):
+    dirpath = partition_dirpath(date.year, date.month)
+    if create:
+        fileutils.instantiate_path_if_necessary(dirpath)
+    return dirpath + day_filename(date)
+
+# Returns the sorted numbers naming the subdirectories of dirpath, e.g. the years or months of the partitions.
+def numbered_subdirectories(dirpath):
+    try:
+        return sorted(int(name) for name in os.listdir(dirpath) if name.isdigit())
+    except FileNotFoundError:
+        return []
+
+# Returns the sorted (year, month) partitions of the current user which exist and overlap start_date to end_date
+# inclusive, listing one directory per year rather than probing every month.
+def partitions_between(start_date, end_date):
+    root_dirpath = days_dirpath()
+    partitions = []
+    for year in numbered_subdirectories(root_dirpath):
+        if year < start_date.year or year > end_date.year:
+            continue
+        for month in numbered_subdirectories('{0}{1:04d}/'.format(root_dirpath, year)):
+            if (start_date.year, start_date.month) <= (year, month) <= (end_date.year, end_date.month):
+                partitions.append((year, month))
+    return partitions
+
+# Returns the sorted dates which have a day file in the given partition of the current user.
+def partition_dates(year, month):
+    try:
+        filenames = os.listdir(partition_dirpath(year, month))
+    except FileNotFoundError:
+        return []
+    dates = [parse_day_filename(filename) for filename in filenames]
+    return sorted(date for date in dates if date is not None and date.year == year and date.month == month)
+
+# Returns the sorted dates between start_date and end_date inclusive which have a day file for the current user.
+# Only the partitions which exist are listed, so days without entries cost nothing.
+def dates_between(start_date, end_date):
+    first_date = datetime.date(start_date.year, start_date.month, start_date.day)
+    last_date = datetime.date(end_date.year, end_date.month, end_date.day)
+    dates = []
+    for year, month in partitions_between(first_date, last_date):
+        dates += [date for date in partition_dates(year, month) if first_date <= date <= last_date]
+    return dates
+
+# Returns the sorted dates which have a day file for the current user.
+def consumption_dates():
+    return dates_between(datetime.date.min, datetime.date.max)
+
+# Returns the filepath the current user's day file for the given date had in the flat layout, e.g. data/user/9-20-2024.csv.
+def legacy_day_filepath(date):
+    return fileutils.user_consumption_dirpath() + fileutils.datetime_to_string(date, DAY_FILE_EXTENSION)
+
+# Returns the sorted filenames of the current user's day files which are still in the flat layout.
+def legacy_day_filenames():
+    return sorted(filename for filename in os.listdir(fileutils.user_consumption_dirpath()) if LEGACY_DAY_FILENAME.match(filename))
+
+# Returns the (date, filepath, offset) of every staged legacy day file left in the current user's partitions by an
+# interrupted migration, in date order, see merge_legacy_day_file.
+def staged_day_files():
+    staged = []
+    for dirpath, _, filenames in os.walk(days_dirpath()):
+        for filename in filenames:
+            if not filename.endswith(STAGED_DAY_FILE_SUFFIX):
+                continue
+            day_filename, _, offset = filename[:-len(STAGED_DAY_FILE_SUFFIX)].rpartition('.')
+            date = parse_day_filename(day_filename)
+            if date is not None and offset.isdigit():
+                staged.append((date, os.path.join(dirpath, filename), int(offset)))
+    return sorted(staged)
+
+# Appends the entries of the staged legacy day file at staged_filepath to the day file at target_filepath, open as
+# output through storage.locked_appender, unless they were already appended at offset before an interruption.
+# Then removes the staged file.
+def append_staged_day_file(output, target_filepath, staged_filepath, offset):
+    with fileutils.open_file(staged_filepath, 'rb') as staged_input:
+        contents = staged_input.read()
+    with fileutils.open_file(target_filepath, 'rb') as day_input:
+        day_input.seek(offset)
+        appended = day_input.read(len(contents))
+    if appended != contents:
+        output.write(contents)
+        storage.sync(output)
+    os.remove(staged_filepath)
+
+# Appends the entries of the legacy day file at legacy_filepath to the day file at target_filepath, under the same
+# locks as storage.append so that concurrent appends are never lost. The legacy file is first moved next to the day
+# file, named after the day file's size, e.g. 2024-09-20.csv.512.legacy, so that an interrupted migration knows where
+# its entries belong and never appends them twice, see staged_day_files.
+def merge_legacy_day_file(legacy_filepath, target_filepath):
+    with storage.locked_appender(target_filepath) as output:
+        offset = os.fstat(output.fileno()).st_size
+        staged_filepath = '{0}.{1}{2}'.format(target_filepath, offset, STAGED_DAY_FILE_SUFFIX)
+        os.replace(legacy_filepath, staged_filepath)
+        storage.sync_directory(os.path.dirname(target_filepath))
+        append_staged_day_file(output, target_filepath, staged_filepath, offset)
+
+# Moves the current user's day files from the flat layout into their partitions, and removes the rollups stored
+# alongside them. Each file is hard linked into place and then unlinked, so that a day file which already exists
+# in its partition is never overwritten: the legacy entries are appended to it instead, see merge_legacy_day_file.
+# Running the migration again after an interruption picks up where it stopped without recording any entry twice.
+# Returns the sorted dates of the day files moved, including those of merges completed after an interruption,
+# whose rollups the caller rebuilds.
+def migrate_legacy_day_files():
+    dirpath = fileutils.user_consumption_dirpath()
+    migrated = set()
+    for date, staged_filepath, offset in staged_day_files():
+        with storage.locked_appender(day_filepath(date)) as output:
+            append_staged_day_file(output, day_filepath(date), staged_filepath, offset)
+        migrated.add(date)
+    for filename in legacy_day_filenames():
+        date = fileutils.string_to_datetime(filename[:-len(DAY_FILE_EXTENSION)])
+        if date is None:
+            continue
+        legacy_filepath = dirpath + filename
+        target_filepath = day_filepath(date, True)
+        try:
+            os.link(legacy_filepath, target_filepath)
+            os.remove(legacy_filepath)
+        except FileExistsError:
+            if os.path.samefile(legacy_filepath, target_filepath): # Linked before an interruption
+                os.remove(legacy_filepath)
+            else:
+                merge_legacy_day_file(legacy_filepath, target_filepath)
+        migrated.add(date.date())
+    shutil.rmtree(dirpath + LEGACY_ROLLUP_DIRNAME, ignore_errors=True)
+    return sorted(migrated)
\ No newline at end of file
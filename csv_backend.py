@@ -0,0 +1,282 @@
+import collections
+import consumption_layout
+import fileutils
+import food_catalog
+import food_item
+import nutrition_analytics
+import nutrition_batch
+import nutrition_information
+import nutrition_rollup
+import os
+import recipes
+import status
+import storage
+import threading
+
+CUSTOM_FOOD_ITEM_FILENAME='custom_foods.csv'
+RECIPES_FILENAME='recipes.csv'
+USER_GOAL_FILENAME='goals.csv'
+USER_TRENDS_FILENAME='trends.csv'
+# Number of recently read day summaries and goals kept in memory, see CsvBackend.cached.
+MAX_CACHED_FILES=256
+
+# Returns the filepath to the user's nutrition goals.
+def goals_filepath():
+    return fileutils.user_consumption_dirpath() + USER_GOAL_FILENAME
+
+# Returns the filepath to the user's goal trends state, see goal_trends.
+def trends_filepath():
+    return fileutils.user_consumption_dirpath() + USER_TRENDS_FILENAME
+
+# Returns the filepath to the recipes, shared by every user like the food items.
+def recipes_filepath():
+    return fileutils.custom_filepath(RECIPES_FILENAME)
+
+# Returns the filepath to the user's day file for the given date, see consumption_layout.day_filepath.
+def day_filepath(date, create=False):
+    return consumption_layout.day_filepath(date, create)
+
+# Returns an (inode, modification time, size) tuple identifying the current state of the file at filepath,
+# or None if the file does not exist. Day files only grow, and goals are replaced by renaming a new file over them,
+# so either the size or the inode changes even when two writes land within the same timestamp tick.
+def file_signature(filepath):
+    try:
+        file_stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+# Returns a (NutritionInformation, {food name: NutritionInformation}) pair of the total and the per-item breakdown
+# of the day file at filepath, or a Status indicating the line which could not be parsed.
+def read_day_summary(filepath):
+    if nutrition_analytics.available():
+        with fileutils.open_file(filepath, 'r') as input:
+            entries = nutrition_analytics.parse_day_contents(input.read())
+        if entries is not None:
+            return (nutrition_analytics.totals(entries), nutrition_analytics.breakdown_by_item(entries))
+        # Otherwise fall through to the line by line path, which reports the offending line
+
+    batch = nutrition_batch.NutritionBatch()
+    with fileutils.open_file(filepath, 'r') as input:
+        for line in input:
+            if line == '': continue # Skip empty lines
+            fooditem = food_item.parse_food_item(line.strip(), ',')
+            if fooditem is None:
+                return status.Status(False, 'Failed to parse "{0}" from data/custom_foods.csv as a food item'.format(line.strip()))
+            batch.append(fooditem.name, fooditem.nutrition_information)
+    return (batch.total(), batch.totals_by_name())
+
+# Returns a NutritionInformation object of the goals stored in the file at filepath, or a Status if they are invalid.
+def read_goals(filepath):
+    with fileutils.open_file(filepath, 'r') as input:
+        goal_text = input.readline()
+    try:
+        numbers = goal_text.split(',')
+        goal_calories = float(numbers[0])
+        goal_carbs = float(numbers[1])
+        goal_fats = float(numbers[2])
+        goal_proteins = float(numbers[3])
+    except:
+        return status.Status(False, 'Invalid goal file. Reset your nutrition goal with the "set-goal" command.')
+    return nutrition_information.NutritionInformation(goal_calories, goal_carbs, goal_fats, goal_proteins)
+
+# Stores all data as plain CSV files under data/: the food catalog in custom_foods.csv (plus its change log),
+# and each user's consumption in one file per day, partitioned by year and month with a manifest of daily rollups
+# per month (see consumption_layout and nutrition_rollup), alongside their goals.csv.
+class CsvBackend:
+    def __init__(self):
+        self.catalog = food_catalog.FoodCatalog(CUSTOM_FOOD_ITEM_FILENAME)
+        self.file_cache = collections.OrderedDict()
+        self.file_cache_lock = threading.Lock()
+
+    # If the custom food file does not already exist, create it and fill out the first CSV line.
+    def instantiate_custom_food_file_if_necessary(self):
+        dirpath = fileutils.custom_filepath('')
+        fileutils.instantiate_path_if_necessary(dirpath)
+        if not os.path.exists(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME)):
+            try:
+                with fileutils.open_file(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME), 'x') as file_output:
+                    file_output.write(food_item.CSV_HEADER + '\n')
+            except FileExistsError: # Created by another process between check and create
+                pass
+
+    # Loads the food catalog and its search index into memory ahead of the first request.
+    def warm(self):
+        self.catalog.search('', 0)
+
+    # Returns the value read from the file at filepath with read(filepath), reusing the value read before while the
+    # file is unchanged, so that a long-running process keeps the goals and recent day summaries of its users warm.
+    # Errors are not kept, and only the MAX_CACHED_FILES most recently used values are.
+    def cached(self, filepath, read):
+        signature = file_signature(filepath)
+        with self.file_cache_lock:
+            cached_entry = self.file_cache.get(filepath)
+            if cached_entry is not None and cached_entry[0] == signature:
+                self.file_cache.move_to_end(filepath)
+                return cached_entry[1]
+        value = read(filepath)
+        if signature is not None and not isinstance(value, status.Status):
+            with self.file_cache_lock:
+                self.file_cache[filepath] = (signature, value)
+                self.file_cache.move_to_end(filepath)
+                while len(self.file_cache) > MAX_CACHED_FILES:
+                    self.file_cache.popitem(last=False)
+        return value
+
+    # Waits for any background work, such as catalog compaction, to finish.
+    def wait_for_background_work(self):
+        self.catalog.wait_for_compaction()
+
+    # Returns the food item with the given food_name, or None if it does not exist.
+    def get_food_item(self, food_name):
+        return self.catalog.get(food_name)
+
+    # Returns whether the food item with the given food_name exists in the catalog.
+    def food_item_exists(self, food_name):
+        return self.catalog.contains(food_name)
+
+    # Returns every food item in the catalog.
+    def food_items(self):
+        self.catalog.refresh_if_necessary()
+        return list(self.catalog.items.values())
+
+    # Returns up to limit food items whose names match the query, ranked best first.
+    def search_food_items(self, query, limit):
+        return self.catalog.search(query, limit)
+
+    # Appends the provided food item to the catalog.
+    def add_food_item(self, fooditem):
+        self.instantiate_custom_food_file_if_necessary()
+        return self.catalog.add(fooditem)
+
+    # Replaces the values of an existing food item.
+    def replace_food_item(self, fooditem):
+        return self.catalog.replace(fooditem)
+
+    # Removes the food item with the given food_name from the catalog.
+    def remove_food_item(self, food_name):
+        return self.catalog.remove(food_name)
+
+    # Merges the provided dictionary of food items, keyed by name, into the catalog with a single atomic rewrite.
+    # See FoodCatalog.merge.
+    def merge_food_items(self, fooditems, overwrite):
+        self.instantiate_custom_food_file_if_necessary()
+        return self.catalog.merge(fooditems, overwrite)
+
+    # Folds the catalog change log back into the custom food item file.
+    def compact_food_items(self):
+        return self.catalog.compact()
+
+    # Returns a value which changes whenever a food item or recipe is added, changed or removed by any process.
+    def recipes_version(self):
+        return (self.catalog.version(), fileutils.file_signature(recipes_filepath()))
+
+    # Returns every recipe, see recipes.Recipe. Malformed lines are skipped.
+    def recipes(self):
+        try:
+            with fileutils.open_file(recipes_filepath(), 'r') as input:
+                parsed_recipes = [recipes.parse_recipe(line) for line in input if line.strip() != '']
+        except FileNotFoundError:
+            return []
+        return [recipe for recipe in parsed_recipes if recipe is not None]
+
+    # Stores the provided recipe, replacing any recipe of the same name, with an atomic rewrite of the recipes file.
+    def save_recipe(self, recipe):
+        fileutils.instantiate_path_if_necessary(fileutils.custom_filepath(''))
+        with storage.locked(recipes_filepath()):
+            saved_recipes = {saved_recipe.name: saved_recipe for saved_recipe in self.recipes()}
+            saved_recipes[recipe.name] = recipe
+            storage.atomic_write(recipes_filepath(), ''.join(saved_recipe.to_csv() + '\n' for saved_recipe in saved_recipes.values()))
+
+    # Appends each of the given (consumed food item name, NutritionInformation) pairs to the user's day file
+    # for consumed_date, opening and appending to the file once for all of them. Concurrent calls for the same
+    # day file are coalesced into a single locked write, see storage.append.
+    def record_foods_eaten(self, consumed_date, consumptions):
+        output_str = ''
+        consumed_total = nutrition_information.NutritionInformation(0, 0, 0, 0)
+        for food_name, consumed in consumptions:
+            output_str += '{0},{1},{2},{3},{4}\n'.format(food_name, consumed.calories, consumed.carbs, consumed.fats, consumed.proteins)
+            consumed_total += consumed
+        storage.append(day_filepath(consumed_date, True), output_str, (consumed_total, len(consumptions)),
+            nutrition_rollup.rollup_updater(consumed_date))
+
+    # Returns a NutritionInformation object aggregating the food consumed on the provided date,
+    # or an error status indicating a failed precondition.
+    # If detailed_results is provided as an empty dictionary, each individual item name will be added.
+    def get_daily_nutrition_information(self, status_date, detailed_results=None):
+        status_filepath = day_filepath(status_date)
+        if not os.path.exists(status_filepath):
+            if os.path.exists(consumption_layout.legacy_day_filepath(status_date)):
+                return status.Status(False, 'The entries for {0} are stored in the old layout. Run "migrate-layout" to move them.'.format(
+                    fileutils.datetime_to_string(status_date)))
+            return status.Status(False, 'No entries recorded for {0}'.format(fileutils.datetime_to_string(status_date)))
+        summary = self.cached(status_filepath, read_day_summary)
+        if isinstance(summary, status.Status):
+            return summary
+        total, breakdown = summary
+        if detailed_results is not None:
+            detailed_results.update(breakdown)
+        return total
+
+    # Returns the chronological (date, DailyRollup) pairs of every day between start_date and end_date inclusive
+    # which has entries, read from the materialized daily rollups. See nutrition_rollup.daily_rollups.
+    def daily_rollups(self, start_date, end_date):
+        return nutrition_rollup.daily_rollups(start_date, end_date)
+
+    # Returns the (daily, weekly, monthly, overall) summaries between start_date and end_date inclusive,
+    # read from the materialized daily rollups. See nutrition_rollup.summarize_range.
+    def summarize_range(self, start_date, end_date):
+        return nutrition_rollup.summarize_range(start_date, end_date)
+
+    # Sets the daily goal nutritional values for the user, overriding the previous entry if applicable.
+    def set_goals(self, calories, carbs, fats, proteins):
+        daily_goal = '{0},{1},{2},{3}'.format(calories, carbs, fats, proteins)
+        storage.atomic_write(goals_filepath(), daily_goal)
+
+    # Returns a NutritionInformation object representing the daily nutrition goals of the user,
+    # or a Status object indicating that information could not be retrieved.
+    def get_goal_nutrition_information(self):
+        goal_filepath = goals_filepath()
+        if not os.path.exists(goal_filepath):
+            return status.Status(False, 'Missing goal file. Consider setting your nutrition goals with the "set-goal" command.')
+        return self.cached(goal_filepath, read_goals)
+
+    # Replaces the user's goal trends state, see goal_trends, with update(state) under the lock of the trends file.
+    # update receives the stored state, or None if there is none, and returns the new state or None to leave it as is.
+    def update_trends(self, update):
+        filepath = trends_filepath()
+        with storage.locked(filepath):
+            try:
+                with fileutils.open_file(filepath, 'r') as input:
+                    state = input.read()
+            except FileNotFoundError:
+                state = None
+            updated_state = update(state)
+            if updated_state is not None and updated_state != state:
+                storage.atomic_write(filepath, updated_state)
+
+    # Returns the names of every user with data, where None is the default single user in data/user/.
+    def user_names(self):
+        user_names = [None]
+        users_dirpath = fileutils.custom_filepath(fileutils.USERS_FILEPATH)
+        if os.path.isdir(users_dirpath):
+            user_names += sorted(name for name in os.listdir(users_dirpath) if fileutils.valid_user_name(name))
+        return user_names
+
+    # Returns the sorted dates which have a day file for the current user.
+    def consumption_dates(self):
+        return consumption_layout.consumption_dates()
+
+    # Returns a NutritionBatch of the entries recorded for the current user on the given date, in order.
+    def consumption_entries(self, date):
+        batch = nutrition_batch.NutritionBatch()
+        with fileutils.open_file(day_filepath(date), 'r') as input:
+            for line in input:
+                fooditem = food_item.parse_food_item(line.strip(), ',')
+                if fooditem is not None:
+                    batch.append(fooditem.name, fooditem.nutrition_information)
+        return batch
+
+    # Waits for background work, since there is nothing else to release.
+    def close(self):
+        self.wait_for_background_work()
\ No newline at end of file
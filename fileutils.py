@@ -1,9 +1,17 @@
 import datetime
+import instrumentation
 import os
+import re
 import status
+import threading
 
 CUSTOM_DATA_FILEPATH='data/'
 USER_CONSUMPTION_FILEPATH='user/'
+USERS_FILEPATH='users/'
+VALID_USER_NAME=re.compile('^[A-Za-z0-9_.-]{1,64}$')
+
+# Holds the user whose consumption data is accessed by the current thread, see set_current_user.
+CURRENT_USER=threading.local()
 
 # Returns the filepath to the provided path string, relative to the script's directory.
 def custom_filepath(path):
@@ -11,6 +19,25 @@ def custom_filepath(path):
     filepath = os.path.join(path_directory, CUSTOM_DATA_FILEPATH + path)
     return filepath
 
+# Points every data file read and write at dirpath instead of the data/ directory next to the scripts,
+# e.g. to run a benchmark or stress test against a scratch directory.
+def set_custom_data_dirpath(dirpath):
+    global CUSTOM_DATA_FILEPATH
+    CUSTOM_DATA_FILEPATH = os.path.join(dirpath, '')
+
+# Returns an (inode, modification time, size) tuple identifying the current contents of the file at filepath,
+# or None if it does not exist.
+def file_signature(filepath):
+    try:
+        file_stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+# Opens the file at filepath, counting the open and the data read and written if instrumentation is enabled.
+def open_file(filepath, mode='r'):
+    return instrumentation.counted(open(filepath, mode))
+
 # Creates a directory path to dirpath if it does not already exist.
 def instantiate_path_if_necessary(dirpath):
     if not os.path.exists(dirpath):
@@ -19,9 +46,28 @@ def instantiate_path_if_necessary(dirpath):
         except FileExistsError: #Dirpath exists betweeen check and create
             pass
 
+# Returns whether user_name can safely be used as the name of a user's data directory.
+def valid_user_name(user_name):
+    return VALID_USER_NAME.match(user_name) is not None and user_name not in ('.', '..')
+
+# Selects whose consumption data the current thread reads and writes. None selects the default,
+# single user directory data/user/, while any other valid name selects data/users/<user_name>/.
+def set_current_user(user_name):
+    if user_name is not None and not valid_user_name(user_name):
+        raise ValueError('Invalid user name: {0}'.format(user_name))
+    CURRENT_USER.name = user_name
+
+# Returns the name of the user selected for the current thread, or None for the default user.
+def current_user():
+    return getattr(CURRENT_USER, 'name', None)
+
 # Returns the directory path to the user provided custom data, instantiating if necessary.
 def user_consumption_dirpath():
-    dirpath = custom_filepath(USER_CONSUMPTION_FILEPATH)
+    user_name = current_user()
+    if user_name is None:
+        dirpath = custom_filepath(USER_CONSUMPTION_FILEPATH)
+    else:
+        dirpath = custom_filepath(USERS_FILEPATH + user_name + '/')
     instantiate_path_if_necessary(dirpath)
     return dirpath
 
@@ -31,14 +77,25 @@ def datetime_to_string(date, suffix=''):
     date_string = '{0}-{1}-{2}'.format(date.month, date.day, date.year)
     return date_string + suffix
 
-# Securely replaces the previous_file with the contents of overwriting_file using a backup.
-# Both filenames are relative to the custom_filepath root directory.
+# Converts the provided string formatted mm-dd-yyyy into a datetime object, or returns None if it is invalid.
+def string_to_datetime(string):
+    d = string.split('-')
+    if len(d) != 3:
+        return None
+    try:
+        month = int(d[0])
+        day = int(d[1])
+        year = int(d[2])
+        return datetime.datetime(year, month, day)
+    except:
+        return None
+
+# Atomically replaces the previous_file with the contents of overwriting_file, so that readers see either
+# the old or the new contents. Both filenames are relative to the custom_filepath root directory.
 # Returns a Status indicating whether the operation succeeded.
 def replace_file(previous_file, overwriting_file):
     try:
-        os.rename(custom_filepath(previous_file), custom_filepath('backup.csv'))
-        os.rename(custom_filepath(overwriting_file), custom_filepath(previous_file))
-        os.remove(custom_filepath('backup.csv'))
+        os.replace(custom_filepath(overwriting_file), custom_filepath(previous_file))
         return status.Status(True)
     except Exception as error:
         return status.Status(False, error)
\ No newline at end of file
@@ -0,0 +1,328 @@
+import fileutils
+import food_item
+import food_search
+import instrumentation
+import os
+import status
+import storage
+import threading
+
+LOG_EXTENSION='.log'
+UPSERT_RECORD='+'
+TOMBSTONE_RECORD='-'
+# The change log is folded back into the catalog file once it grows past COMPACTION_LOG_BYTES,
+# or once COMPACTION_GARBAGE_RATIO of all stored rows are overwritten or deleted entries.
+COMPACTION_LOG_BYTES=1024 * 1024
+COMPACTION_GARBAGE_RATIO=0.5
+COMPACTION_MIN_ROWS=1000
+
+# In-memory index of the custom food catalog, keyed by food name.
+# The catalog consists of the canonical CSV file plus an append-only change log of upserts and
+# tombstones, where the last write for a name wins. The catalog file is loaded once and the log
+# is replayed incrementally, so that lookups and writes do not need to rescan or rewrite the whole file.
+class FoodCatalog:
+    def __init__(self, filename, background_compaction=True):
+        self.filename = filename
+        self.log_filename = os.path.splitext(filename)[0] + LOG_EXTENSION
+        self.background_compaction = background_compaction
+        self.items = {}
+        self.signature = None
+        self.log_offset = 0
+        self.stored_rows = 0
+        # (name, line) pairs of the catalog file rows which are not in the index, see load.
+        self.preserved_lines = []
+        self.lock = threading.RLock()
+        self.compaction_thread = None
+        self.search_index = None
+
+    # Returns the absolute filepath to the catalog file.
+    def filepath(self):
+        return fileutils.custom_filepath(self.filename)
+
+    # Returns the absolute filepath to the catalog change log.
+    def log_filepath(self):
+        return fileutils.custom_filepath(self.log_filename)
+
+    # Returns a (modification time, size) pair identifying the current state of the catalog file,
+    # or None if the file does not exist.
+    def file_signature(self):
+        try:
+            file_stat = os.stat(self.filepath())
+        except FileNotFoundError:
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    # Returns the current size of the change log in bytes.
+    def log_size(self):
+        try:
+            return os.path.getsize(self.log_filepath())
+        except FileNotFoundError:
+            return 0
+
+    # Rebuilds the name index from the catalog file and the full change log. If a name appears more than once
+    # in the catalog file, the first entry is kept. Rows which cannot be parsed, and the later rows of a name,
+    # are kept aside as preserved lines, with a name of None for the former, so that rewriting the catalog file
+    # never silently drops them, see write_snapshot.
+    def load(self):
+        items = {}
+        preserved_lines = []
+        stored_rows = 0
+        signature = self.file_signature()
+        if signature is not None:
+            with fileutils.open_file(self.filepath(), 'r') as file_input:
+                for line in file_input:
+                    line = line.strip()
+                    if line == '' or line == food_item.CSV_HEADER:
+                        continue
+                    fooditem = food_item.parse_food_item(line, ',')
+                    if fooditem is None:
+                        preserved_lines.append((None, line))
+                    elif fooditem.name in items:
+                        preserved_lines.append((fooditem.name, line))
+                    else:
+                        items[fooditem.name] = fooditem
+                        stored_rows += 1
+        self.items = items
+        self.preserved_lines = preserved_lines
+        self.signature = signature
+        self.log_offset = 0
+        self.stored_rows = stored_rows
+        self.search_index = None # Rebuilt on the next search
+        self.replay_log()
+
+    # Applies every complete change log record written after the last replayed offset.
+    def replay_log(self):
+        if not os.path.exists(self.log_filepath()):
+            return
+        with fileutils.open_file(self.log_filepath(), 'rb') as log_input:
+            log_input.seek(self.log_offset)
+            pending = log_input.read()
+        complete = pending[:pending.rfind(b'\n') + 1] # Ignore a partially written trailing record
+        lines = complete.decode().splitlines()
+        instrumentation.count(instrumentation.LINES_PARSED, len(lines))
+        for line in lines:
+            self.apply_record(line)
+        self.log_offset += len(complete)
+
+    # Applies a single change log record to the index.
+    def apply_record(self, line):
+        record = line.split(',', 1)
+        if len(record) != 2:
+            return
+        if record[0] == UPSERT_RECORD:
+            fooditem = food_item.parse_food_item(record[1], ',')
+            if fooditem is None:
+                return
+            self.items[fooditem.name] = fooditem
+            if self.search_index is not None:
+                self.search_index.add(fooditem.name)
+        elif record[0] == TOMBSTONE_RECORD:
+            self.items.pop(record[1], None)
+            if self.search_index is not None:
+                self.search_index.remove(record[1])
+        else:
+            return
+        self.stored_rows += 1
+
+    # Returns whether the catalog file or change log have changed since they were last read.
+    def changed(self):
+        return self.file_signature() != self.signature or self.log_size() != self.log_offset
+
+    # Reloads the index if the catalog file has changed since it was last read, or replays any
+    # change log records appended since then. Unchanged catalogs are checked without taking the
+    # file lock, while changes are read under it so that a concurrent compaction is never observed halfway.
+    def refresh_if_necessary(self):
+        with self.lock:
+            if not self.changed():
+                return
+            with storage.locked(self.filepath()):
+                if self.file_signature() != self.signature or self.log_size() < self.log_offset:
+                    self.load()
+                elif self.log_size() > self.log_offset:
+                    self.replay_log()
+
+    # Appends a record to the change log and applies it, along with any records written by others.
+    def append_record(self, record):
+        with self.lock:
+            with storage.locked(self.filepath()):
+                self.refresh_if_necessary()
+                with fileutils.open_file(self.log_filepath(), 'a') as log_output:
+                    log_output.write(record + '\n')
+                    storage.sync(log_output)
+                self.replay_log()
+        self.compact_if_necessary()
+        return status.Status(True)
+
+    # Returns a value which changes whenever the catalog is changed by any process, i.e. the signature of the
+    # catalog file along with how much of the change log has been applied.
+    def version(self):
+        with self.lock:
+            self.refresh_if_necessary()
+            return (self.signature, self.log_offset)
+
+    # Returns whether the food item with the given food_name exists in the catalog.
+    def contains(self, food_name):
+        self.refresh_if_necessary()
+        return food_name in self.items
+
+    # Returns the food item with the given food_name, or None if it does not exist.
+    def get(self, food_name):
+        self.refresh_if_necessary()
+        return self.items.get(food_name)
+
+    # Returns up to limit food items whose names match the query, ranked best first, see food_search.
+    # The search index is built on the first search and then kept up to date as records are applied.
+    def search(self, query, limit):
+        with self.lock:
+            self.refresh_if_necessary()
+            if self.search_index is None:
+                self.search_index = food_search.FoodSearchIndex(self.items)
+            return [self.items[name] for name in self.search_index.search(query, limit)]
+
+    # Adds the provided food item to the catalog.
+    def add(self, fooditem):
+        return self.append_record('{0},{1}'.format(UPSERT_RECORD, fooditem.to_csv()))
+
+    # Replaces the values of an existing food item.
+    # Returns a Status indicating whether the operation succeeded.
+    def replace(self, fooditem):
+        with self.lock:
+            self.refresh_if_necessary()
+            if self.signature is None and self.log_offset == 0:
+                return status.Status(False, 'List of food items cannot be found. Add food items with the "add-food" command.')
+            if fooditem.name not in self.items:
+                return status.Status(False, 'Food item {0} was not found and could not be replaced.'.format(fooditem.name))
+            return self.append_record('{0},{1}'.format(UPSERT_RECORD, fooditem.to_csv()))
+
+    # Removes the food item with the given food_name from the catalog.
+    # Returns a Status indicating whether the operation succeeded.
+    def remove(self, food_name):
+        with self.lock:
+            if not self.contains(food_name):
+                return status.Status(False, 'Food item {0} was not found and could not be removed.'.format(food_name))
+            return self.append_record('{0},{1}'.format(TOMBSTONE_RECORD, food_name))
+
+    # Returns whether the change log has grown large or wasteful enough to be compacted.
+    def needs_compaction(self):
+        if self.log_offset == 0:
+            return False
+        if self.log_offset >= COMPACTION_LOG_BYTES:
+            return True
+        garbage_rows = self.stored_rows - len(self.items)
+        return self.stored_rows >= COMPACTION_MIN_ROWS and garbage_rows >= self.stored_rows * COMPACTION_GARBAGE_RATIO
+
+    # Starts compacting the change log on a background thread if the thresholds have been crossed.
+    # The thread is not a daemon, so a short-lived process finishes the compaction before exiting.
+    def compact_if_necessary(self):
+        with self.lock:
+            if not self.needs_compaction():
+                return
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return
+            if not self.background_compaction:
+                self.compact()
+                return
+            self.compaction_thread = threading.Thread(target=self.compact)
+            self.compaction_thread.start()
+
+    # Folds the change log into the catalog file. Readers keep being served from the index while the
+    # new catalog file is written, and records appended during compaction are carried over to the new log.
+    # Replaying a log on top of a catalog which already contains its records gives the same result, so
+    # readers in other processes see a consistent view whether or not they observe the swap.
+    # Returns a Status indicating whether the operation succeeded.
+    def compact(self):
+        with self.lock:
+            self.refresh_if_necessary()
+            snapshot = list(self.items.values())
+            preserved_lines = self.preserved_lines_of(self.items)
+            snapshot_offset = self.log_offset
+            snapshot_signature = self.signature
+        try:
+            compacted_filepath = self.write_snapshot(snapshot, preserved_lines)
+            with self.lock:
+                with storage.locked(self.filepath()):
+                    self.refresh_if_necessary()
+                    if self.signature != snapshot_signature: # The catalog file was rewritten in the meantime
+                        storage.remove_if_exists(compacted_filepath)
+                        return status.Status(False, 'The list of food items changed during compaction. Try again.')
+                    storage.replace(compacted_filepath, self.filepath())
+                    self.truncate_log(snapshot_offset)
+                    self.signature = self.file_signature()
+                    self.stored_rows = len(self.items)
+                    self.preserved_lines = preserved_lines
+        except Exception as error:
+            return status.Status(False, error)
+        return status.Status(True)
+
+    # Returns the preserved lines to carry over into a catalog file holding the provided food items, keyed by name:
+    # every row which could not be parsed, and the later rows of each name still in the catalog. The rows of a
+    # removed name are dropped along with it, as they would otherwise take its place.
+    def preserved_lines_of(self, fooditems):
+        return [(name, line) for name, line in self.preserved_lines if name is None or name in fooditems]
+
+    # Writes the provided food items to a new, uniquely named catalog file next to the current one, flushed to disk,
+    # followed by the provided preserved lines verbatim. Since the first row of a name wins, the preserved rows of
+    # a name never shadow its food item. Returns the filepath to the new file, which the caller swaps in with storage.replace.
+    def write_snapshot(self, fooditems, preserved_lines):
+        with storage.temp_writer(self.filepath()) as (file_output, snapshot_filepath):
+            file_output.write(food_item.CSV_HEADER + '\n')
+            for fooditem in fooditems:
+                file_output.write(fooditem.to_csv() + '\n')
+            for _, line in preserved_lines:
+                file_output.write(line + '\n')
+        return snapshot_filepath
+
+    # Merges the provided dictionary of food items, keyed by name, into the catalog with a single atomic
+    # rewrite of the catalog file. Existing items are replaced if overwrite is True, or kept otherwise.
+    # Returns an (added, overwritten, skipped) tuple of counts, or a Status if the catalog could not be written.
+    def merge(self, fooditems, overwrite):
+        with self.lock, storage.locked(self.filepath()):
+            self.refresh_if_necessary()
+            merged = dict(self.items)
+            added = 0
+            overwritten = 0
+            skipped = 0
+            for name, fooditem in fooditems.items():
+                if name in merged:
+                    if not overwrite:
+                        skipped += 1
+                        continue
+                    overwritten += 1
+                else:
+                    added += 1
+                merged[name] = fooditem
+            preserved_lines = self.preserved_lines_of(merged)
+            try:
+                storage.replace(self.write_snapshot(merged.values(), preserved_lines), self.filepath())
+                self.truncate_log(self.log_offset)
+            except Exception as error:
+                self.signature = None # Force a reload on the next access
+                return status.Status(False, error)
+            if self.search_index is not None:
+                self.search_index.add_all(fooditems)
+            self.items = merged
+            self.preserved_lines = preserved_lines
+            self.signature = self.file_signature()
+            self.stored_rows = len(merged)
+            return (added, overwritten, skipped)
+
+    # Drops the first `offset` bytes of the change log, keeping any records appended after them.
+    def truncate_log(self, offset):
+        if not os.path.exists(self.log_filepath()):
+            self.log_offset = 0
+            return
+        with fileutils.open_file(self.log_filepath(), 'rb') as log_input:
+            log_input.seek(offset)
+            remaining = log_input.read(self.log_offset - offset)
+        if len(remaining) == 0:
+            os.remove(self.log_filepath())
+        else:
+            with storage.atomic_writer(self.log_filepath(), 'wb') as log_output:
+                log_output.write(remaining)
+        self.log_offset = len(remaining)
+
+    # Waits for any running background compaction to finish.
+    def wait_for_compaction(self):
+        thread = self.compaction_thread
+        if thread is not None:
+            thread.join()
\ No newline at end of file
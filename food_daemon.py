@@ -0,0 +1,135 @@
+import contextlib
+import fileutils
+import io
+import json
+import os
+import socket
+import status
+
+SOCKET_FILENAME='food_in_me.sock'
+SOCKET_ENVIRONMENT_VARIABLE='FOOD_IN_ME_SOCKET'
+# Seconds a connected client has to send its command, or to answer a question, before it is dropped.
+CLIENT_TIMEOUT_SECONDS=300
+MAX_MESSAGE_BYTES=1024 * 1024
+LISTEN_BACKLOG=64
+
+# Returns the path of the daemon's Unix domain socket: the FOOD_IN_ME_SOCKET environment variable if set,
+# otherwise data/food_in_me.sock.
+def socket_filepath():
+    return os.environ.get(SOCKET_ENVIRONMENT_VARIABLE) or fileutils.custom_filepath(SOCKET_FILENAME)
+
+# Writes the message dictionary to the stream as a single line of JSON.
+def send_message(stream, message):
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+# Reads a single line of JSON from the stream, returning None once the other side has disconnected.
+def read_message(stream):
+    line = stream.readline(MAX_MESSAGE_BYTES)
+    if line == b'':
+        return None
+    return json.loads(line)
+
+# Holds the connection of the client whose command is running, along with everything the command has printed
+# that has not been sent to the client yet.
+class ClientSession:
+    def __init__(self, stream):
+        self.stream = stream
+        self.output = io.StringIO()
+
+    # Returns and clears everything printed since the last call.
+    def take_output(self):
+        output = self.output.getvalue()
+        self.output.seek(0)
+        self.output.truncate()
+        return output
+
+    # Sends the pending output and the question to the client, then waits for and returns its answer.
+    def ask(self, question):
+        send_message(self.stream, {'output': self.take_output(), 'question': question})
+        reply = read_message(self.stream)
+        if reply is None or 'answer' not in reply:
+            raise ConnectionError('The client disconnected before answering')
+        return str(reply['answer'])
+
+# Returns whether a daemon is accepting connections on the socket at socket_path.
+def daemon_running(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+# Runs the single command sent by a connected client from the client's working directory, with everything it
+# prints captured and sent back once it completes.
+def serve_client(connection, run_command):
+    with connection.makefile('rwb') as stream:
+        request = read_message(stream)
+        if request is None or 'command' not in request:
+            return
+        session = ClientSession(stream)
+        daemon_dirpath = os.getcwd()
+        try:
+            os.chdir(request.get('cwd', daemon_dirpath)) # So that relative paths, e.g. of "import-foods", match the client's
+            with contextlib.redirect_stdout(session.output):
+                run_command(str(request['command']), session.ask)
+        except ConnectionError:
+            raise
+        except Exception as error:
+            session.output.write('Failed to run "{0}": {1}\n'.format(request['command'], error))
+        finally:
+            os.chdir(daemon_dirpath)
+        send_message(stream, {'output': session.take_output(), 'done': True})
+
+# Listens on a Unix domain socket at socket_path until interrupted, running the command line sent by each client
+# with run_command(command_line, ask) and replying with everything it printed. ask(question) forwards a question
+# to the client and returns the answer typed there. Clients are served one at a time, so commands never interleave,
+# and whatever run_command keeps loaded, such as the food catalog, stays warm between them.
+# Returns a Status indicating why the daemon could not start.
+def serve(socket_path, run_command):
+    if daemon_running(socket_path):
+        return status.Status(False, 'A daemon is already listening on {0}'.format(socket_path))
+    try:
+        os.remove(socket_path) # Left behind by a daemon which did not exit cleanly
+    except FileNotFoundError:
+        pass
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        try:
+            listener.bind(socket_path)
+        except OSError as error:
+            return status.Status(False, 'Unable to listen on {0}: {1}'.format(socket_path, error))
+        try:
+            listener.listen(LISTEN_BACKLOG)
+            print('Serving on {0}'.format(socket_path), flush=True)
+            while True:
+                connection, _ = listener.accept()
+                with connection:
+                    connection.settimeout(CLIENT_TIMEOUT_SECONDS)
+                    try:
+                        serve_client(connection, run_command)
+                    except (OSError, ValueError): # Disconnected, timed out or sent malformed JSON
+                        pass
+        finally:
+            os.remove(socket_path)
+
+# Sends the command line to the daemon listening on socket_path, printing its output and asking the user
+# any questions it forwards. Raises ConnectionError if the daemon disconnects before replying.
+# Returns False if no daemon is listening, in which case the command was not run.
+def forward_command(socket_path, command_line):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return False
+    with client, client.makefile('rwb') as stream:
+        send_message(stream, {'command': command_line, 'cwd': os.getcwd()})
+        while True:
+            reply = read_message(stream)
+            if reply is None:
+                raise ConnectionError('The daemon disconnected before replying')
+            print(reply['output'], end='')
+            if reply.get('done'):
+                return True
+            send_message(stream, {'answer': input(reply['question'])})
\ No newline at end of file
@@ -0,0 +1,24 @@
+import food_daemon
+import sys
+
+CLIENT_USAGE='''Usage: python food_in_me_client.py COMMAND [ARGUMENTS...], e.g. "python food_in_me_client.py eat apple percent=50".
+Runs a single command of food_in_me_main.py through the daemon started with "python food_in_me_main.py --serve",
+or in this process if no daemon is running.'''
+
+# Example invocation: python food_in_me_client.py report 9-20-2024 detail
+# Forwards the command to the daemon, whose food items, goals and recent days are already loaded, and prints its reply.
+# Only the daemon's socket is touched unless no daemon is running, so food_in_me_main.py and everything it loads
+# is imported only to run the command in this process instead.
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(CLIENT_USAGE)
+        sys.exit(2)
+    command_line = ' '.join(sys.argv[1:])
+    try:
+        forwarded = food_daemon.forward_command(food_daemon.socket_filepath(), command_line)
+    except (OSError, ValueError) as error:
+        print('Lost the connection to the daemon: {0}'.format(error))
+        sys.exit(1)
+    if not forwarded:
+        import food_in_me_main
+        food_in_me_main.handle_command(command_line)
\ No newline at end of file
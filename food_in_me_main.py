@@ -1,22 +1,74 @@
+import argparse
+import cProfile
+import columnar_history
 import datetime
+import fileutils
+import food_daemon
 import food_item
 import food_processor
+import instrumentation
 import nutrition_accessor
 import status
+import storage_backend
+import sys
 
-GENERAL_USAGE = 'Type "help --command" for more info on a particular command. Supported commands are: "add-food", "eat", "report", "set-goal".'
+GENERAL_USAGE = 'Type "help --command" for more info on a particular command. Supported commands are: "add-food", "add-recipe", "compact-foods", "eat", "export", "import-foods", "migrate-layout", "migrate-to-sqlite", "report", "search", "set-goal", "trends".'
 ADD_FOOD_USAGE = '''To add a new food item to the list of supported food items, type "add-food name-cal-carbs-fats-proteins".
 The food item will be saved as the string "name", with "cal" number of calories, "carbs" number of
 carbohydrates (in grams), "fats" number of fats (in grams) and "proteins" number of proteins (in grams).
 If successful in parsing the new food item, you will be asked whether to save or overwrite the existing one.
 If unable to parse the new food item due to invalid numbers, a failure message will be displayed instead.'''
+ADD_RECIPE_USAGE = '''To define a recipe made of other food items, type "add-recipe name ingredient ingredient ...", where each ingredient is
+"food" for one serving of it or "food:percent" for part or several servings, e.g. "add-recipe breakfast eggs:200 toast coffee:50".
+Ingredients must be added food items or reference food items. The recipe can then be eaten like any food item, e.g. "eat breakfast",
+and its nutrition is recomputed whenever one of its ingredients is changed. Defining a recipe again replaces it.'''
 EAT_USAGE = '''To record a food as being eaten, type "eat name", where "name" is what was consumed. 
 The food must already exist in the list of supported food items.  If it has not been added yet, first use the "add-food" command.
 Optionally, you can specify the amount consumed if it was less than the full amount, e.g. "eat pizza percent=25"
 Optionally, you can specify the date it was consumed if not today, e.g. "eat pineapple date=9-20-2024".'''
+COMPACT_FOODS_USAGE = '''Changes to the list of supported food items are first recorded in a change log, which is periodically
+folded back into data/custom_foods.csv. Type "compact-foods" to fold in all pending changes immediately.'''
+EXPORT_USAGE = '''To write your consumption history to a compact binary file for analysis, type "export path/to/history.fim".
+Optionally, you can limit the export to a range of dates, e.g. "export history.fim 1-1-2024 12-31-2024".
+Each nutrient is stored as a column of numbers, with the food names stored once and each day's entries indexed,
+so that columnar_history.open_history can map the file and total any range of days without parsing it.'''
+IMPORT_FOODS_USAGE = '''To add many food items at once, type "import-foods path/to/foods.csv", where each line of the file is formatted
+like data/custom_foods.csv as "name,cal,carbs,fats,proteins". Invalid rows are reported and skipped, and if a name
+appears more than once the last row is used. Food items which already exist are kept unless the command ends in
+"overwrite", e.g. "import-foods foods.csv overwrite".
+For a large reference dataset, such as a USDA-style CSV dump, run "python reference_catalog.py dump.csv" instead. It builds
+data/reference_foods.fimref, whose food items can be eaten by name, e.g. "eat cheese_cheddar", unless a custom food item
+of the same name exists.'''
+MIGRATE_LAYOUT_USAGE = '''Entries are stored in one file per day, under data/user/days/ in a folder per year and month, e.g. days/2024/09/2024-09-20.csv,
+along with a manifest.csv per month listing the days with entries and their totals. Data directories from before this layout kept
+every day directly in data/user/ as e.g. 9-20-2024.csv. Type "migrate-layout" to move them, and those of every other user, in place.'''
+MIGRATE_TO_SQLITE_USAGE = '''By default, everything is stored as CSV files under data/. Type "migrate-to-sqlite" to copy all food items, recipes,
+entries and goals into a single SQLite database at data/food_in_me.db, which is used from then on. The CSV files are left untouched.
+The storage backend can also be chosen with the FOOD_IN_ME_STORAGE_BACKEND environment variable, set to "csv" or "sqlite".'''
+SEARCH_USAGE = '''To look up food items by name, type "search name", e.g. "search chick". Food items whose names start with "name",
+contain a word starting with it, or are within a typo or two of it are listed, best matches first.
+Optionally, you can specify how many food items to list, e.g. "search chicken limit=5".'''
 SET_GOAL_USAGE = 'To set your daily nutrition goal, type "set-goal cal-carbs-fats-proteins". Each of the arguments must be a number.'
 REPORT_USAGE = '''Provides a report of the nutritional impact of all foods eaten on a given date, e.g. "report 9-20-2024".
-Optionally, you can specify a detailed breakdown for each food item consumed, e.g. "report 9-20-2024 detail".'''
+Optionally, you can specify a detailed breakdown for each food item consumed, e.g. "report 9-20-2024 detail".
+Alternatively, you can provide a start and end date to see per-day, per-week and per-month totals and averages, e.g. "report 9-1-2024 9-30-2024".'''
+TRENDS_USAGE = '''Type "trends" to see your rolling 7-day and 30-day daily averages, your current and best streaks of days within your
+daily goals, and how often each nutrient was within its goal, as of the latest day with entries. The statistics are kept up to date
+as you eat and set goals, so they are shown instantly however long your history is. Days without entries end a streak.'''
+
+BATCH_USAGE = '''To run many commands non-interactively, type "python food_in_me_main.py --batch FILE", or "--batch -" to read them from stdin.
+Each line holds one "eat", "add-food" or "set-goal" command; blank lines and lines starting with "#" are ignored.
+Since there is nobody to prompt, "add-food" only overwrites an existing food item when followed by "overwrite",
+e.g. "add-food pizza-300-30-10-12 overwrite". A success or error is reported for each line once the batch completes.'''
+SERVE_USAGE = '''To avoid loading everything again for every scripted command, start a daemon with "python food_in_me_main.py --serve",
+then run commands with "python food_in_me_client.py eat apple". The daemon keeps the food items, goals and recent days loaded
+and listens on data/food_in_me.sock, or on the path in the FOOD_IN_ME_SOCKET environment variable. If no daemon is running,
+the client runs the command itself.'''
+
+# Maps each supported command and alias to the name it is timed and counted under.
+COMMAND_NAMES = {'help': 'help', 'add-food': 'add-food', 'add-drink': 'add-food', 'add-recipe': 'add-recipe', 'compact-foods': 'compact-foods', 'eat': 'eat',
+    'drink': 'eat', 'export': 'export', 'import-foods': 'import-foods', 'migrate-layout': 'migrate-layout', 'migrate-to-sqlite': 'migrate-to-sqlite', 'report': 'report', 'search': 'search',
+    'set-goal': 'set-goal', 'trends': 'trends'}
 
 # Returns True if the user has accepted the prompt, or False otherwise.
 def accepted(string):
@@ -31,26 +83,47 @@ def handle_help(args):
         mode = str(args[1].lower())
         if mode == 'add-food':
             print(ADD_FOOD_USAGE)
+        elif mode == 'add-recipe':
+            print(ADD_RECIPE_USAGE)
+        elif mode == 'batch':
+            print(BATCH_USAGE)
+        elif mode == 'compact-foods':
+            print(COMPACT_FOODS_USAGE)
         elif mode == 'eat':
             print(EAT_USAGE)
+        elif mode == 'export':
+            print(EXPORT_USAGE)
+        elif mode == 'import-foods':
+            print(IMPORT_FOODS_USAGE)
+        elif mode == 'migrate-layout':
+            print(MIGRATE_LAYOUT_USAGE)
+        elif mode == 'migrate-to-sqlite':
+            print(MIGRATE_TO_SQLITE_USAGE)
         elif mode == 'report':
             print(REPORT_USAGE)
+        elif mode == 'search':
+            print(SEARCH_USAGE)
+        elif mode == 'serve':
+            print(SERVE_USAGE)
         elif mode == 'set-goal':
             print(SET_GOAL_USAGE)
+        elif mode == 'trends':
+            print(TRENDS_USAGE)
         else:
             print(GENERAL_USAGE)
     else:
         print(GENERAL_USAGE)
         
 # Handles the "add-food" command to add new food items to the saved list.
-def handle_add_food(args):
+# ask(question) returns the user's answer to whether an existing food item should be overwritten.
+def handle_add_food(args, ask=input):
     if len(args) == 2:
         food_name = args[1].split('-')[0]
         status = food_processor.try_add_food_item(args[1].lower())
         if status.okay():
             print('Success! {0} was added to the food inventory.'.format(food_name))
         elif status.error() == food_processor.PREEXISTING_ITEM:
-            overwrite = input('{0} already exists. Overwrite with new values?\n'.format(food_name))
+            overwrite = ask('{0} already exists. Overwrite with new values?\n'.format(food_name))
             if accepted(overwrite):
                 status = food_processor.try_add_food_item(args[1].lower(), True)
                 if status.okay():
@@ -64,110 +137,375 @@ def handle_add_food(args):
     else:
         print(ADD_FOOD_USAGE)
 
-# Handles the "eat" command to record new foods eaten.        
-def handle_eat(args):
-    if len(args) < 2 or len(args) > 4:
-        print(EAT_USAGE)
+# Handles the "compact-foods" command to fold pending food item changes into the saved list.
+def handle_compact_foods(args):
+    if len(args) == 1:
+        status = food_processor.compact_food_items()
+        if status.okay():
+            print('The food inventory has been compacted.')
+        else:
+            print(status.error())
+    else:
+        print(COMPACT_FOODS_USAGE)
+
+# Handles the "add-recipe" command to define a recipe from weighted ingredients.
+def handle_add_recipe(args):
+    if len(args) < 3:
+        print(ADD_RECIPE_USAGE)
         return
+    result = food_processor.try_add_recipe(args[1], args[2:])
+    if isinstance(result, status.Status):
+        print(result.error())
+    else:
+        print('Success! The recipe was saved as {0}'.format(result.to_string()))
+
+# Handles the "export" command to write the consumption history to a columnar binary file.
+def handle_export(args):
+    if len(args) != 2 and len(args) != 4:
+        print(EXPORT_USAGE)
+        return
+    start_date = None
+    end_date = None
+    if len(args) == 4:
+        start_date = fileutils.string_to_datetime(args[2])
+        end_date = fileutils.string_to_datetime(args[3])
+        if start_date is None or end_date is None:
+            print(EXPORT_USAGE)
+            return
+    result = columnar_history.export_history(args[1], food_processor.backend(), start_date, end_date)
+    if isinstance(result, status.Status):
+        print(result.error())
+    else:
+        print('Exported {1} entries over {0} days to {2}.'.format(result[0], result[1], args[1]))
+
+# Handles the "import-foods" command to add many food items to the saved list from a CSV file.
+def handle_import_foods(args):
+    overwrite = len(args) == 3 and args[2].lower() == 'overwrite'
+    if len(args) == 2 or overwrite:
+        result = food_processor.try_import_food_items(args[1], overwrite)
+        if isinstance(result, status.Status):
+            print(result.error())
+        else:
+            print(result.to_string())
+    else:
+        print(IMPORT_FOODS_USAGE)
+
+# Handles the "migrate-layout" command to move day files from the flat layout into year/month partitions.
+def handle_migrate_layout(args):
+    if len(args) == 1:
+        result = storage_backend.migrate_consumption_layout()
+        if isinstance(result, status.Status):
+            print(result.error())
+        else:
+            print('Moved {1} day files of {0} users into the partitioned layout.'.format(*result))
+    else:
+        print(MIGRATE_LAYOUT_USAGE)
+
+# Handles the "migrate-to-sqlite" command to move all saved data into a SQLite database.
+def handle_migrate_to_sqlite(args):
+    if len(args) == 1:
+        result = storage_backend.migrate_to_sqlite()
+        if isinstance(result, status.Status):
+            print(result.error())
+        else:
+            print('Migrated {0} food items and {2} entries of {1} users. The SQLite database is now in use.'.format(*result))
+    else:
+        print(MIGRATE_TO_SQLITE_USAGE)
+
+# Parses the arguments of the "eat" command into a (food_name, consumed_percent, consumed_date) tuple,
+# or returns None if they are invalid.
+def parse_eat_args(args):
+    if len(args) < 2 or len(args) > 4:
+        return None
     food_name = args[1]
     consumed_date = datetime.datetime.today()
     consumed_percent = 100
-    valid_command = True
 
     for i in range (2, len(args)):
         optional_arg = args[i].split('=')
         if len(optional_arg) != 2:
-            valid_command = False
+            return None
         elif optional_arg[0].lower() == 'date':
-            d = optional_arg[1].split('-')
-            if len(d) != 3:
-                valid_command = False
-            else:
-                try:
-                    month = int(d[0])
-                    day = int(d[1])
-                    year = int(d[2])
-                    consumed_date = datetime.datetime(year, month, day)
-                except:
-                    valid_command = False
+            consumed_date = fileutils.string_to_datetime(optional_arg[1])
+            if consumed_date is None:
+                return None
         elif optional_arg[0].lower() == 'percent':
             try:
                 consumed_percent = int(optional_arg[1])
             except:
-                valid_command = False
+                return None
         else:
-            valid_command = False
-    if valid_command:
-        status = food_processor.try_process_food_eaten(food_name, consumed_percent, consumed_date)
+            return None
+    return (food_name, consumed_percent, consumed_date)
+
+# Handles the "eat" command to record new foods eaten.        
+def handle_eat(args):
+    eat_args = parse_eat_args(args)
+    if eat_args is not None:
+        status = food_processor.try_process_food_eaten(*eat_args)
         if not status.okay():
             print(status.error())
         else:
             print("Success!")
+            if status.error() != '':
+                print(status.error())
     else:
         print(EAT_USAGE)
         
-# Handles the "report" command to print out the report for foods eaten on a given date.
+# Handles the "report" command to print out the report for foods eaten on a given date, or over a range of dates.
 def handle_report(args):
     detailed_report = len(args) == 3 and args[2].lower() == 'detail'
+    range_report = len(args) == 3 and not detailed_report
     if len(args) == 2 or detailed_report:
-        d = args[1].split('-')
-        if len(d) != 3:
-            print(REPORT_USAGE)
-            return 
-        try:
-            month = int(d[0])
-            day = int(d[1])
-            year = int(d[2])
-            status_date = datetime.datetime(year, month, day)
-        except:
+        status_date = fileutils.string_to_datetime(args[1])
+        if status_date is None:
             print(REPORT_USAGE)
             return
-        status_date = datetime.datetime(year, month, day)
         status = nutrition_accessor.print_status_report(status_date, detailed_report)
         if not status.okay():
             print(status.error())
+    elif range_report:
+        start_date = fileutils.string_to_datetime(args[1])
+        end_date = fileutils.string_to_datetime(args[2])
+        if start_date is None or end_date is None:
+            print(REPORT_USAGE)
+            return
+        status = nutrition_accessor.print_range_report(start_date, end_date)
+        if not status.okay():
+            print(status.error())
     else:
         print(REPORT_USAGE)
 
-# Handles the "set-goal" command to set a target for daily nutrition.
-def handle_set_goal(args):
-    if len(args) == 2:
-        goals = args[1].split('-')
-        if len(goals) != 4:
-            print(SET_GOAL_USAGE)
-            return
+# Handles the "search" command to list the food items best matching a name.
+def handle_search(args):
+    if len(args) < 2 or len(args) > 3:
+        print(SEARCH_USAGE)
+        return
+    limit = food_processor.DEFAULT_SEARCH_RESULTS
+    if len(args) == 3:
+        optional_arg = args[2].split('=')
         try:
-            calories = int(goals[0])
-            carbs = int(goals[1])
-            fats = int(goals[2])
-            proteins = int(goals[3])
-        except:
-            print(SET_GOAL_USAGE)
+            if len(optional_arg) != 2 or optional_arg[0].lower() != 'limit':
+                raise ValueError(args[2])
+            limit = int(optional_arg[1])
+        except ValueError:
+            print(SEARCH_USAGE)
             return
-        nutrition_accessor.set_goals(calories, carbs, fats, proteins)
+    fooditems = food_processor.try_search_food_items(args[1], limit)
+    if len(fooditems) == 0:
+        print('No food items match "{0}".'.format(args[1]))
+    for fooditem in fooditems:
+        print(fooditem.to_string())
+
+# Handles the "trends" command to print the rolling averages, streaks and adherence to the daily goals.
+def handle_trends(args):
+    if len(args) != 1:
+        print(TRENDS_USAGE)
+        return
+    status = nutrition_accessor.print_trends_report()
+    if not status.okay():
+        print(status.error())
+
+# Parses the arguments of the "set-goal" command into a (calories, carbs, fats, proteins) tuple,
+# or returns None if they are invalid.
+def parse_goal_args(args):
+    if len(args) != 2:
+        return None
+    goals = args[1].split('-')
+    if len(goals) != 4:
+        return None
+    try:
+        calories = int(goals[0])
+        carbs = int(goals[1])
+        fats = int(goals[2])
+        proteins = int(goals[3])
+    except:
+        return None
+    return (calories, carbs, fats, proteins)
+
+# Handles the "set-goal" command to set a target for daily nutrition.
+def handle_set_goal(args):
+    goal_args = parse_goal_args(args)
+    if goal_args is not None:
+        nutrition_accessor.set_goals(*goal_args)
         print('Your new daily nutrition goal has been recorded!')
     else:
         print(SET_GOAL_USAGE)
 
+# Runs each of the provided command lines without prompting, and prints whether each line succeeded.
+# Food names are resolved in order against the catalog, while the consumed entries are grouped by date
+# so that each day is written to once for the whole batch.
+# Returns the number of lines which failed.
+def handle_batch(lines):
+    results = []
+    pending_consumptions = []
+    for line_number, line in enumerate(lines, 1):
+        inp = line.strip()
+        if inp == '' or inp.startswith('#'):
+            continue
+        args = inp.split(' ')
+        command = args[0].lower()
+        result = None
+        if command == 'eat' or command == 'drink':
+            eat_args = parse_eat_args(args)
+            if eat_args is None:
+                result = status.Status(False, 'Invalid "eat" command. Type "help eat" to learn usage.')
+            else:
+                resolved = food_processor.resolve_food_eaten(*eat_args)
+                if isinstance(resolved, status.Status):
+                    result = resolved
+                else:
+                    pending_consumptions.append((len(results), resolved))
+        elif command == 'add-food' or command == 'add-drink':
+            overwrite = len(args) == 3 and args[2].lower() == 'overwrite'
+            if len(args) != 2 and not overwrite:
+                result = status.Status(False, 'Invalid "add-food" command. Type "help add-food" to learn usage.')
+            else:
+                result = food_processor.try_add_food_item(args[1].lower(), overwrite)
+                if result.error() == food_processor.PREEXISTING_ITEM:
+                    result = status.Status(False, '{0} already exists. Append "overwrite" to replace it.'.format(args[1].split('-')[0]))
+        elif command == 'set-goal':
+            goal_args = parse_goal_args(args)
+            if goal_args is None:
+                result = status.Status(False, 'Invalid "set-goal" command. Type "help set-goal" to learn usage.')
+            else:
+                nutrition_accessor.set_goals(*goal_args)
+                result = status.Status(True)
+        else:
+            result = status.Status(False, 'Unsupported batch command: {0}'.format(args[0]))
+        results.append([line_number, inp, result])
+
+    written = food_processor.try_process_foods_eaten([resolved for _, resolved in pending_consumptions])
+    for result_index, resolved in pending_consumptions:
+        results[result_index][2] = written[resolved[2]]
+
+    failures = 0
+    for line_number, inp, result in results:
+        if result.okay():
+            print('Line {0}: OK: {1}'.format(line_number, inp))
+            if result.error() != '':
+                print('    {0}'.format(result.error()))
+        else:
+            failures += 1
+            print('Line {0}: FAILED: {1}: {2}'.format(line_number, inp, result.error()))
+    print('Processed {0} commands: {1} succeeded, {2} failed.'.format(len(results), len(results) - failures, failures))
+    return failures
+
+# Runs a single command line of the interactive interface. ask(question) returns the user's answer to a question,
+# which is read from the terminal unless the command was sent to the daemon by food_in_me_client.py.
+def handle_command(inp, ask=input):
+    args = inp.split(' ')
+    if args[0].lower() == 'help':
+        handle_help(args)
+    elif args[0].lower() == 'add-food' or args[0].lower() == 'add-drink':
+        handle_add_food(args, ask)
+    elif args[0].lower() == 'add-recipe':
+        handle_add_recipe(args)
+    elif args[0].lower() == 'compact-foods':
+        handle_compact_foods(args)
+    elif args[0].lower() == 'eat' or args[0].lower() == 'drink':
+        handle_eat(args)
+    elif args[0].lower() == 'export':
+        handle_export(args)
+    elif args[0].lower() == 'import-foods':
+        handle_import_foods(args)
+    elif args[0].lower() == 'migrate-layout':
+        handle_migrate_layout(args)
+    elif args[0].lower() == 'migrate-to-sqlite':
+        handle_migrate_to_sqlite(args)
+    elif args[0].lower() == 'report':
+        handle_report(args)
+    elif args[0].lower() == 'search':
+        handle_search(args)
+    elif args[0].lower() == 'set-goal':
+        handle_set_goal(args)
+    elif args[0].lower() == 'trends':
+        handle_trends(args)
+    else:
+        print('Invalid command: {0}'.format(inp))
+        print(GENERAL_USAGE)
+
+# Returns the name the provided command line is timed and counted under, with aliases such as "drink" folded
+# into the command they stand for, and anything unsupported counted as "invalid".
+def command_name(inp):
+    command = inp.split(' ')[0].lower()
+    return COMMAND_NAMES.get(command, 'invalid')
+
+# Runs the commands of a batch file, or stdin if batch_filepath is "-".
+# Returns the process exit status: 0 if every line succeeded, 1 if any failed, or 2 if the file could not be read.
+def run_batch_file(batch_filepath):
+    if batch_filepath == '-':
+        failures = handle_batch(sys.stdin)
+    else:
+        try:
+            with fileutils.open_file(batch_filepath, 'r') as batch_input:
+                failures = handle_batch(batch_input)
+        except OSError as error:
+            print('Unable to read batch file {0}: {1}'.format(batch_filepath, error))
+            return 2
+    return 1 if failures > 0 else 0
+
+# Runs a command line sent to the daemon by food_in_me_client.py, timed and counted like an interactive command.
+def run_daemon_command(inp, ask):
+    instrumentation.run_command(command_name(inp), handle_command, inp, ask)
+
+# Keeps the storage backend loaded and serves the commands sent by food_in_me_client.py over a Unix domain socket.
+# Returns the process exit status once interrupted, or 1 if the daemon could not start.
+def run_daemon(socket_path):
+    food_processor.backend().warm()
+    try:
+        result = food_daemon.serve(socket_path, run_daemon_command)
+    except KeyboardInterrupt:
+        return 0
+    print(result.error())
+    return 1
+
+# Prints the timing and I/O summary of the last command, if requested with --stats.
+def print_stats(options):
+    if options.stats:
+        print(instrumentation.last_summary())
+
 # Example program invocation: python food_in_me_main.py
 # This main loop provides a simple command line interface to interact with the program.
+# Alternatively, "python food_in_me_main.py --batch FILE" runs the commands in FILE, or stdin if FILE is "-".
+# "python food_in_me_main.py --serve" keeps everything loaded in a daemon serving the commands of food_in_me_client.py.
+# "--stats" prints the time taken, files opened, bytes read and written and lines parsed after each command,
+# "--metrics FILE" writes the totals of every command to FILE in the Prometheus text format on exit,
+# and "--profile FILE" writes cProfile statistics to FILE on exit, e.g. for "python -m pstats FILE".
 if __name__ == '__main__':
-    while True:
-        inp = input('Please enter a command with arguments, "help" to learn more, or "quit" to exit:\n')
-        args = inp.split(' ')
-        if inp.lower() == 'quit':
-            quit()
-        elif args[0].lower() == 'help':
-            handle_help(args)
-        elif args[0].lower() == 'add-food' or args[0].lower() == 'add-drink':
-            handle_add_food(args)
-        elif args[0].lower() == 'eat' or args[0].lower() == 'drink':
-            handle_eat(args)
-        elif args[0].lower() == 'report':
-            handle_report(args)
-        elif args[0].lower() == 'set-goal':
-            handle_set_goal(args)
-        else:
-            print('Invalid command: {0}'.format(inp))
-            print(GENERAL_USAGE)
-        print('------------------------------------------')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Tracks the nutrition of the food you eat.')
+    parser.add_argument('--batch', nargs='?', const='-', metavar='FILE', help='run the commands in FILE, or stdin if FILE is "-"')
+    parser.add_argument('--serve', action='store_true', help='run as a daemon serving the commands of food_in_me_client.py')
+    parser.add_argument('--socket', default=food_daemon.socket_filepath(), help='Unix domain socket the daemon listens on')
+    parser.add_argument('--stats', action='store_true', help='print timing and I/O counters after each command')
+    parser.add_argument('--metrics', metavar='FILE', help='write per-command metrics to FILE in the Prometheus text format on exit')
+    parser.add_argument('--profile', metavar='FILE', help='write cProfile statistics to FILE on exit')
+    options = parser.parse_args()
+    if options.stats or options.metrics is not None:
+        instrumentation.enable()
+    profiler = None
+    if options.profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        if options.serve:
+            sys.exit(run_daemon(options.socket))
+        if options.batch is not None:
+            exit_status = instrumentation.run_command('batch', run_batch_file, options.batch)
+            print_stats(options)
+            sys.exit(exit_status)
+
+        while True:
+            inp = input('Please enter a command with arguments, "help" to learn more, or "quit" to exit:\n')
+            if inp.lower() == 'quit':
+                quit()
+            instrumentation.run_command(command_name(inp), handle_command, inp)
+            print_stats(options)
+            print('------------------------------------------')
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(options.profile)
+        if options.metrics is not None:
+            instrumentation.write_prometheus_text(options.metrics)
\ No newline at end of file
@@ -4,16 +4,19 @@ CSV_HEADER='name,calories (in grams),carbohydrates (in grams),fats (in grams),pr
 
 # Simple class to represent a food item, and its associated NutritionInformation.
 class FoodItem:
+    __slots__ = ('name', 'nutrition_information')
+
     def __init__(self, name, calories, carbs, fats, proteins):
         self.name = name
         self.nutrition_information = nutrition_information.NutritionInformation(calories, carbs, fats, proteins)
-        
+
+    # Returns a food item named after this one, combining the nutrition information of both, e.g. a meal.
     def __add__(self, other):
-        combined_nutrition = self.nutrition_information + other.nutrition_information
-        return FoodItem(self.name, combined_nutrition.calories(), combined_nutrition.carbs, combined_nutrition.fats, combined_nutrition.proteins)
+        return with_nutrition_information(self.name, self.nutrition_information + other.nutrition_information)
 
-    def name(self):
-        return self.name
+    # Returns this food item with its nutrition information multiplied by factor, e.g. 2 for a double serving.
+    def scale(self, factor):
+        return with_nutrition_information(self.name, self.nutrition_information.scale(factor))
 
     def calories(self):
         return self.nutrition_information.calories
@@ -34,6 +37,10 @@ class FoodItem:
         return '{0}: {1} calories, {2}g carbs, {3}g fat, {4}g protein'.format(
         self.name.replace('_', ' '), self.calories(), self.carbs(), self.fats(), self.proteins())
 
+# Returns a food item with the given name and NutritionInformation object.
+def with_nutrition_information(name, nutrition_info):
+    return FoodItem(name, nutrition_info.calories, nutrition_info.carbs, nutrition_info.fats, nutrition_info.proteins)
+
 # Attempts to parse the given string into a food item format. 'string' is expected to be in the format:
 # 'name-cal-carbs-fats-proteins' where 'name' is a string and the rest are integers.
 def parse_food_item(string, splitter):
@@ -1,81 +1,157 @@
 import datetime
 import fileutils
 import food_item
+import goal_trends
+import math
 import os
+import recipes
+import reference_catalog
 import status
+import storage_backend
+import threading
 
 PREEXISTING_ITEM='preexisting item'
-CUSTOM_FOOD_ITEM_FILENAME='custom_foods.csv'
-
-# If the custom food file does not already exist, create it and fill out the first CSV line.
-def instantiate_custom_food_file_if_necessary():
-    dirpath = fileutils.custom_filepath('')
-    fileutils.instantiate_path_if_necessary(dirpath)
-    if not os.path.exists(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME)):
-        with open(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME), 'w') as file_output:
-            file_output.write(food_item.CSV_HEADER + '\n')
-
-# Performs a simple linear search through the custom food name file searching
-# for whether the food item with the given food_name has already been added.
+MAX_REPORTED_INVALID_LINES=10
+MAX_SUGGESTIONS=3
+DEFAULT_SEARCH_RESULTS=10
+
+# The RecipeBook of each open storage backend, see recipe_book.
+RECIPE_BOOKS={}
+RECIPE_BOOKS_LOCK=threading.Lock()
+
+# Simple class to hold the outcome of importing a file of food items.
+class ImportSummary:
+    def __init__(self):
+        self.added = 0
+        self.overwritten = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.invalid_lines = []
+
+    def to_string(self):
+        summary = 'Added {0} new food items, overwrote {1}, kept {2} existing items, ignored {3} duplicate rows and {4} invalid rows.'.format(
+            self.added, self.overwritten, self.skipped, self.duplicates, len(self.invalid_lines))
+        if len(self.invalid_lines) > 0:
+            summary += ' Invalid rows were found on lines: {0}'.format(', '.join(str(line_number) for line_number in self.invalid_lines[:MAX_REPORTED_INVALID_LINES]))
+            if len(self.invalid_lines) > MAX_REPORTED_INVALID_LINES:
+                summary += ', ...'
+        return summary
+
+# Returns the configured storage backend holding the food items and consumption entries.
+def backend():
+    return storage_backend.current()
+
+# Returns the RecipeBook of the configured storage backend, holding the recipes and their memoized nutrition.
+# Its memoized nutrition is dropped whenever the food items, recipes or reference catalog change in any process.
+def recipe_book():
+    current_backend = backend()
+    with RECIPE_BOOKS_LOCK:
+        if current_backend not in RECIPE_BOOKS:
+            RECIPE_BOOKS[current_backend] = recipes.RecipeBook(current_backend,
+                lambda: (current_backend.recipes_version(), reference_catalog.signature()))
+        return RECIPE_BOOKS[current_backend]
+
+# Returns whether the food item with the given food_name has already been added.
 def food_item_already_added(food_name):
-    if not os.path.exists(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME)):
-        return False
-    with open(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME), 'r') as file_input:
-        for line in file_input:
-            if line.split(',')[0] == food_name:
-                file_input.close()
-                return True
-    return False
-
-# Simply adds the provided food item to the bottom of the existing custom food item file.
+    return backend().food_item_exists(food_name)
+
+# Simply adds the provided food item to the list of known food items. Recipes using a reference food item
+# of the same name are recomputed with the new one.
 def add_food_item(fooditem):
-    instantiate_custom_food_file_if_necessary()
-    with open(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME), 'a') as file_output:
-        file_output.write(fooditem.to_csv() + '\n')
-    return status.Status(True)
+    result = backend().add_food_item(fooditem)
+    recipe_book().invalidate([fooditem.name])
+    return result
 
-# Replaces the provided food item within the custom food name file to use the new values.
-# If the food item does not already exist, this does nothing.
+# Replaces the provided food item within the list of known food items to use the new values, and drops the
+# memoized nutrition of the recipes using it. If the food item does not already exist, this does nothing.
 def replace_food_item(fooditem):
-    if not os.path.exists(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME)):
-        return status.Status(False, 'List of food items cannot be found. Add food items with the "add-food" command.')
-    added = False
-    with open(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME), 'r') as file_input:
-        with open(fileutils.custom_filepath('temp.csv'), 'w') as file_output:
-            for line in file_input:
-                if line.split(',')[0] == fooditem.name:
-                    added = True
-                    file_output.write(fooditem.to_csv() + '\n')
-                else:
-                    file_output.write(line)
-    if not added:
-        return status.Status(False, 'Food item {0} was not found and could not be replaced.'.format(fooditem.name))
-    return fileutils.replace_file(CUSTOM_FOOD_ITEM_FILENAME, 'temp.csv')
-        
-# Stores that the given amount of food was consumed by the user in a file matching the date string.
-def process_food_eaten(fooditem, consumed_percent, consumed_date_filename):
-    multiplier = float(consumed_percent) / 100.0
-    output_str = fooditem.name
-    output_str += ',' + str(fooditem.calories() * multiplier)
-    output_str += ',' + str(fooditem.carbs() * multiplier)
-    output_str += ',' + str(fooditem.fats() * multiplier)
-    output_str += ',' + str(fooditem.proteins() * multiplier) + '\n'
-    dirpath = fileutils.user_consumption_dirpath()
-    with open(dirpath + consumed_date_filename, 'a') as output:
-        output.write(output_str)
+    result = backend().replace_food_item(fooditem)
+    recipe_book().invalidate([fooditem.name])
+    return result
+
+# Removes the food item with the given food_name from the list of known food items.
+def remove_food_item(food_name):
+    result = backend().remove_food_item(food_name)
+    recipe_book().invalidate([food_name])
+    return result
         
-# Searches through the list of known food items for the one corresponding to the given food_name.
+# Returns the consumed NutritionInformation for the given percent of the food item.
+def consumed_nutrition_information(fooditem, consumed_percent):
+    return fooditem.nutrition_information.scale(float(consumed_percent) / 100.0)
+
+# Stores that the given amount of food was consumed by the user on the provided date.
+# Returns the Status of updating the goal trends, see process_foods_eaten.
+def process_food_eaten(fooditem, consumed_percent, consumed_date):
+    return process_foods_eaten(consumed_date, [(fooditem, consumed_percent)])
+
+# Stores that each of the given (fooditem, consumed_percent) pairs was consumed by the user on the provided date,
+# with a single write to the storage backend for all of them, then folds the day's new total into the goal trends.
+# Returns a Status indicating whether the goal trends were updated, once the entries are recorded.
+def process_foods_eaten(consumed_date, consumptions):
+    backend().record_foods_eaten(consumed_date,
+        [(fooditem.name, consumed_nutrition_information(fooditem, consumed_percent)) for fooditem, consumed_percent in consumptions])
+    return goal_trends.record_day_eaten(backend(), consumed_date)
+
+# Returns the successful Status of recording entries, carrying the error of updating the goal trends as a warning if any.
+def recorded_status(trends_status):
+    return status.Status(True, '' if trends_status.okay() else trends_status.error())
+
+# Validates that the percent of the given food item can be recorded as consumed on the provided day.
+# Returns a (fooditem, consumed_percent, consumed_date) tuple if so, or a Status indicating
+# why it cannot otherwise.
+def resolve_food_eaten(food_name, consumed_percent, consumed_date):
+    if consumed_percent < 0:
+        return status.Status(False, 'Invalid consumed_percentage: {0}'.format(consumed_percent))
+    if not isinstance(consumed_date, datetime.date):
+        return status.Status(False, 'Invalid consumed_date. Expected a datetime.date object')
+    fooditem = try_get_food_item(food_name)
+    if fooditem is None:
+        return status.Status(False, unknown_food_item_error(food_name))
+    return (fooditem, consumed_percent, datetime.date(consumed_date.year, consumed_date.month, consumed_date.day))
+
+# Returns whether the provided food item has a usable name and finite, non-negative nutrition values.
+def valid_food_item(fooditem):
+    if fooditem.name == '' or ',' in fooditem.name or '\n' in fooditem.name:
+        return False
+    for value in [fooditem.calories(), fooditem.carbs(), fooditem.fats(), fooditem.proteins()]:
+        if not math.isfinite(value) or value < 0:
+            return False
+    return True
+
+# Returns the error message for a food name which is not in the list of known food items, suggesting the
+# closest matching names if there are any.
+def unknown_food_item_error(food_name):
+    recipe = recipe_book().get(food_name)
+    if recipe is not None:
+        missing_names = [name for name, _ in recipe.ingredients if try_get_catalog_food_item(name) is None]
+        return 'The recipe "{0}" uses {1}, which cannot be found anymore. Add it again or redefine the recipe with the "add-recipe" command.'.format(
+            food_name, ', '.join('"{0}"'.format(name) for name in missing_names))
+    fooditems = backend().search_food_items(food_name, MAX_SUGGESTIONS)
+    fooditems += reference_catalog.search_food_items(food_name, MAX_SUGGESTIONS - len(fooditems))
+    suggestions = ['"{0}"'.format(fooditem.name) for fooditem in fooditems]
+    if len(suggestions) == 0:
+        return 'Unable to find food item named "{0}". Did you add it to the list with the "add-food" command?'.format(food_name)
+    return 'Unable to find food item named "{0}". Did you mean {1}?'.format(food_name, ' or '.join(suggestions))
+
+# Searches through the list of known food items for the one corresponding to the given food_name, and then
+# through the reference catalog if it is not a custom food item, see reference_catalog.
+# Returns it if it can be found or a None object otherwise.
+def try_get_catalog_food_item(food_name):
+    fooditem = backend().get_food_item(food_name)
+    if fooditem is None:
+        fooditem = reference_catalog.get_food_item(food_name)
+    return fooditem
+
+# Searches for the food item corresponding to the given food_name: a custom food item, then a recipe, whose memoized
+# nutrition sums its ingredients, then a reference food item.
 # Returns it if it can be found or a None object otherwise.    
 def try_get_food_item(food_name):
-    if not os.path.exists(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME)):
-        return None
-    with open(fileutils.custom_filepath(CUSTOM_FOOD_ITEM_FILENAME), 'r') as file_input:
-        for line in file_input:
-            if line.split(',')[0] == food_name:
-                fooditem = food_item.parse_food_item(line, ',')
-                file_input.close()
-                return fooditem
-    return None
+    fooditem = backend().get_food_item(food_name)
+    if fooditem is None:
+        fooditem = recipe_book().food_item(food_name, try_get_catalog_food_item)
+    if fooditem is None:
+        fooditem = reference_catalog.get_food_item(food_name)
+    return fooditem
     
 
 ### ---------------------------------- PUBLIC functions ---------------------------------------------- ###
@@ -87,24 +163,95 @@ def try_add_food_item(food_item_text, overwrite=False):
     fooditem = food_item.parse_food_item(food_item_text, '-')
     if fooditem is None:
         return status.Status(False, 'Failed to parse "{0}" as a food item. Type "help add-food" to learn usage.'.format(food_item_text))
+    return try_save_food_item(fooditem, overwrite)
+
+# Adds the provided food item to the file if it does not already exist. If it already exists, an error
+# will be returned unless `overwrite` is true, in which case the new values will be used instead.
+def try_save_food_item(fooditem, overwrite=False):
     if food_item_already_added(fooditem.name):
         if not overwrite:
             return status.Status(False, PREEXISTING_ITEM)
         return replace_food_item(fooditem)
     return add_food_item(fooditem)
 
+# Streams the CSV file at import_filepath, formatted like data/custom_foods.csv, into the list of food items.
+# Rows are validated and deduplicated in memory, with the last row for a name winning, and existing food items
+# are replaced only if `overwrite` is true. The merged list is written with a single atomic rewrite or transaction.
+# Returns an ImportSummary if successful, or a Status indicating why the import failed.
+def try_import_food_items(import_filepath, overwrite=False):
+    if not os.path.exists(import_filepath):
+        return status.Status(False, 'Unable to find a file to import at {0}'.format(import_filepath))
+    summary = ImportSummary()
+    imported_items = {}
+    with fileutils.open_file(import_filepath, 'r') as file_input:
+        for line_number, line in enumerate(file_input, 1):
+            line = line.strip()
+            if line == '' or (line_number == 1 and line == food_item.CSV_HEADER):
+                continue
+            fooditem = food_item.parse_food_item(line.lower(), ',')
+            if fooditem is None or not valid_food_item(fooditem):
+                summary.invalid_lines.append(line_number)
+                continue
+            if fooditem.name in imported_items:
+                summary.duplicates += 1
+            imported_items[fooditem.name] = fooditem
+    merged = backend().merge_food_items(imported_items, overwrite)
+    if isinstance(merged, status.Status):
+        return merged
+    recipe_book().invalidate(imported_items)
+    summary.added, summary.overwritten, summary.skipped = merged
+    return summary
+
+# Defines the recipe named recipe_name from the provided ingredient strings, each formatted "name" or "name:percent",
+# where percent is the amount of one serving used and defaults to 100. Every ingredient must be a custom or reference
+# food item, and the name must not be taken by a custom food item. An existing recipe of the same name is replaced.
+# Returns the recipe as a food item if successful, or a Status indicating why it could not be defined.
+def try_add_recipe(recipe_name, ingredient_strings):
+    recipe_name = recipe_name.lower()
+    if not recipes.valid_recipe_name(recipe_name):
+        return status.Status(False, 'Invalid recipe name "{0}". Names cannot contain spaces, commas, dashes, colons or semicolons.'.format(recipe_name))
+    if food_item_already_added(recipe_name):
+        return status.Status(False, '{0} is already a food item. Choose another name for the recipe.'.format(recipe_name))
+    ingredients = recipes.parse_ingredients(ingredient_strings)
+    if ingredients is None:
+        return status.Status(False, 'Failed to parse the ingredients of "{0}". Type "help add-recipe" to learn usage.'.format(recipe_name))
+    for ingredient_name, _ in ingredients:
+        if try_get_catalog_food_item(ingredient_name) is None:
+            return status.Status(False, unknown_food_item_error(ingredient_name))
+    recipe_book().define(recipes.Recipe(recipe_name, ingredients))
+    return recipe_book().food_item(recipe_name, try_get_catalog_food_item)
+
+# Returns up to `limit` known food items whose names start with, contain a word starting with, or are within
+# a typo or two of the query, ranked best first.
+def try_search_food_items(query, limit=DEFAULT_SEARCH_RESULTS):
+    return backend().search_food_items(query, limit)
+
+# Folds all pending food item changes back into the storage backend's main copy of the list.
+# Returns a Status indicating whether the operation succeeded.
+def compact_food_items():
+    return backend().compact_food_items()
+
 # Records the percent of the given food item as being consumed on the provided day.
 # Returns False if food_name is not in the food name file, the percent is not a positive number
 # or if the date is invalid (expected datetime.date)
 def try_process_food_eaten(food_name, consumed_percent, consumed_date):
-    if consumed_percent < 0:
-        return status.Status(False, 'Invalid consumed_percentage: {0}'.format(consumed_percent))
-    if not isinstance(consumed_date, datetime.date):
-        return status.Status(False, 'Invalid consumed_date. Expected a datetime.date object')
-    consumed_date_filename = fileutils.datetime_to_string(consumed_date, '.csv')
-    fooditem = try_get_food_item(food_name)
-    if fooditem is not None:
-        process_food_eaten(fooditem, consumed_percent, consumed_date_filename)
-        return status.Status(True)
-    else:
-        return status.Status(False, 'Unable to find food item named "{0}". Did you add it to the list with the "add-food" command?'.format(food_name))
\ No newline at end of file
+    resolved = resolve_food_eaten(food_name, consumed_percent, consumed_date)
+    if isinstance(resolved, status.Status):
+        return resolved
+    fooditem, consumed_percent, consumed_date = resolved
+    return recorded_status(process_food_eaten(fooditem, consumed_percent, consumed_date))
+
+# Records many foods as consumed at once. `resolved_consumptions` is a list of tuples returned by
+# resolve_food_eaten. Entries are grouped by day so each day is written to once.
+# Returns a dictionary mapping each date to a Status indicating whether its entries were recorded.
+def try_process_foods_eaten(resolved_consumptions):
+    grouped_consumptions = {}
+    for fooditem, consumed_percent, consumed_date in resolved_consumptions:
+        grouped_consumptions.setdefault(consumed_date, []).append((fooditem, consumed_percent))
+    results = {}
+    for consumed_date, consumptions in grouped_consumptions.items():
+        try:
+            results[consumed_date] = recorded_status(process_foods_eaten(consumed_date, consumptions))
+        except Exception as error:
+            results[consumed_date] = status.Status(False, error)
+    return results
\ No newline at end of file
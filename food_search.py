@@ -0,0 +1,254 @@
+import bisect
+import collections
+
+# Keys of at least TRIE_DEPTH characters share the sorted bucket of the node at that depth, which keeps the trie
+# small for large catalogs, while longer prefixes are found within a bucket by binary search.
+TRIE_DEPTH=4
+TRIGRAM_PADDING='$$'
+DEFAULT_LIMIT=10
+# Prefix lookups stop collecting once they hold this many candidates per requested result, so that short
+# queries matching most of the catalog stay fast. Ranking is exact among the collected candidates.
+PREFIX_CANDIDATES_PER_RESULT=8
+# Queries shorter than this are only matched by prefix, since a single typo leaves too little to go on.
+MIN_FUZZY_LENGTH=3
+# Queries longer than this tolerate two typos, shorter ones a single typo.
+TWO_TYPO_LENGTH=7
+# A fuzzy match must share at least FUZZY_FILTER_TRIGRAMS, or one in FUZZY_FILTER_DIVISOR for long queries,
+# of the query's rarest trigrams before its edit distance is computed.
+FUZZY_FILTER_TRIGRAMS=4
+FUZZY_FILTER_DIVISOR=4
+
+# Returns the provided food name or query in the form used for matching: lower case, with spaces as underscores.
+def normalize(text):
+    return text.strip().lower().replace(' ', '_')
+
+# Returns the suffixes of the normalized name which start a word, e.g. "chicken_breast" and "breast",
+# so that a query matches the start of any word of a food name.
+def word_keys(key):
+    keys = [key]
+    for i in range(len(key) - 1):
+        if key[i] == '_' and key[i + 1] != '_':
+            keys.append(key[i + 1:])
+    return keys
+
+# Returns the set of padded three letter substrings of the normalized name.
+def trigrams(key):
+    padded = TRIGRAM_PADDING + key + TRIGRAM_PADDING
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Returns the number of typos allowed when fuzzy matching a query of the given length.
+def allowed_typos(length):
+    if length < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if length <= TWO_TYPO_LENGTH else 2
+
+# Returns the Levenshtein distance between a and b if it is at most max_distance, or max_distance + 1 otherwise.
+# The common prefix and suffix are skipped, only a band around the diagonal is computed, and rows are abandoned
+# as soon as every cell exceeds max_distance.
+def bounded_edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a = a[start:len(a) - end]
+    b = b[start:len(b) - end]
+    # Only cells within max_distance of the diagonal can hold a distance of at most max_distance
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost, too_far)
+            if current[j] < best:
+                best = current[j]
+        if best > max_distance:
+            return too_far
+        previous = current
+    return previous[-1]
+
+# Simple class to represent a node of the prefix trie. Nodes above TRIE_DEPTH hold the keys ending exactly at
+# them, while nodes at TRIE_DEPTH hold every key sharing their prefix. Keys are sorted (word key, name) pairs.
+class TrieNode:
+    __slots__ = ('children', 'keys')
+
+    def __init__(self):
+        self.children = {}
+        self.keys = []
+
+    # Adds the (word key, name) pair to this node, keeping the keys sorted.
+    def add(self, entry):
+        index = bisect.bisect_left(self.keys, entry)
+        if index == len(self.keys) or self.keys[index] != entry:
+            self.keys.insert(index, entry)
+
+    # Removes the (word key, name) pair from this node, if present.
+    def remove(self, entry):
+        index = bisect.bisect_left(self.keys, entry)
+        if index < len(self.keys) and self.keys[index] == entry:
+            del self.keys[index]
+
+    # Returns the (word key, name) pairs of this node whose word key starts with the provided key, in order.
+    def starting_with(self, key):
+        index = bisect.bisect_left(self.keys, (key,))
+        while index < len(self.keys) and self.keys[index][0].startswith(key):
+            yield self.keys[index]
+            index += 1
+
+# Search index over the food names of a catalog, supporting ranked prefix lookups with a trie and typo tolerant
+# lookups with trigrams verified by a bounded edit distance. Names are added and removed one at a time as the
+# catalog changes, so the index never needs to be rebuilt for a single change.
+class FoodSearchIndex:
+    def __init__(self, names=()):
+        self.root = TrieNode()
+        self.keys = {}
+        self.trigram_postings = {}
+        self.add_all(names)
+
+    # Returns the number of names in the index.
+    def size(self):
+        return len(self.keys)
+
+    # Adds the provided food name to the index. Adding a name twice has no effect.
+    def add(self, name):
+        if name in self.keys:
+            return
+        key = normalize(name)
+        self.keys[name] = key
+        for word_key in word_keys(key):
+            self.trie_node(word_key, True).add((word_key, name))
+        self.add_trigrams(name, key)
+
+    # Adds many food names at once, sorting each trie node once at the end rather than on every insertion.
+    def add_all(self, names):
+        touched_nodes = set()
+        for name in names:
+            if name in self.keys:
+                continue
+            key = normalize(name)
+            self.keys[name] = key
+            for word_key in word_keys(key):
+                node = self.trie_node(word_key, True)
+                node.keys.append((word_key, name))
+                touched_nodes.add(node)
+            self.add_trigrams(name, key)
+        for node in touched_nodes:
+            node.keys.sort()
+
+    # Adds the name to the postings of each trigram of its normalized key.
+    def add_trigrams(self, name, key):
+        postings = self.trigram_postings.get(len(key))
+        if postings is None:
+            postings = self.trigram_postings[len(key)] = {}
+        for trigram in trigrams(key):
+            posting = postings.get(trigram)
+            if posting is None:
+                postings[trigram] = {name}
+            else:
+                posting.add(name)
+
+    # Removes the provided food name from the index, if present.
+    def remove(self, name):
+        key = self.keys.pop(name, None)
+        if key is None:
+            return
+        for word_key in word_keys(key):
+            node = self.trie_node(word_key, False)
+            if node is not None:
+                node.remove((word_key, name))
+        postings = self.trigram_postings[len(key)]
+        for trigram in trigrams(key):
+            posting = postings.get(trigram)
+            if posting is not None:
+                posting.discard(name)
+                if len(posting) == 0:
+                    del postings[trigram]
+
+    # Returns the trie node holding the provided key, creating it if create is True, or None if it does not exist.
+    def trie_node(self, key, create):
+        node = self.root
+        for character in key[:TRIE_DEPTH]:
+            child = node.children.get(character)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[character] = TrieNode()
+            node = child
+        return node
+
+    # Returns up to limit names which have a word starting with the query, ranked by whether the name itself
+    # starts with it, then by length. The trie is walked breadth first so that the shortest keys are seen first.
+    def prefix_matches(self, query, limit=DEFAULT_LIMIT):
+        key = normalize(query)
+        node = self.trie_node(key, False)
+        if node is None:
+            return []
+        matches = {}
+        level = [node]
+        enough = limit * PREFIX_CANDIDATES_PER_RESULT
+        while len(level) > 0 and len(matches) < limit:
+            next_level = []
+            for node in level:
+                for word_key, name in node.starting_with(key):
+                    starts_name = word_key == self.keys[name]
+                    if name not in matches or starts_name:
+                        matches[name] = starts_name
+                    if len(matches) >= enough:
+                        break
+                if len(matches) >= enough:
+                    break
+                next_level.extend(node.children.values())
+            level = next_level
+        ranked = sorted(matches, key=lambda name: (not matches[name], len(name), name))
+        return ranked[:limit]
+
+    # Returns up to limit names within a few typos of the query, ranked by edit distance, then by length.
+    # A name within d typos has a length within d of the query's, and shares all but at most 3 * d of its trigrams.
+    # So only the postings of those lengths are read, and only for the rarest `required_shared + 3 * d`
+    # trigrams, of which a match must share at least `required_shared`. Names passing this count filter
+    # have their edit distance computed.
+    def fuzzy_matches(self, query, limit=DEFAULT_LIMIT):
+        key = normalize(query)
+        max_distance = allowed_typos(len(key))
+        if max_distance == 0:
+            return []
+        length_postings = [self.trigram_postings[length] for length in range(len(key) - max_distance, len(key) + max_distance + 1)
+            if length in self.trigram_postings]
+        postings = []
+        for trigram in trigrams(key):
+            trigram_postings = [by_trigram[trigram] for by_trigram in length_postings if trigram in by_trigram]
+            postings.append((sum(len(posting) for posting in trigram_postings), trigram_postings))
+        postings.sort(key=lambda entry: entry[0])
+        required_shared = max(1, min(max(FUZZY_FILTER_TRIGRAMS, len(postings) // FUZZY_FILTER_DIVISOR), len(postings) - 3 * max_distance))
+        counts = collections.Counter()
+        for _, trigram_postings in postings[:required_shared + 3 * max_distance]:
+            for posting in trigram_postings:
+                counts.update(posting)
+        matches = []
+        for name, shared in counts.items():
+            if shared >= required_shared:
+                distance = bounded_edit_distance(key, self.keys[name], max_distance)
+                if distance <= max_distance:
+                    matches.append((distance, len(name), name))
+        matches.sort()
+        return [name for _, _, name in matches[:limit]]
+
+    # Returns up to limit names matching the query, with prefix matches ranked ahead of typo tolerant ones.
+    def search(self, query, limit=DEFAULT_LIMIT):
+        if limit <= 0 or normalize(query) == '':
+            return []
+        results = self.prefix_matches(query, limit)
+        if len(results) < limit:
+            for name in self.fuzzy_matches(query, limit):
+                if name not in results:
+                    results.append(name)
+                    if len(results) == limit:
+                        break
+        return results
\ No newline at end of file
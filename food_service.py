@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import fileutils
+import food_item
+import food_processor
+import goal_trends
+import instrumentation
+import json
+import nutrition_accessor
+import status
+import urllib.parse
+import weakref
+
+DEFAULT_HOST='127.0.0.1'
+DEFAULT_PORT=8080
+DEFAULT_WORKERS=8
+MAX_HEADER_LINES=100
+MAX_BODY_BYTES=1024 * 1024
+JSON_CONTENT_TYPE='application/json'
+METRICS_CONTENT_TYPE='text/plain; version=0.0.4'
+REASONS={200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+    413: 'Payload Too Large', 414: 'URI Too Long', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+SERVICE_USAGE='''Endpoints, all of which accept and return JSON:
+POST /foods                   {"name": ..., "calories": ..., "carbs": ..., "fats": ..., "proteins": ..., "overwrite": false}
+POST /users/<user>/eat        {"name": ..., "percent": 100, "date": "m-d-yyyy"}
+PUT  /users/<user>/goal       {"calories": ..., "carbs": ..., "fats": ..., "proteins": ...}
+GET  /users/<user>/report?date=m-d-yyyy[&detail=1]
+GET  /users/<user>/report?start=m-d-yyyy&end=m-d-yyyy
+GET  /users/<user>/trends      rolling averages, streaks and adherence to the daily goal
+GET  /metrics                 per-endpoint timings and file I/O counters in the Prometheus text format, with --metrics'''
+
+# Raised by request handlers to reply with an error status code and message.
+class RequestError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+# Simple class to hold a parsed HTTP request.
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    # Returns whether the client asked to keep the connection open after this request.
+    def keep_alive(self):
+        return self.headers.get('connection', '').lower() != 'close'
+
+    # Returns the request body decoded as a JSON object.
+    def json(self):
+        try:
+            payload = json.loads(self.body.decode() or '{}')
+        except ValueError:
+            raise RequestError(400, 'The request body is not valid JSON')
+        if not isinstance(payload, dict):
+            raise RequestError(400, 'The request body must be a JSON object')
+        return payload
+
+# Returns the provided NutritionInformation as a dictionary suitable for JSON.
+def nutrition_to_json(nutrition_info):
+    return {'calories': nutrition_info.calories, 'carbs': nutrition_info.carbs, 'fats': nutrition_info.fats, 'proteins': nutrition_info.proteins}
+
+# Returns the provided PeriodSummary as a dictionary suitable for JSON, compared against the goal if provided.
+def period_to_json(summary, goal_nutrition_info):
+    average = summary.average()
+    return {'label': summary.label, 'days': summary.days, 'entries': summary.entries, 'total': nutrition_to_json(summary.total),
+        'average': nutrition_to_json(average), 'goal_delta': goal_delta_to_json(average, goal_nutrition_info)}
+
+# Returns the difference between the provided NutritionInformation and the goal as a dictionary, or None without a goal.
+def goal_delta_to_json(nutrition_info, goal_nutrition_info):
+    if goal_nutrition_info is None:
+        return None
+    return {'calories': nutrition_info.calories - goal_nutrition_info.calories, 'carbs': nutrition_info.carbs - goal_nutrition_info.carbs,
+        'fats': nutrition_info.fats - goal_nutrition_info.fats, 'proteins': nutrition_info.proteins - goal_nutrition_info.proteins}
+
+# Returns the numeric field of the JSON payload, raising a RequestError if it is missing or not a number.
+def number_field(payload, field, default=None):
+    value = payload.get(field, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RequestError(400, 'Expected a number for "{0}"'.format(field))
+    return value
+
+# Returns the date field of the JSON payload or query, raising a RequestError if it is not formatted m-d-yyyy.
+def date_field(fields, field):
+    value = fields.get(field)
+    date = fileutils.string_to_datetime(value) if isinstance(value, str) else None
+    if date is None:
+        raise RequestError(400, 'Expected a date formatted m-d-yyyy for "{0}"'.format(field))
+    return date
+
+# Raises a RequestError for a failed Status, or returns None otherwise.
+def check(result, status_code=400):
+    if isinstance(result, status.Status) and not result.okay():
+        raise RequestError(status_code, str(result.error()))
+
+### Blocking operations, each run on the worker pool for the user selected with fileutils.set_current_user.
+
+# Adds or overwrites a food item in the shared catalog.
+def add_food(payload):
+    fooditem = food_item.FoodItem(str(payload.get('name', '')).lower(), number_field(payload, 'calories'), number_field(payload, 'carbs'),
+        number_field(payload, 'fats'), number_field(payload, 'proteins'))
+    if not food_processor.valid_food_item(fooditem):
+        raise RequestError(400, 'Invalid food item. Names must be non-empty without commas, and values must be non-negative')
+    result = food_processor.try_save_food_item(fooditem, payload.get('overwrite') is True)
+    if result.error() == food_processor.PREEXISTING_ITEM:
+        raise RequestError(409, '{0} already exists. Set "overwrite" to replace it.'.format(fooditem.name))
+    check(result)
+    return {'food': fooditem.name}
+
+# Records a food item as consumed by the user.
+def eat(payload):
+    consumed_date = date_field(payload, 'date') if 'date' in payload else datetime.datetime.today()
+    food_name = str(payload.get('name', ''))
+    consumed_percent = number_field(payload, 'percent', 100)
+    resolved = food_processor.resolve_food_eaten(food_name, consumed_percent, consumed_date)
+    if isinstance(resolved, status.Status): # Past a valid percent, the food item can only be unknown
+        check(resolved, 400 if consumed_percent < 0 else 404)
+    fooditem, consumed_percent, consumed_date = resolved
+    result = food_processor.recorded_status(food_processor.process_food_eaten(fooditem, consumed_percent, consumed_date))
+    reply = {'food': food_name, 'date': fileutils.datetime_to_string(consumed_date)}
+    if result.error() != '':
+        reply['warning'] = str(result.error())
+    return reply
+
+# Sets the daily nutrition goal of the user.
+def set_goal(payload):
+    nutrition_accessor.set_goals(number_field(payload, 'calories'), number_field(payload, 'carbs'),
+        number_field(payload, 'fats'), number_field(payload, 'proteins'))
+    return {}
+
+# Returns the nutrition report of the user for a single date, or per-day, per-week and per-month summaries of a date range.
+def report(query):
+    goal_nutrition_info = nutrition_accessor.get_goal_nutrition_information()
+    if isinstance(goal_nutrition_info, status.Status):
+        goal_nutrition_info = None
+    if 'date' in query:
+        status_date = date_field(query, 'date')
+        detailed_results = {} if query.get('detail') in ('1', 'true') else None
+        daily_nutrition_info = nutrition_accessor.get_daily_nutrition_information(status_date, detailed_results)
+        check(daily_nutrition_info, 404)
+        reply = {'date': fileutils.datetime_to_string(status_date), 'total': nutrition_to_json(daily_nutrition_info),
+            'goal_delta': goal_delta_to_json(daily_nutrition_info, goal_nutrition_info)}
+        if detailed_results is not None:
+            reply['items'] = {name: nutrition_to_json(nutrition_info) for name, nutrition_info in detailed_results.items()}
+        return reply
+    start_date = date_field(query, 'start')
+    end_date = date_field(query, 'end')
+    if end_date < start_date:
+        raise RequestError(400, 'The end date must not be before the start date')
+    summaries = nutrition_accessor.summarize_range(start_date, end_date)
+    check(summaries)
+    daily, weekly, monthly, overall = summaries
+    return {'days': [period_to_json(summary, goal_nutrition_info) for summary in daily],
+        'weeks': [period_to_json(summary, goal_nutrition_info) for summary in weekly],
+        'months': [period_to_json(summary, goal_nutrition_info) for summary in monthly],
+        'overall': period_to_json(overall, goal_nutrition_info)}
+
+# Returns the rolling averages, streaks and per-nutrient adherence rates of the user, see goal_trends.
+def trends(query):
+    summary = nutrition_accessor.get_trends()
+    check(summary, 500)
+    adherence = None
+    if summary.adherence() is not None:
+        adherence = {macro_name: summary.adherence(index) for index, macro_name in enumerate(goal_trends.MACRO_NAMES)}
+        adherence['all'] = summary.adherence()
+    return {'date': None if summary.latest_date is None else fileutils.datetime_to_string(summary.latest_date),
+        'averages': [{'days': rolling_average.window_days, 'days_with_entries': rolling_average.days,
+            'average': nutrition_to_json(rolling_average.average()), 'goal_delta': goal_delta_to_json(rolling_average.average(), summary.goal)}
+            for rolling_average in summary.averages],
+        'streak': summary.counts.streak, 'best_streak': summary.counts.best_streak, 'days_compared': summary.counts.days, 'adherence': adherence}
+
+# Runs the provided operation with the given user's data directory selected on the current worker thread.
+# The operation is timed and its file I/O counted under its name, e.g. "set-goal", if instrumentation is enabled.
+def run_as_user(user_name, operation, argument):
+    fileutils.set_current_user(user_name)
+    try:
+        return instrumentation.run_command(operation.__name__.replace('_', '-'), operation, argument)
+    finally:
+        fileutils.set_current_user(None)
+
+# Reads a single line from the stream, raising a RequestError with the given status code and message if it is longer
+# than the stream's limit. The rest of such a line is left unread, so the connection must be closed after replying.
+async def read_line(reader, status_code, message):
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise RequestError(status_code, message)
+
+# Serves the add-food, eat, set-goal, report and trends operations over HTTP/JSON to many users at once.
+# Every user has their own data directory under data/users/, while the food catalog is shared and kept warm in memory.
+# Blocking file I/O runs on a bounded thread pool, and the operations of each user are serialized with a per-user lock
+# so that their day files, rollups and goals are never written by two threads at once.
+class FoodService:
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.user_locks = weakref.WeakValueDictionary()
+        self.catalog_lock = asyncio.Lock()
+
+    # Returns the lock serializing the operations of the given user. Locks are only kept while a request of the
+    # user holds or waits for them, so that a long-running service does not keep one for every user it has seen.
+    def user_lock(self, user_name):
+        lock = self.user_locks.get(user_name)
+        if lock is None:
+            lock = self.user_locks[user_name] = asyncio.Lock()
+        return lock
+
+    # Runs the blocking operation on the worker pool while holding the provided lock.
+    async def run_blocking(self, lock, user_name, operation, argument):
+        async with lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, run_as_user, user_name, operation, argument)
+
+    # Routes the request to its operation, returning the payload to reply with: a dictionary sent as JSON,
+    # or a string sent as plain text.
+    async def dispatch(self, request):
+        parts = [part for part in request.path.split('/') if part != '']
+        if parts == ['metrics']:
+            if request.method != 'GET':
+                raise RequestError(405, 'Use GET to read the metrics')
+            if not instrumentation.ENABLED:
+                raise RequestError(404, 'Metrics are disabled. Start the service with --metrics to collect them.')
+            return instrumentation.prometheus_text()
+        if parts == ['foods']:
+            if request.method != 'POST':
+                raise RequestError(405, 'Use POST to add food items')
+            return await self.run_blocking(self.catalog_lock, None, add_food, request.json())
+        if len(parts) != 3 or parts[0] != 'users':
+            raise RequestError(404, 'Unknown endpoint {0}\n{1}'.format(request.path, SERVICE_USAGE))
+        user_name = urllib.parse.unquote(parts[1])
+        if not fileutils.valid_user_name(user_name):
+            raise RequestError(400, 'Invalid user name: {0}'.format(user_name))
+        operations = {('POST', 'eat'): (eat, request.json), ('PUT', 'goal'): (set_goal, request.json),
+            ('GET', 'report'): (report, lambda: request.query), ('GET', 'trends'): (trends, lambda: request.query)}
+        if (request.method, parts[2]) not in operations:
+            raise RequestError(404, 'Unknown endpoint {0} {1}\n{2}'.format(request.method, request.path, SERVICE_USAGE))
+        operation, argument = operations[(request.method, parts[2])]
+        return await self.run_blocking(self.user_lock(user_name), user_name, operation, argument())
+
+    # Reads a single HTTP/1.1 request from the stream, returning None once the client has disconnected.
+    async def read_request(self, reader):
+        request_line = await read_line(reader, 414, 'The request line is too long')
+        if request_line == b'':
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise RequestError(400, 'Malformed request line')
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = (await read_line(reader, 431, 'A request header is too long')).decode('latin-1').strip()
+            if line == '':
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise RequestError(431, 'Too many request headers')
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise RequestError(400, 'Invalid Content-Length')
+        if length < 0 or length > MAX_BODY_BYTES:
+            raise RequestError(413, 'The request body is too large')
+        body = await reader.readexactly(length)
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        return Request(method.upper(), url.path, query, headers, body)
+
+    # Serves requests from a single client connection until it disconnects or asks to close it.
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False # Until a whole request is read, as the stream may be left mid-request
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request.keep_alive()
+                    status_code, reply = 200, await self.dispatch(request)
+                    if isinstance(reply, dict):
+                        reply['ok'] = True
+                except RequestError as error:
+                    status_code, reply = error.status_code, {'ok': False, 'error': error.message}
+                except Exception as error:
+                    status_code, reply = 500, {'ok': False, 'error': str(error)}
+                if isinstance(reply, str):
+                    content_type, body = METRICS_CONTENT_TYPE, reply.encode()
+                else:
+                    content_type, body = JSON_CONTENT_TYPE, json.dumps(reply).encode()
+                writer.write('HTTP/1.1 {0} {1}\r\nContent-Type: {2}\r\nContent-Length: {3}\r\nConnection: {4}\r\n\r\n'.format(
+                    status_code, REASONS[status_code], content_type, len(body), 'keep-alive' if keep_alive else 'close').encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # Warms the storage backend and serves clients until cancelled.
+    async def serve(self, host, port):
+        food_processor.backend().warm()
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print('Serving on http://{0}:{1}'.format(host, port))
+        async with server:
+            await server.serve_forever()
+
+# Example invocation: python food_service.py --port 8080 --workers 8
+# With --data-dir, every file is read from and written to that directory instead of data/, e.g. for a load test.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves the food tracker to many users over HTTP/JSON.', epilog=SERVICE_USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='number of threads running blocking file I/O')
+    parser.add_argument('--metrics', action='store_true', help='time each endpoint and count its file I/O, served at GET /metrics')
+    parser.add_argument('--data-dir', help='directory holding the food items and users, data/ by default')
+    args = parser.parse_args()
+    if args.data_dir is not None:
+        fileutils.set_custom_data_dirpath(args.data_dir)
+    if args.metrics:
+        instrumentation.enable()
+    service = FoodService(args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVICE_FILEPATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'food_service.py')
+SERVICE_START_SECONDS=10
+
+# Simple client holding a keep-alive connection to the food service.
+class ServiceClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    # Sends a single request and returns the (status_code, reply) pair.
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.writer.write('{0} {1} HTTP/1.1\r\nHost: {2}\r\nContent-Type: application/json\r\nContent-Length: {3}\r\n\r\n'.format(
+            method, path, self.host, len(body)).encode('latin-1') + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        status_code = int(status_line.split(b' ')[1])
+        length = 0
+        while True:
+            line = (await self.reader.readline()).strip()
+            if line == b'':
+                break
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                length = int(value.strip())
+        return (status_code, json.loads(await self.reader.readexactly(length)))
+
+# Runs the requests of a single simulated user, recording the latency of each one.
+async def run_client(host, port, client_index, requests, foods, latencies, failures):
+    client = ServiceClient(host, port)
+    await client.connect()
+    user_name = 'load_test_user_{0}'.format(client_index)
+    rng = random.Random(client_index)
+    try:
+        for i in range(requests):
+            date = '{0}-{1}-2024'.format(rng.randint(1, 12), rng.randint(1, 28))
+            if i % 5 == 4:
+                method, path, payload = 'GET', '/users/{0}/report?start=1-1-2024&end=12-31-2024'.format(user_name), None
+            elif i % 10 == 3:
+                method, path, payload = 'PUT', '/users/{0}/goal'.format(user_name), {'calories': 2000, 'carbs': 250, 'fats': 70, 'proteins': 100}
+            else:
+                method, path, payload = 'POST', '/users/{0}/eat'.format(user_name), {'name': rng.choice(foods), 'percent': rng.randint(25, 100), 'date': date}
+            started = time.perf_counter()
+            status_code, reply = await client.request(method, path, payload)
+            latencies.append(time.perf_counter() - started)
+            if status_code != 200 or not reply.get('ok'):
+                failures.append((method, path, status_code, reply.get('error')))
+    finally:
+        await client.close()
+
+# Returns the given percentile of the sorted list of values.
+def percentile(sorted_values, percent):
+    if len(sorted_values) == 0:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+# Starts food_service.py on host and port with its data in data_dirpath, and waits until it accepts connections.
+# Returns the service process.
+async def start_service(host, port, data_dirpath):
+    process = subprocess.Popen([sys.executable, SERVICE_FILEPATH, '--host', host, '--port', str(port), '--data-dir', data_dirpath],
+        stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVICE_START_SECONDS
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise SystemExit('The food service could not be started on {0}:{1}'.format(host, port))
+            await asyncio.sleep(0.05)
+            continue
+        writer.close()
+        await writer.wait_closed()
+        return process
+
+# Adds food_count food items to the catalog of the service, then runs the clients against it and prints their throughput
+# and latencies. Returns the number of failed requests.
+async def run_load_test(host, port, clients, requests, food_count):
+    setup = ServiceClient(host, port)
+    await setup.connect()
+    foods = ['load_test_food_{0}'.format(i) for i in range(food_count)]
+    for i, food_name in enumerate(foods):
+        await setup.request('POST', '/foods', {'name': food_name, 'calories': 100 + i, 'carbs': 10, 'fats': 5, 'proteins': 3, 'overwrite': True})
+    await setup.close()
+
+    latencies = []
+    failures = []
+    started = time.perf_counter()
+    await asyncio.gather(*[run_client(host, port, client_index, requests, foods, latencies, failures) for client_index in range(clients)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print('{0} clients sent {1} requests in {2:.2f}s: {3:.0f} requests/sec'.format(clients, len(latencies), elapsed, len(latencies) / elapsed))
+    print('Latency p50 {0:.1f}ms, p99 {1:.1f}ms, max {2:.1f}ms'.format(
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, latencies[-1] * 1000 if latencies else 0))
+    print('{0} failed requests'.format(len(failures)))
+    for failure in failures[:10]:
+        print('    {0} {1}: {2} {3}'.format(*failure))
+    return len(failures)
+
+# Runs the load test against a food service of its own, started with a scratch data directory which is removed
+# afterwards unless `keep` is true, so that the real catalog and users are never touched. See run_load_test.
+async def run_scratch_load_test(host, port, clients, requests, food_count, keep):
+    data_dirpath = tempfile.mkdtemp(prefix='food_in_me_load_')
+    process = None
+    try:
+        process = await start_service(host, port, data_dirpath)
+        return await run_load_test(host, port, clients, requests, food_count)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if keep:
+            print('Data kept in {0}'.format(data_dirpath))
+        else:
+            shutil.rmtree(data_dirpath, ignore_errors=True)
+
+# Example invocation: python food_service_load_test.py --clients 200 --requests 50
+# A food service is started against a scratch data directory, which is removed afterwards unless --keep is passed.
+# With --use-running-service, the service already running on --host and --port is used instead. The test then adds
+# load_test_food_<n> food items to that service's catalog and records meals for load_test_user_<n> users, so point it
+# at a service started with e.g. "python food_service.py --data-dir /tmp/food_in_me_load" rather than at the real data/.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs many concurrent clients against a local food service, started with a scratch data directory by default.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=50, help='requests sent by each client')
+    parser.add_argument('--foods', type=int, default=20, help='food items added to the catalog before the test')
+    parser.add_argument('--use-running-service', action='store_true', help='test the service already running, writing to its data directory')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch data directory for inspection')
+    args = parser.parse_args()
+
+    if args.use_running_service:
+        failures = asyncio.run(run_load_test(args.host, args.port, args.clients, args.requests, args.foods))
+    else:
+        failures = asyncio.run(run_scratch_load_test(args.host, args.port, args.clients, args.requests, args.foods, args.keep))
+    raise SystemExit(1 if failures > 0 else 0)
\ No newline at end of file
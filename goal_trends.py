@@ -0,0 +1,257 @@
+import datetime
+import fileutils
+import nutrition_information
+import status
+
+STATE_VERSION=1
+# Days whose totals are kept in the state, ending on the latest day with entries. Older days are only kept as counts.
+WINDOW_DAYS=30
+# Lengths in days of the rolling averages, none of which may exceed WINDOW_DAYS.
+ROLLING_WINDOWS=[7, 30]
+MACRO_NAMES=['calories', 'carbs', 'fats', 'proteins']
+
+# Returns the provided date or datetime as a datetime.date.
+def as_date(date):
+    return datetime.date(date.year, date.month, date.day)
+
+# Returns a list of whether each of the calories, carbs, fats and proteins of the total is within the goal, i.e. at most it.
+def within_goal(total, goal):
+    return [value <= goal_value for value, goal_value in zip(total.values(), goal.values())]
+
+# Simple class to count, day by day in chronological order, how many days were within the goal for each macro and
+# for all of them at once, along with the current and best streaks of consecutive days within the goal.
+class AdherenceCounts:
+    def __init__(self, days=0, within=None, within_all=0, streak=0, best_streak=0):
+        self.days = days
+        self.within = [0] * len(MACRO_NAMES) if within is None else within
+        self.within_all = within_all
+        self.streak = streak
+        self.best_streak = best_streak
+
+    # Counts the next day, whose total is None if it had no entries, against the goal. Days without entries,
+    # or without a goal to compare against, are not counted and end the streak.
+    def add(self, total, goal):
+        if total is None or goal is None:
+            self.streak = 0
+            return
+        within = within_goal(total, goal)
+        self.days += 1
+        for index, macro_within in enumerate(within):
+            self.within[index] += macro_within
+        if all(within):
+            self.within_all += 1
+            self.streak += 1
+            self.best_streak = max(self.best_streak, self.streak)
+        else:
+            self.streak = 0
+
+    def copy(self):
+        return AdherenceCounts(self.days, list(self.within), self.within_all, self.streak, self.best_streak)
+
+    def to_csv(self):
+        return ','.join(str(count) for count in [self.days] + self.within + [self.within_all, self.streak, self.best_streak])
+
+# Parses the CSV fields written by AdherenceCounts.to_csv. Raises ValueError if they are malformed.
+def parse_adherence_counts(fields):
+    if len(fields) != len(MACRO_NAMES) + 4:
+        raise ValueError(fields)
+    counts = [int(field) for field in fields]
+    return AdherenceCounts(counts[0], counts[1:-3], *counts[-3:])
+
+# Simple class to hold the rolling average of the days with entries among the last window_days days.
+class RollingAverage:
+    def __init__(self, window_days, days, total):
+        self.window_days = window_days
+        self.days = days
+        self.total = total
+
+    def average(self):
+        days = max(self.days, 1)
+        return nutrition_information.NutritionInformation(
+            self.total.calories / days, self.total.carbs / days, self.total.fats / days, self.total.proteins / days)
+
+# Simple class to hold the goal-tracking statistics of a user as of their latest day with entries, see GoalTrends.summary.
+class TrendsSummary:
+    def __init__(self, goal, latest_date, averages, counts):
+        self.goal = goal
+        self.latest_date = latest_date
+        self.averages = averages
+        self.counts = counts
+
+    # Returns the fraction of the days compared against the goal which were within it, for the macro at the given
+    # index of MACRO_NAMES, or for all macros at once if index is None. Returns None if no day was compared.
+    def adherence(self, index=None):
+        if self.counts.days == 0:
+            return None
+        within = self.counts.within_all if index is None else self.counts.within[index]
+        return within / self.counts.days
+
+# The materialized goal-tracking statistics of a user, kept up to date as foods are eaten and goals are set rather
+# than recomputed from the whole history. The totals of the WINDOW_DAYS days ending on the latest day with entries
+# are kept, which is all the rolling averages need. Days leaving that window are folded into AdherenceCounts, judged
+# against the goal in effect at that point, while the days still in the window are judged against the current goal
+# whenever a summary is made. So recording a day or a goal costs at most WINDOW_DAYS steps however long the history is.
+# Entries recorded for a day which already left the window mark the state as stale, to be rebuilt from the history.
+class GoalTrends:
+    def __init__(self, goal=None):
+        self.goal = goal
+        self.latest_date = None
+        self.recent_totals = {}
+        self.finalized = AdherenceCounts()
+        self.stale = False
+
+    # Returns the first date of the window ending on the latest day with entries.
+    def window_start(self):
+        return self.latest_date - datetime.timedelta(days=WINDOW_DAYS - 1)
+
+    # Moves the window forward to end on date, folding the days which leave it into the finalized counts.
+    def advance(self, date):
+        if self.latest_date is None:
+            self.latest_date = date
+            return
+        days = (date - self.latest_date).days
+        if days <= 0:
+            return
+        window_start = self.window_start()
+        for offset in range(min(days, WINDOW_DAYS)):
+            self.finalized.add(self.recent_totals.pop(window_start + datetime.timedelta(days=offset), None), self.goal)
+        if days > WINDOW_DAYS: # The days between the old and new windows had no entries
+            self.finalized.add(None, self.goal)
+        self.latest_date = date
+
+    # Records the NutritionInformation total of every entry of the given date so far, replacing the previous total.
+    def record_day(self, date, total):
+        date = as_date(date)
+        if self.latest_date is not None and date < self.window_start():
+            self.stale = True
+            return
+        self.advance(date)
+        self.recent_totals[date] = total
+
+    # Replaces the goal the days are judged against. If there was no goal before, none of the finalized days were
+    # judged, so the state is marked as stale to judge the whole history against the new goal.
+    def set_goal(self, goal):
+        if self.goal is None and self.latest_date is not None:
+            self.stale = True
+        self.goal = goal
+
+    # Returns the TrendsSummary of the current statistics, counting the days of the window against the current goal.
+    def summary(self):
+        counts = self.finalized.copy()
+        averages = []
+        if self.latest_date is not None:
+            window_start = self.window_start()
+            for offset in range(WINDOW_DAYS):
+                counts.add(self.recent_totals.get(window_start + datetime.timedelta(days=offset)), self.goal)
+        for window_days in ROLLING_WINDOWS:
+            totals = [total for date, total in self.recent_totals.items() if (self.latest_date - date).days < window_days]
+            averages.append(RollingAverage(window_days, len(totals), sum(totals, nutrition_information.NutritionInformation(0, 0, 0, 0))))
+        return TrendsSummary(self.goal, self.latest_date, averages, counts)
+
+    def to_csv(self):
+        lines = ['version,{0}'.format(STATE_VERSION), 'stale,{0}'.format(int(self.stale)), 'finalized,' + self.finalized.to_csv()]
+        if self.goal is not None:
+            lines.append('goal,' + self.goal.to_csv())
+        if self.latest_date is not None:
+            lines.append('latest,' + self.latest_date.isoformat())
+        lines += ['day,{0},{1}'.format(date.isoformat(), self.recent_totals[date].to_csv()) for date in sorted(self.recent_totals)]
+        return '\n'.join(lines) + '\n'
+
+# Attempts to parse the state written by GoalTrends.to_csv, returning None if it is malformed or of another version.
+def parse_trends(state):
+    lines = state.splitlines()
+    if len(lines) == 0 or lines[0] != 'version,{0}'.format(STATE_VERSION):
+        return None
+    trends = GoalTrends()
+    try:
+        for line in lines[1:]:
+            fields = line.split(',')
+            if fields[0] == 'stale':
+                trends.stale = fields[1] == '1'
+            elif fields[0] == 'finalized':
+                trends.finalized = parse_adherence_counts(fields[1:])
+            elif fields[0] == 'goal':
+                trends.goal = nutrition_information.NutritionInformation(*[float(field) for field in fields[1:]])
+            elif fields[0] == 'latest':
+                trends.latest_date = datetime.date.fromisoformat(fields[1])
+            elif fields[0] == 'day':
+                trends.recent_totals[datetime.date.fromisoformat(fields[1])] = nutrition_information.NutritionInformation(*[float(field) for field in fields[2:]])
+            else:
+                return None
+    except (ValueError, IndexError, TypeError):
+        return None
+    if trends.latest_date is None and len(trends.recent_totals) > 0:
+        return None
+    return trends
+
+# Returns the GoalTrends of the current user rebuilt from their whole history in the storage backend, with every day
+# judged against the current goal, or a Status if the history could not be read.
+def rebuild_trends(backend):
+    goal = backend.get_goal_nutrition_information()
+    trends = GoalTrends(None if isinstance(goal, status.Status) else goal)
+    daily_rollups = backend.daily_rollups(datetime.date.min, datetime.date.max)
+    if isinstance(daily_rollups, status.Status):
+        return daily_rollups
+    for date, rollup in daily_rollups:
+        trends.record_day(date, rollup.nutrition_information)
+    return trends
+
+# Returns the stored GoalTrends state of the current user parsed, or None if there is none or it must be rebuilt.
+def usable_trends(state):
+    trends = None if state is None else parse_trends(state)
+    if trends is None or trends.stale:
+        return None
+    return trends
+
+# Updates the current user's trends with the total of the given date, once entries were recorded for it. The total
+# is taken from the day's rollup, already updated as the entries were recorded, rather than from its entries.
+# Nothing is stored until the trends are first requested with current_trends. If the rollup cannot be read,
+# the trends are marked as stale to be rebuilt on the next request.
+# Returns a Status indicating whether the trends were updated.
+def record_day_eaten(backend, date):
+    errors = []
+    def update(state):
+        trends = usable_trends(state)
+        if trends is None:
+            return None
+        daily_rollups = backend.daily_rollups(date, date)
+        if isinstance(daily_rollups, status.Status):
+            errors.append(daily_rollups)
+            trends.stale = True
+        else:
+            for rollup_date, rollup in daily_rollups:
+                trends.record_day(rollup_date, rollup.nutrition_information)
+        return trends.to_csv()
+    backend.update_trends(update)
+    if len(errors) > 0:
+        return status.Status(False, 'Your goal trends will be rebuilt from your history, since the total of {0} could not be read: {1}'.format(
+            fileutils.datetime_to_string(date), errors[0].error()))
+    return status.Status(True)
+
+# Updates the current user's trends with their new goal NutritionInformation.
+def record_goal(backend, goal):
+    def update(state):
+        trends = usable_trends(state)
+        if trends is None:
+            return None
+        trends.set_goal(goal)
+        return trends.to_csv()
+    backend.update_trends(update)
+
+# Returns the TrendsSummary of the current user, read from their stored trends. The trends are only rebuilt from the
+# whole history when requested for the first time, or after entries were recorded for a day long past.
+# Returns a Status if the history could not be read.
+def current_trends(backend):
+    results = []
+    def update(state):
+        trends = usable_trends(state)
+        if trends is not None:
+            results.append(trends)
+            return None
+        trends = rebuild_trends(backend)
+        results.append(trends)
+        return None if isinstance(trends, status.Status) else trends.to_csv()
+    backend.update_trends(update)
+    if isinstance(results[0], status.Status):
+        return results[0]
+    return results[0].summary()
\ No newline at end of file
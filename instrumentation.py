@@ -0,0 +1,181 @@
+import threading
+import time
+
+# Whether commands are timed and file I/O is counted. While disabled, run_command calls straight through,
+# files are not wrapped and count returns immediately, so the instrumentation costs next to nothing.
+ENABLED=False
+METRIC_PREFIX='food_in_me'
+FILE_OPENS='file_opens'
+BYTES_READ='bytes_read'
+BYTES_WRITTEN='bytes_written'
+LINES_PARSED='lines_parsed'
+COUNTER_NAMES=[FILE_OPENS, BYTES_READ, BYTES_WRITTEN, LINES_PARSED]
+COUNTER_DESCRIPTIONS={FILE_OPENS: 'Files opened', BYTES_READ: 'Bytes read from files, counting characters for text files',
+    BYTES_WRITTEN: 'Bytes written to files, counting characters for text files', LINES_PARSED: 'Lines parsed from files'}
+# The command that file I/O outside of any command is attributed to, e.g. loading the catalog at startup.
+OTHER_COMMAND='other'
+
+# Totals of every command run so far, keyed by command name.
+COMMAND_METRICS={}
+COMMAND_METRICS_LOCK=threading.Lock()
+# The counters of the command running on the current thread, and the last command it completed.
+CURRENT=threading.local()
+
+# Simple class to hold the totals of every run of a single command.
+class CommandMetrics:
+    def __init__(self, command):
+        self.command = command
+        self.runs = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.counters = dict.fromkeys(COUNTER_NAMES, 0)
+
+    # Adds a single run of the command, which took the given seconds and changed the given counters.
+    def record(self, seconds, counters):
+        self.runs += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for name, value in counters.items():
+            self.counters[name] += value
+
+# Simple class to hold the measurements of a single run of a command.
+class CommandSample:
+    def __init__(self, command, seconds, counters):
+        self.command = command
+        self.seconds = seconds
+        self.counters = counters
+
+    def to_string(self):
+        return '{0} took {1:.2f} ms: {2} file opens, {3} bytes read, {4} bytes written, {5} lines parsed'.format(
+            self.command, self.seconds * 1000, self.counters[FILE_OPENS], self.counters[BYTES_READ],
+            self.counters[BYTES_WRITTEN], self.counters[LINES_PARSED])
+
+# Wraps an open file object, counting the data read from and written to it.
+class CountingFile:
+    def __init__(self, file_object):
+        self.file = file_object
+
+    def read(self, *args):
+        data = self.file.read(*args)
+        count(BYTES_READ, len(data))
+        return data
+
+    def readline(self, *args):
+        line = self.file.readline(*args)
+        count(BYTES_READ, len(line))
+        count(LINES_PARSED)
+        return line
+
+    # Lines iterated over are counted as parsed, as every caller iterating over a file parses each line.
+    def __iter__(self):
+        for line in self.file:
+            count(BYTES_READ, len(line))
+            count(LINES_PARSED)
+            yield line
+
+    def write(self, data):
+        count(BYTES_WRITTEN, len(data))
+        return self.file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.file.close()
+
+    # Everything else, such as seek, flush and fileno, is passed through to the file object.
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+# Starts timing commands and counting file I/O.
+def enable():
+    global ENABLED
+    ENABLED = True
+
+# Stops timing commands and counting file I/O. The totals so far are kept.
+def disable():
+    global ENABLED
+    ENABLED = False
+
+# Clears the totals of every command.
+def reset():
+    with COMMAND_METRICS_LOCK:
+        COMMAND_METRICS.clear()
+
+# Returns the totals of the given command, creating them if necessary. Must be called with COMMAND_METRICS_LOCK held.
+def command_metrics(command):
+    metrics = COMMAND_METRICS.get(command)
+    if metrics is None:
+        metrics = COMMAND_METRICS[command] = CommandMetrics(command)
+    return metrics
+
+# Adds amount to the named counter of the command running on the current thread.
+def count(name, amount=1):
+    if not ENABLED:
+        return
+    counters = getattr(CURRENT, 'counters', None)
+    if counters is not None:
+        counters[name] += amount
+        return
+    with COMMAND_METRICS_LOCK:
+        command_metrics(OTHER_COMMAND).counters[name] += amount
+
+# Returns the provided newly opened file object, wrapped so that reads and writes are counted if enabled.
+def counted(file_object):
+    if not ENABLED:
+        return file_object
+    count(FILE_OPENS)
+    return CountingFile(file_object)
+
+# Runs function(*args) as the given command, timing it and attributing the file I/O of the current thread to it.
+# Returns the result of the function.
+def run_command(command, function, *args):
+    if not ENABLED:
+        return function(*args)
+    previous_counters = getattr(CURRENT, 'counters', None)
+    counters = CURRENT.counters = dict.fromkeys(COUNTER_NAMES, 0)
+    start = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        seconds = time.perf_counter() - start
+        CURRENT.counters = previous_counters
+        CURRENT.last_sample = CommandSample(command, seconds, counters)
+        with COMMAND_METRICS_LOCK:
+            command_metrics(command).record(seconds, counters)
+
+# Returns a one line summary of the last command completed on the current thread, or None if there is none.
+def last_summary():
+    sample = getattr(CURRENT, 'last_sample', None)
+    return None if sample is None else sample.to_string()
+
+# Returns a line of the Prometheus text format.
+def prometheus_line(metric, command, value):
+    return '{0}_{1}{{command="{2}"}} {3}\n'.format(METRIC_PREFIX, metric, command.replace('\\', '\\\\').replace('"', '\\"'), value)
+
+# Returns the totals of every command in the Prometheus text exposition format.
+def prometheus_text():
+    with COMMAND_METRICS_LOCK:
+        commands = sorted(COMMAND_METRICS.values(), key=lambda metrics: metrics.command)
+        text = '# HELP {0}_command_duration_seconds Wall time spent running each command.\n'.format(METRIC_PREFIX)
+        text += '# TYPE {0}_command_duration_seconds summary\n'.format(METRIC_PREFIX)
+        for metrics in commands:
+            if metrics.runs > 0:
+                text += prometheus_line('command_duration_seconds_sum', metrics.command, repr(metrics.seconds))
+                text += prometheus_line('command_duration_seconds_count', metrics.command, metrics.runs)
+        text += '# HELP {0}_command_max_duration_seconds Longest wall time of a single run of each command.\n'.format(METRIC_PREFIX)
+        text += '# TYPE {0}_command_max_duration_seconds gauge\n'.format(METRIC_PREFIX)
+        for metrics in commands:
+            if metrics.runs > 0:
+                text += prometheus_line('command_max_duration_seconds', metrics.command, repr(metrics.max_seconds))
+        for name in COUNTER_NAMES:
+            text += '# HELP {0}_{1}_total {2}.\n'.format(METRIC_PREFIX, name, COUNTER_DESCRIPTIONS[name])
+            text += '# TYPE {0}_{1}_total counter\n'.format(METRIC_PREFIX, name)
+            for metrics in commands:
+                text += prometheus_line(name + '_total', metrics.command, metrics.counters[name])
+    return text
+
+# Writes the totals of every command to a file in the Prometheus text exposition format, e.g. for a textfile collector.
+def write_prometheus_text(filepath):
+    with open(filepath, 'w') as output:
+        output.write(prometheus_text())
\ No newline at end of file
@@ -1,103 +1,160 @@
 import datetime
 import fileutils
-import food_item
+import goal_trends
+import nutrition_analytics
 import nutrition_information
-import os
 import status
+import storage_backend
 
-USER_GOAL_FILENAME='goals.csv'
+# Simple class to hold the report of a single day: the total consumed, the daily goal it is compared against if
+# one is set, or why it could not be read otherwise, and the per-item breakdown if a detailed report was asked for.
+class StatusReport:
+    def __init__(self, date, total, goal=None, breakdown=None, goal_error=None):
+        self.date = date
+        self.total = total
+        self.goal = goal
+        self.breakdown = breakdown
+        self.goal_error = goal_error
 
-# Returns the filepath to the user's nutrition goals.
-def goals_filepath():
-    return fileutils.user_consumption_dirpath() + USER_GOAL_FILENAME
+    # Returns the difference between the total and the goal, or None without a goal.
+    def goal_delta(self):
+        return None if self.goal is None else self.total - self.goal
 
-# Adds item to map if not already existing, or increments otherwise.
-def add_or_increment(dictionary, key, value):
-    if key in dictionary:
-        dictionary[key] += value
-    else:
-        dictionary[key] = value
-
-# Returns a NutritionInformation object aggregating the food consumed in the provided status_filepath,
+# Returns a NutritionInformation object aggregating the food consumed on the provided status_date,
 # or an error status indicating a failed precondition.
-# If detailed_results is provided as an empty vector, each individual item name will be added.
-def get_daily_nutrition_information(status_date_string, detailed_results=None):
-    dirpath = fileutils.user_consumption_dirpath()
-    status_filepath = dirpath + status_date_string + '.csv'
-    if not os.path.exists(status_filepath):
-        return status.Status(False, 'No entries recorded for {0}'.format(status_date_string))
-
-    total_calories = 0
-    total_carbs = 0
-    total_fats = 0
-    total_proteins = 0
-    
-    with open(status_filepath, 'r') as input:
-        for line in input:
-            if line == '': continue # Skip empty lines
-            fooditem = food_item.parse_food_item(line.strip(), ',')
-            if fooditem is None:
-                return status.Status(False, 'Failed to parse "{0}" from data/custom_foods.csv as a food item'.format(line.strip()))
-            try:
-                total_calories += float(fooditem.calories())
-                total_carbs += float(fooditem.carbs())
-                total_fats += float(fooditem.fats())
-                total_proteins += float(fooditem.proteins())
-            except Exception as e:
-                return status.Status(False, 'Failed to parse "{0}" from data/custom_foods.csv as a valid food item'.format(line.strip()))
-            if detailed_results is not None:
-                add_or_increment(detailed_results, fooditem.name, fooditem.nutrition_information)
-    return nutrition_information.NutritionInformation(total_calories, total_carbs, total_fats, total_proteins)
-    
+# If detailed_results is provided as an empty dictionary, each individual item name will be added.
+def get_daily_nutrition_information(status_date, detailed_results=None):
+    return storage_backend.current().get_daily_nutrition_information(status_date, detailed_results)
+
 # Returns a NutritionInformation object representing the daily nutrition goals of the user,
 # or a Status object indicating that information could not be retrieved.
 def get_goal_nutrition_information():
-    goal_filepath = goals_filepath()
-    if os.path.exists(goal_filepath):
-        with open(goal_filepath, 'r') as input:
-            goal_text = input.readline()
-            try:
-                numbers = goal_text.split(',')
-                goal_calories = float(numbers[0])
-                goal_carbs = float(numbers[1])
-                goal_fats = float(numbers[2])
-                goal_proteins = float(numbers[3])
-            except:
-                return status.Status(False, 'Invalid goal file. Reset your nutrition goal with the "set-goal" command.')
-            return nutrition_information.NutritionInformation(goal_calories, goal_carbs, goal_fats, goal_proteins)
-    else:
-        return status.Status(False, 'Missing goal file. Consider setting your nutrition goals with the "set-goal" command.')
+    return storage_backend.current().get_goal_nutrition_information()
 
-### ---------------------------------- PUBLIC functions ---------------------------------------------- ###
+# Returns the (daily, weekly, monthly, overall) PeriodSummary objects for all foods consumed between
+# start_date and end_date inclusive, see nutrition_rollup.summarize_daily_rollups.
+def summarize_range(start_date, end_date):
+    return storage_backend.current().summarize_range(start_date, end_date)
 
-# Sets the daily goal nutritional values for the user, overriding the previous entry if applicable.
-def set_goals(calories, carbs, fats, proteins):
-    daily_goal = '{0},{1},{2},{3}'.format(calories, carbs, fats, proteins)
-    with open(goals_filepath(), 'w') as output:
-        output.write(daily_goal)
+# Returns the TrendsSummary of the user's rolling averages, streaks and adherence to their goals,
+# or a Status indicating why it could not be computed. See goal_trends.current_trends.
+def get_trends():
+    return goal_trends.current_trends(storage_backend.current())
 
-# Prints the status report for a given date, for the amount of calories and other nutrients consumed.
-def print_status_report(status_date, detailed_report):
+# Returns the StatusReport of the food consumed on status_date, with the per-item breakdown if detailed_report is true,
+# or a Status indicating a failed precondition.
+def get_status_report(status_date, detailed_report=False):
     if not isinstance(status_date, datetime.date):
         return status.Status(False, 'Invalid status date. Expected a datetime.date object')
-    status_date_string = fileutils.datetime_to_string(status_date)
-
     detailed_results = {} if detailed_report else None
-    daily_nutrition_info = get_daily_nutrition_information(status_date_string, detailed_results)
+    daily_nutrition_info = get_daily_nutrition_information(status_date, detailed_results)
     if isinstance(daily_nutrition_info, status.Status):
         return daily_nutrition_info
+    goal_nutrition_info = get_goal_nutrition_information()
+    if isinstance(goal_nutrition_info, status.Status):
+        return StatusReport(status_date, daily_nutrition_info, None, detailed_results, goal_nutrition_info.error())
+    return StatusReport(status_date, daily_nutrition_info, goal_nutrition_info, detailed_results)
+
+### ---------------------------------- PUBLIC functions ---------------------------------------------- ###
+
+# Sets the daily goal nutritional values for the user, overriding the previous entry if applicable.
+def set_goals(calories, carbs, fats, proteins):
+    storage_backend.current().set_goals(calories, carbs, fats, proteins)
+    goal_trends.record_goal(storage_backend.current(), nutrition_information.NutritionInformation(calories, carbs, fats, proteins))
+
+# Prints the status report for a given date, for the amount of calories and other nutrients consumed.
+def print_status_report(status_date, detailed_report):
+    report = get_status_report(status_date, detailed_report)
+    if isinstance(report, status.Status):
+        return report
+    daily_nutrition_info = report.total
     print('On {0}, you reported consuming {1} calories, {2} grams of carbs, {3} grams of fats and {4} grams of protein'.format(
-        status_date_string, daily_nutrition_info.calories, daily_nutrition_info.carbs, daily_nutrition_info.fats, daily_nutrition_info.proteins))
+        fileutils.datetime_to_string(status_date), daily_nutrition_info.calories, daily_nutrition_info.carbs, daily_nutrition_info.fats, daily_nutrition_info.proteins))
     
-    goal_nutrition_info = get_goal_nutrition_information()
-    if isinstance(goal_nutrition_info, nutrition_information.NutritionInformation):
-        print('Compared to your daily goals, this represents:\n{0}'.format(daily_nutrition_info.compare(goal_nutrition_info).replace(', ', '\n')))
+    if report.goal is not None:
+        print('Compared to your daily goals, this represents:\n{0}'.format(daily_nutrition_info.compare(report.goal).replace(', ', '\n')))
     else:
-        print(goal_nutrition_info.error())
+        print(report.goal_error)
     
-    if detailed_results is not None:    
+    if report.breakdown is not None:    
         print('Detailed breakdown of each item:')
-        for k, v in detailed_results.items():
+        for k, v in report.breakdown.items():
             print('{0}: {1}'.format(k.replace('_', ' '), v.to_string()))
 
+    return status.Status(True)
+
+# Prints a single line of a range report for the provided PeriodSummary, comparing its daily average
+# against the goal nutrition information if one is available.
+def print_period_summary(summary, goal_nutrition_info):
+    print('{0} ({1} days, {2} entries): total of {3}; daily average of {4}'.format(
+        summary.label, summary.days, summary.entries, summary.total.to_string(), summary.average().to_string()))
+    if goal_nutrition_info is not None:
+        print('    Compared to your daily goals, the daily average represents: {0}'.format(summary.average().compare(goal_nutrition_info)))
+
+# Prints the per-day, per-week and per-month totals, daily averages and goal deltas for all foods consumed
+# between start_date and end_date inclusive.
+def print_range_report(start_date, end_date):
+    if not isinstance(start_date, datetime.date) or not isinstance(end_date, datetime.date):
+        return status.Status(False, 'Invalid report dates. Expected datetime.date objects')
+    if end_date < start_date:
+        return status.Status(False, 'Invalid report dates. The end date must not be before the start date')
+
+    summaries = summarize_range(start_date, end_date)
+    if isinstance(summaries, status.Status):
+        return summaries
+    daily, weekly, monthly, overall = summaries
+    if overall.days == 0:
+        return status.Status(False, 'No entries recorded between {0} and {1}'.format(
+            fileutils.datetime_to_string(start_date), fileutils.datetime_to_string(end_date)))
+
+    goal_nutrition_info = get_goal_nutrition_information()
+    if isinstance(goal_nutrition_info, status.Status):
+        print(goal_nutrition_info.error())
+        goal_nutrition_info = None
+
+    print('Daily breakdown:')
+    for summary in daily:
+        print_period_summary(summary, goal_nutrition_info)
+    print('Weekly breakdown:')
+    for summary in weekly:
+        print_period_summary(summary, goal_nutrition_info)
+    print('Monthly breakdown:')
+    for summary in monthly:
+        print_period_summary(summary, goal_nutrition_info)
+    print('Overall:')
+    print_period_summary(overall, goal_nutrition_info)
+    if nutrition_analytics.available():
+        for percentile, nutrition_info in nutrition_analytics.percentiles_of([summary.total for summary in daily]).items():
+            print('{0}th percentile day: {1}'.format(percentile, nutrition_info.to_string()))
+
+    return status.Status(True)
+
+# Returns the provided fraction as a whole percentage string, e.g. "75%".
+def percentage(fraction):
+    return '{0:.0f}%'.format(fraction * 100)
+
+# Prints the rolling 7-day and 30-day averages, the streaks of days within the daily goals and the adherence rate
+# of each nutrient, as of the latest day with entries.
+def print_trends_report():
+    trends = get_trends()
+    if isinstance(trends, status.Status):
+        return trends
+    if trends.latest_date is None:
+        return status.Status(False, 'No entries recorded yet. Record what you eat with the "eat" command.')
+
+    print('As of {0}:'.format(fileutils.datetime_to_string(trends.latest_date)))
+    for rolling_average in trends.averages:
+        print('{0}-day average ({1} days with entries): {2}'.format(
+            rolling_average.window_days, rolling_average.days, rolling_average.average().to_string()))
+        if trends.goal is not None and rolling_average.days > 0:
+            print('    Compared to your daily goals, this represents: {0}'.format(rolling_average.average().compare(trends.goal)))
+    if trends.goal is None:
+        print('Missing nutrition goal. Consider setting your nutrition goals with the "set-goal" command to track streaks and adherence.')
+        return status.Status(True)
+
+    print('Current streak: {0} days within your daily goals. Best streak: {1} days.'.format(trends.counts.streak, trends.counts.best_streak))
+    if trends.counts.days > 0:
+        print('Within your daily goals on {0} of {1} days ({2}).'.format(trends.counts.within_all, trends.counts.days, percentage(trends.adherence())))
+        print('Adherence by nutrient: {0}'.format(', '.join('{0} {1}'.format(macro_name, percentage(trends.adherence(index)))
+            for index, macro_name in enumerate(goal_trends.MACRO_NAMES))))
     return status.Status(True)
\ No newline at end of file
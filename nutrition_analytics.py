@@ -0,0 +1,70 @@
+import instrumentation
+import itertools
+import nutrition_information
+try:
+    import numpy
+except ImportError: # NumPy is optional, callers fall back to the line by line path without it
+    numpy = None
+
+NUTRIENT_COLUMNS=['calories', 'carbs', 'fats', 'proteins']
+FIELDS_PER_ENTRY=5
+
+# Returns whether the vectorized aggregation engine can be used.
+def available():
+    return numpy is not None
+
+# Returns the structured dtype used to hold consumption entries, with names up to name_length characters.
+def entry_dtype(name_length):
+    return numpy.dtype([('name', 'U{0}'.format(max(name_length, 1)))] + [(column, 'f8') for column in NUTRIENT_COLUMNS])
+
+# Parses the contents of a single day file into a structured array of entries.
+# Returns None if the contents are not a well formed day file.
+def parse_day_contents(contents):
+    lines = contents.splitlines()
+    instrumentation.count(instrumentation.LINES_PARSED, len(lines))
+    if not all(lines):
+        lines = [line for line in lines if line.strip() != ''] # Skip empty lines
+    if len(lines) == 0:
+        return numpy.zeros(0, dtype=entry_dtype(1))
+    fields = numpy.array(','.join(lines).split(','))
+    if len(fields) != len(lines) * FIELDS_PER_ENTRY:
+        return None
+    fields = fields.reshape(len(lines), FIELDS_PER_ENTRY)
+    try:
+        values = fields[:, 1:].astype('f8')
+    except ValueError:
+        return None
+    entries = numpy.zeros(len(lines), dtype=entry_dtype(fields.dtype.itemsize // 4))
+    entries['name'] = fields[:, 0]
+    for i, column in enumerate(NUTRIENT_COLUMNS):
+        entries[column] = values[:, i]
+    return entries
+
+# Returns the NutritionInformation summing every entry in the provided array.
+def totals(entries):
+    return nutrition_information.NutritionInformation(*[float(entries[column].sum()) for column in NUTRIENT_COLUMNS])
+
+# Returns a dictionary mapping each food name to the NutritionInformation summing all of its entries,
+# in the order each name first appears.
+def breakdown_by_item(entries):
+    if len(entries) == 0:
+        return {}
+    names, first_index, inverse = numpy.unique(entries['name'], return_index=True, return_inverse=True)
+    sums = [numpy.bincount(inverse, weights=entries[column], minlength=len(names)) for column in NUTRIENT_COLUMNS]
+    breakdown = {}
+    for group in numpy.argsort(first_index, kind='stable'):
+        breakdown[str(names[group])] = nutrition_information.NutritionInformation(
+            *[float(column_sums[group]) for column_sums in sums])
+    return breakdown
+
+# Returns a dictionary mapping each requested percentile to a NutritionInformation holding that
+# percentile of each nutrient, across the provided NutritionInformation daily totals, e.g. the daily rollups.
+# The totals are copied into a single preallocated array, one row per day, which numpy.percentile reduces at once.
+def percentiles_of(daily_nutrition, percentiles=(50, 90, 99)):
+    if len(daily_nutrition) == 0:
+        return {}
+    sums = numpy.fromiter(itertools.chain.from_iterable(nutrition_info.values() for nutrition_info in daily_nutrition),
+        dtype='f8', count=len(daily_nutrition) * len(NUTRIENT_COLUMNS)).reshape(len(daily_nutrition), len(NUTRIENT_COLUMNS))
+    values = numpy.percentile(sums, percentiles, axis=0)
+    return {percentile: nutrition_information.NutritionInformation(*[float(value) for value in row])
+        for percentile, row in zip(percentiles, values)}
\ No newline at end of file
@@ -0,0 +1,67 @@
+import array
+import nutrition_information
+try:
+    import numpy
+except ImportError: # NumPy is optional, batches are summed with the array module without it
+    numpy = None
+
+VALUES_PER_ENTRY=4
+
+# Holds many named consumption entries contiguously: the names in a list, and the calories, carbs, fats and
+# proteins of every entry interleaved in a single array of doubles. Entries are only turned into
+# NutritionInformation objects when read one at a time, so totals never allocate an object per entry.
+class NutritionBatch:
+    __slots__ = ('names', 'values')
+
+    def __init__(self):
+        self.names = []
+        self.values = array.array('d')
+
+    def __len__(self):
+        return len(self.names)
+
+    # Appends an entry with the given name and NutritionInformation.
+    def append(self, name, nutrition_info):
+        self.append_values(name, nutrition_info.calories, nutrition_info.carbs, nutrition_info.fats, nutrition_info.proteins)
+
+    # Appends an entry with the given name and values.
+    def append_values(self, name, calories, carbs, fats, proteins):
+        self.names.append(name)
+        self.values.extend((calories, carbs, fats, proteins))
+
+    # Returns the NutritionInformation of the entry at the given index.
+    def nutrition_information(self, index):
+        offset = index * VALUES_PER_ENTRY
+        return nutrition_information.NutritionInformation(*self.values[offset:offset + VALUES_PER_ENTRY])
+
+    # Yields a (name, NutritionInformation) pair for every entry, in order.
+    def __iter__(self):
+        for index, name in enumerate(self.names):
+            yield (name, self.nutrition_information(index))
+
+    # Returns the NutritionInformation summing every entry, with NumPy if available.
+    def total(self):
+        if numpy is not None and len(self.values) > 0:
+            return nutrition_information.NutritionInformation(*numpy.frombuffer(self.values, dtype=numpy.float64).reshape(-1, VALUES_PER_ENTRY).sum(axis=0).tolist())
+        return nutrition_information.NutritionInformation(*(sum(self.values[column::VALUES_PER_ENTRY]) for column in range(VALUES_PER_ENTRY)))
+
+    # Returns a dictionary mapping each name to the NutritionInformation summing its entries, in order of first appearance.
+    def totals_by_name(self):
+        sums = {}
+        values = self.values
+        for index, name in enumerate(self.names):
+            offset = index * VALUES_PER_ENTRY
+            entry_sums = sums.get(name)
+            if entry_sums is None:
+                sums[name] = values[offset:offset + VALUES_PER_ENTRY].tolist()
+            else:
+                for column in range(VALUES_PER_ENTRY):
+                    entry_sums[column] += values[offset + column]
+        return {name: nutrition_information.NutritionInformation(*entry_sums) for name, entry_sums in sums.items()}
+
+# Returns a NutritionBatch holding the provided (name, NutritionInformation) pairs.
+def from_pairs(pairs):
+    batch = NutritionBatch()
+    for name, nutrition_info in pairs:
+        batch.append(name, nutrition_info)
+    return batch
\ No newline at end of file
@@ -1,5 +1,8 @@
-# Simple class to represent a nutrition information.
+# Simple class to represent a nutrition information. Instances are treated as values: the arithmetic operators
+# return new objects rather than modifying either operand, so they can be shared safely.
 class NutritionInformation:
+    __slots__ = ('calories', 'carbs', 'fats', 'proteins')
+
     def __init__(self, calories, carbs, fats, proteins):
         self.calories = calories
         self.carbs = carbs
@@ -9,12 +12,45 @@ class NutritionInformation:
     def to_csv(self):
         return '{0},{1},{2},{3}'.format(self.calories, self.carbs, self.fats, self.proteins)
 
-    def __iadd__(self, other):
+    # Returns the sum of this nutrition information and another. Also used by +=.
+    def __add__(self, other):
         return NutritionInformation(
         self.calories + other.calories,
         self.carbs + other.carbs,
         self.fats + other.fats,
         self.proteins + other.proteins)
+
+    # Returns the difference between this nutrition information and another. Also used by -=.
+    def __sub__(self, other):
+        return NutritionInformation(
+        self.calories - other.calories,
+        self.carbs - other.carbs,
+        self.fats - other.fats,
+        self.proteins - other.proteins)
+
+    # Returns this nutrition information with every value multiplied by factor, e.g. 0.5 for half a serving.
+    def scale(self, factor):
+        return NutritionInformation(self.calories * factor, self.carbs * factor, self.fats * factor, self.proteins * factor)
+
+    def __mul__(self, factor):
+        return self.scale(factor)
+
+    def __rmul__(self, factor):
+        return self.scale(factor)
+
+    # Returns the (calories, carbs, fats, proteins) values as a tuple.
+    def values(self):
+        return (self.calories, self.carbs, self.fats, self.proteins)
+
+    # Instances are equal when all of their values are, and hash alike so that they can still be used in sets and as keys.
+    def __eq__(self, other):
+        return isinstance(other, NutritionInformation) and self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        return 'NutritionInformation({0}, {1}, {2}, {3})'.format(self.calories, self.carbs, self.fats, self.proteins)
         
     def to_string(self):
         return '{0} calories, {1}g carbs, {2}g fat, {3}g protein'.format(
@@ -0,0 +1,231 @@
+import consumption_layout
+import datetime
+import fileutils
+import food_item
+import instrumentation
+import nutrition_information
+import os
+import status
+import storage
+
+MANIFEST_FILENAME='manifest.csv'
+
+# Simple class to hold the materialized totals of a single day file, along with the size of the day
+# file they were computed from so that stale rollups can be detected.
+class DailyRollup:
+    def __init__(self, source_size, entries, nutrition_info):
+        self.source_size = source_size
+        self.entries = entries
+        self.nutrition_information = nutrition_info
+
+    def to_csv(self):
+        return '{0},{1},{2}'.format(self.source_size, self.entries, self.nutrition_information.to_csv())
+
+# Attempts to parse the given CSV line into a DailyRollup, returning None if it is malformed.
+def parse_rollup(string):
+    args = string.split(',')
+    if len(args) != 6:
+        return None
+    try:
+        return DailyRollup(int(args[0]), int(args[1]), nutrition_information.NutritionInformation(
+            float(args[2]), float(args[3]), float(args[4]), float(args[5])))
+    except:
+        return None
+
+# Simple class to hold the aggregated nutrition of a span of days, e.g. a week or a month.
+class PeriodSummary:
+    def __init__(self, label):
+        self.label = label
+        self.days = 0
+        self.entries = 0
+        self.total = nutrition_information.NutritionInformation(0, 0, 0, 0)
+
+    def add(self, rollup):
+        self.days += 1
+        self.entries += rollup.entries
+        self.total += rollup.nutrition_information
+
+    # Returns the average daily nutrition over the days which had entries recorded.
+    def average(self):
+        days = max(self.days, 1)
+        return nutrition_information.NutritionInformation(
+            self.total.calories / days, self.total.carbs / days, self.total.fats / days, self.total.proteins / days)
+
+# Returns the filepath to the manifest of the given partition, e.g. data/user/days/2024/09/manifest.csv.
+# The manifest lists every day of the month which has entries, along with the size of its day file and its rollup.
+def manifest_filepath(year, month):
+    return consumption_layout.partition_dirpath(year, month) + MANIFEST_FILENAME
+
+# Returns the size of the file at filepath, or 0 if it does not exist.
+def file_size(filepath):
+    try:
+        return os.path.getsize(filepath)
+    except FileNotFoundError:
+        return 0
+
+# Returns a dictionary mapping each date listed in the manifest of the given partition to its DailyRollup.
+# Malformed lines are skipped, so that their days are rebuilt from the day files.
+def read_manifest(year, month):
+    rollups = {}
+    try:
+        with fileutils.open_file(manifest_filepath(year, month), 'r') as input:
+            for line in input:
+                date_string, _, rollup_string = line.strip().partition(',')
+                rollup = parse_rollup(rollup_string)
+                date = consumption_layout.parse_day_filename(date_string + consumption_layout.DAY_FILE_EXTENSION)
+                if rollup is not None and date is not None:
+                    rollups[date] = rollup
+    except FileNotFoundError:
+        pass
+    return rollups
+
+# Replaces the manifest of the given partition with the provided dictionary of rollups keyed by date, in date order.
+def write_manifest(year, month, rollups):
+    storage.atomic_write(manifest_filepath(year, month), ''.join('{0},{1}\n'.format(date.isoformat(), rollups[date].to_csv())
+        for date in sorted(rollups)))
+
+# Re-parses the day file of the given date into a DailyRollup.
+# Returns the DailyRollup, or a Status indicating that the day file could not be parsed.
+def rebuild_rollup(date):
+    day_filepath = consumption_layout.day_filepath(date)
+    entries = 0
+    total_calories = 0
+    total_carbs = 0
+    total_fats = 0
+    total_proteins = 0
+    with fileutils.open_file(day_filepath, 'rb') as input:
+        contents = input.read()
+    source_size = len(contents)
+    lines = contents.decode().splitlines()
+    instrumentation.count(instrumentation.LINES_PARSED, len(lines))
+    for line in lines:
+        if line.strip() == '': continue # Skip empty lines
+        fooditem = food_item.parse_food_item(line.strip(), ',')
+        if fooditem is None:
+            return status.Status(False, 'Failed to parse "{0}" from {1} as a food item'.format(line.strip(), consumption_layout.day_filename(date)))
+        entries += 1
+        total_calories += fooditem.calories()
+        total_carbs += fooditem.carbs()
+        total_fats += fooditem.fats()
+        total_proteins += fooditem.proteins()
+    return DailyRollup(source_size, entries, nutrition_information.NutritionInformation(
+        total_calories, total_carbs, total_fats, total_proteins))
+
+# Rebuilds the rollups of the provided dates of a single partition from their day files and stores them in its manifest.
+# Returns the updated dictionary of rollups keyed by date, or a Status if a day file could not be parsed.
+def rebuild_rollups(year, month, dates):
+    with storage.locked(manifest_filepath(year, month)):
+        rollups = read_manifest(year, month)
+        for date in dates:
+            rollup = rebuild_rollup(date)
+            if isinstance(rollup, status.Status):
+                return rollup
+            rollups[date] = rollup
+        write_manifest(year, month, rollups)
+    return rollups
+
+# Folds newly appended consumption entries into the manifest of their day file's partition. `previous_size` and
+# `current_size` are the sizes of the day file before and after the entries were appended, while the day file is
+# still locked. If the manifest does not match the previous size, e.g. after a crash, the day's rollup is rebuilt.
+def record_entry(date, previous_size, current_size, nutrition_info, entries=1):
+    date = datetime.date(date.year, date.month, date.day)
+    with storage.locked(manifest_filepath(date.year, date.month)):
+        rollups = read_manifest(date.year, date.month)
+        rollup = rollups.get(date)
+        if previous_size == 0:
+            rollup = DailyRollup(0, 0, nutrition_information.NutritionInformation(0, 0, 0, 0))
+        if rollup is None or rollup.source_size != previous_size:
+            rollup = rebuild_rollup(date)
+            if isinstance(rollup, status.Status): # Left out of the manifest, so that reading it reports the error
+                rollups.pop(date, None)
+                write_manifest(date.year, date.month, rollups)
+                return
+        else:
+            rollup.source_size = current_size
+            rollup.entries += entries
+            rollup.nutrition_information += nutrition_info
+        rollups[date] = rollup
+        write_manifest(date.year, date.month, rollups)
+
+# Returns a storage.append on_commit callback which folds the committed (NutritionInformation, entries)
+# contexts into the manifest entry of the given date.
+def rollup_updater(date):
+    def on_commit(previous_size, current_size, contexts):
+        nutrition_info = nutrition_information.NutritionInformation(0, 0, 0, 0)
+        entries = 0
+        for consumed, consumed_entries in contexts:
+            nutrition_info += consumed
+            entries += consumed_entries
+        record_entry(date, previous_size, current_size, nutrition_info, entries)
+    return on_commit
+
+# Returns the chronological (date, DailyRollup) pairs of the provided dates of a single partition, read from its
+# manifest. Days whose manifest entry is missing or does not match the size of their day file are rebuilt,
+# while days whose day file is empty are left out.
+# Returns a Status if a day file could not be parsed.
+def partition_rollups(year, month, dates):
+    rollups = read_manifest(year, month)
+    sizes = {date: file_size(consumption_layout.day_filepath(date)) for date in dates}
+    stale_dates = [date for date in dates if sizes[date] > 0 and (date not in rollups or rollups[date].source_size != sizes[date])]
+    if len(stale_dates) > 0:
+        rollups = rebuild_rollups(year, month, stale_dates)
+        if isinstance(rollups, status.Status):
+            return rollups
+    return [(date, rollups[date]) for date in dates if sizes[date] > 0]
+
+# Returns the DailyRollup for the given date, rebuilding it if it is missing or stale.
+# Returns None if nothing was recorded on that date, or a Status if the day file could not be parsed.
+def get_daily_rollup(date):
+    date = datetime.date(date.year, date.month, date.day)
+    daily_rollups = partition_rollups(date.year, date.month, [date])
+    if isinstance(daily_rollups, status.Status):
+        return daily_rollups
+    return daily_rollups[0][1] if len(daily_rollups) > 0 else None
+
+# Returns the chronological (date, DailyRollup) pairs of every day between start_date and end_date inclusive which
+# has entries. Only the partitions with day files are read, one manifest per month.
+# Returns a Status if a day file could not be parsed.
+def daily_rollups(start_date, end_date):
+    dates_by_partition = {}
+    for date in consumption_layout.dates_between(start_date, end_date):
+        dates_by_partition.setdefault((date.year, date.month), []).append(date)
+    rollups_between = []
+    for (year, month), dates in dates_by_partition.items():
+        rollups = partition_rollups(year, month, dates)
+        if isinstance(rollups, status.Status):
+            return rollups
+        rollups_between += rollups
+    return rollups_between
+
+# Aggregates all days between start_date and end_date inclusive into per-day, per-week and per-month
+# PeriodSummary lists, in chronological order. Weeks start on Monday. Days without entries are omitted.
+# Returns the tuple (daily, weekly, monthly, overall), or a Status if a day file could not be parsed.
+def summarize_range(start_date, end_date):
+    rollups = daily_rollups(start_date, end_date)
+    if isinstance(rollups, status.Status):
+        return rollups
+    return summarize_daily_rollups(start_date, end_date, rollups)
+
+# Groups the provided chronological (date, DailyRollup) pairs between start_date and end_date into the
+# (daily, weekly, monthly, overall) PeriodSummary tuple described in summarize_range.
+def summarize_daily_rollups(start_date, end_date, daily_rollups):
+    daily = []
+    weekly = {}
+    monthly = {}
+    overall = PeriodSummary('{0} to {1}'.format(fileutils.datetime_to_string(start_date), fileutils.datetime_to_string(end_date)))
+    for date, rollup in daily_rollups:
+        if rollup.entries == 0:
+            continue
+        day_summary = PeriodSummary(fileutils.datetime_to_string(date))
+        day_summary.add(rollup)
+        daily.append(day_summary)
+        week_start = date - datetime.timedelta(days=date.weekday())
+        if week_start not in weekly:
+            weekly[week_start] = PeriodSummary('Week of ' + fileutils.datetime_to_string(week_start))
+        weekly[week_start].add(rollup)
+        month = (date.year, date.month)
+        if month not in monthly:
+            monthly[month] = PeriodSummary('{0}-{1}'.format(date.month, date.year))
+        monthly[month].add(rollup)
+        overall.add(rollup)
+    return (daily, list(weekly.values()), list(monthly.values()), overall)
\ No newline at end of file
@@ -0,0 +1,109 @@
+import argparse
+import food_item
+import gc
+import nutrition_batch
+import nutrition_information
+import random
+import time
+import tracemalloc
+
+# The nutrition information layout used before the value types were slotted, kept for comparison.
+class UnslottedNutritionInformation:
+    def __init__(self, calories, carbs, fats, proteins):
+        self.calories = calories
+        self.carbs = carbs
+        self.fats = fats
+        self.proteins = proteins
+
+    def __add__(self, other):
+        return UnslottedNutritionInformation(
+            self.calories + other.calories, self.carbs + other.carbs, self.fats + other.fats, self.proteins + other.proteins)
+
+# The food item layout used before the value types were slotted, kept for comparison.
+class UnslottedFoodItem:
+    def __init__(self, name, calories, carbs, fats, proteins):
+        self.name = name
+        self.nutrition_information = UnslottedNutritionInformation(calories, carbs, fats, proteins)
+
+# Returns the (name, calories, carbs, fats, proteins) rows of the benchmark, generated from a fixed seed.
+def generate_rows(entries, seed):
+    rng = random.Random(seed)
+    names = ['food_{0}'.format(i) for i in range(1000)]
+    return [(rng.choice(names), rng.uniform(0, 800), rng.uniform(0, 100), rng.uniform(0, 50), rng.uniform(0, 60)) for _ in range(entries)]
+
+# Holds the entries as a list of unslotted food items.
+def build_unslotted(rows):
+    return [UnslottedFoodItem(*row) for row in rows]
+
+# Holds the entries as a list of slotted food items.
+def build_slotted(rows):
+    return [food_item.FoodItem(*row) for row in rows]
+
+# Holds the entries in a single NutritionBatch.
+def build_batch(rows):
+    batch = nutrition_batch.NutritionBatch()
+    for row in rows:
+        batch.append_values(*row)
+    return batch
+
+# Sums a list of unslotted food items.
+def total_unslotted(fooditems):
+    total = UnslottedNutritionInformation(0, 0, 0, 0)
+    for fooditem in fooditems:
+        total = total + fooditem.nutrition_information
+    return total
+
+# Sums a list of slotted food items.
+def total_slotted(fooditems):
+    total = nutrition_information.NutritionInformation(0, 0, 0, 0)
+    for fooditem in fooditems:
+        total += fooditem.nutrition_information
+    return total
+
+# Sums a NutritionBatch.
+def total_batch(batch):
+    return batch.total()
+
+# Returns the (bytes allocated per entry, seconds to build) of holding the rows with the given builder.
+def measure_memory(build, rows):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build(rows)
+    elapsed = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (allocated / len(rows), elapsed)
+
+# Returns the best of several timings, in seconds, of summing the held entries.
+def measure_total(total, held, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        total(held)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Example invocation: python nutrition_types_benchmark.py --entries 1000000
+# Compares the memory held and the time taken to build and sum many consumption entries, stored as the previous
+# unslotted classes, the slotted value types, and a contiguous NutritionBatch.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the memory and throughput of the nutrition value types.')
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate_rows(args.entries, args.seed)
+    print('{0:<12} {1:>14} {2:>12} {3:>12} {4:>14}'.format('layout', 'bytes/entry', 'build (s)', 'sum (s)', 'entries/sec'))
+    for label, build, total in [('unslotted', build_unslotted, total_unslotted), ('slotted', build_slotted, total_slotted),
+            ('batch', build_batch, total_batch)]:
+        bytes_per_entry, build_seconds = measure_memory(build, rows)
+        held = build(rows)
+        total_seconds = measure_total(total, held, args.repeats)
+        print('{0:<12} {1:>14.1f} {2:>12.3f} {3:>12.4f} {4:>14.0f}'.format(
+            label, bytes_per_entry, build_seconds, total_seconds, args.entries / total_seconds))
+        del held
+    print('Batch sums use NumPy' if nutrition_batch.numpy is not None else 'Batch sums use the array module, NumPy is not installed')
\ No newline at end of file
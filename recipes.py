@@ -0,0 +1,144 @@
+import food_item
+import math
+import nutrition_information
+import threading
+
+INGREDIENT_SEPARATOR=';'
+PERCENT_SEPARATOR=':'
+DEFAULT_PERCENT=100.0
+
+# Simple class to represent a recipe: a composite food made of (ingredient name, percent) pairs, where each percent
+# is the amount of one serving of the ingredient used, like the percent of the "eat" command.
+class Recipe:
+    def __init__(self, name, ingredients):
+        self.name = name
+        self.ingredients = ingredients
+
+    # Returns the ingredients as stored, e.g. "eggs:200.0;toast:100.0".
+    def ingredients_to_csv(self):
+        return INGREDIENT_SEPARATOR.join('{0}{1}{2}'.format(name, PERCENT_SEPARATOR, percent) for name, percent in self.ingredients)
+
+    def to_csv(self):
+        return '{0},{1}'.format(self.name, self.ingredients_to_csv())
+
+# Attempts to parse the provided ingredient strings, each formatted "name" or "name:percent", into a list of
+# (ingredient name, percent) pairs. Returns None if an ingredient is malformed or its percent is not a positive number.
+def parse_ingredients(ingredient_strings):
+    ingredients = []
+    for ingredient_string in ingredient_strings:
+        name, separator, percent_string = ingredient_string.partition(PERCENT_SEPARATOR)
+        try:
+            percent = float(percent_string) if separator != '' else DEFAULT_PERCENT
+        except ValueError:
+            return None
+        if name == '' or not math.isfinite(percent) or percent <= 0:
+            return None
+        ingredients.append((name.lower(), percent))
+    return ingredients if len(ingredients) > 0 else None
+
+# Attempts to parse the CSV line written by Recipe.to_csv, returning None if it is malformed.
+def parse_recipe(string):
+    name, _, ingredients_string = string.strip().partition(',')
+    ingredients = parse_ingredients(ingredients_string.split(INGREDIENT_SEPARATOR))
+    if name == '' or ingredients is None:
+        return None
+    return Recipe(name, ingredients)
+
+# Returns whether the provided name can be used for a recipe, i.e. it could also be the name of a food item.
+def valid_recipe_name(name):
+    return name != '' and not any(character in name for character in ',-: ;\n')
+
+# The recipes of a storage backend, with the nutrition of each recipe memoized so that eating a recipe costs a single
+# lookup. Every lookup first compares version(), a value which changes whenever the food items, recipes or reference
+# catalog change in any process, e.g. "add-food" while the daemon or the service is running, with the last one seen.
+# If it differs, the recipes are loaded again and every memoized nutrition is dropped. A reverse dependency graph maps
+# each ingredient to the recipes using it, so that a change made through this book also drops the nutrition of the
+# recipes it is an ingredient of straight away, including nutrition still being computed from the old values.
+class RecipeBook:
+    def __init__(self, backend, version):
+        self.backend = backend
+        self.version = version
+        self.lock = threading.Lock()
+        self.recipes = None
+        self.seen_version = None
+        self.dependents = {}
+        self.memo = {}
+        # Bumped whenever a recipe or ingredient changes, so that nutrition computed meanwhile is not memoized.
+        self.generation = 0
+
+    # Loads the recipes from the backend if they have not been loaded yet, or again along with dropping every
+    # memoized nutrition if the version changed since they were. Must be called with the lock held.
+    def load_if_necessary(self):
+        version = self.version()
+        if self.recipes is not None and version == self.seen_version:
+            return
+        self.recipes = {}
+        self.dependents = {}
+        self.memo = {}
+        self.generation += 1
+        self.seen_version = version
+        for recipe in self.backend.recipes():
+            self.link(recipe)
+
+    # Adds the recipe and its edges to the dependency graph, replacing any recipe of the same name.
+    # Must be called with the lock held.
+    def link(self, recipe):
+        previous_recipe = self.recipes.get(recipe.name)
+        if previous_recipe is not None:
+            for ingredient_name, _ in previous_recipe.ingredients:
+                self.dependents.get(ingredient_name, set()).discard(recipe.name)
+        self.recipes[recipe.name] = recipe
+        for ingredient_name, _ in recipe.ingredients:
+            self.dependents.setdefault(ingredient_name, set()).add(recipe.name)
+        self.memo.pop(recipe.name, None)
+        self.generation += 1
+
+    # Returns the recipe with the given name, or None if there is none.
+    def get(self, name):
+        with self.lock:
+            self.load_if_necessary()
+            return self.recipes.get(name)
+
+    # Returns the recipe with the given name as a food item whose nutrition sums its ingredients, each looked up with
+    # get_ingredient(name) and scaled by its percent. The result is memoized until an ingredient changes.
+    # Returns None if there is no such recipe or one of its ingredients is not a food item.
+    def food_item(self, name, get_ingredient):
+        with self.lock:
+            self.load_if_necessary()
+            fooditem = self.memo.get(name)
+            if fooditem is not None:
+                return fooditem
+            recipe = self.recipes.get(name)
+            generation = self.generation
+        if recipe is None:
+            return None
+        nutrition_info = nutrition_information.NutritionInformation(0, 0, 0, 0)
+        for ingredient_name, percent in recipe.ingredients:
+            ingredient = get_ingredient(ingredient_name)
+            if ingredient is None:
+                return None
+            nutrition_info += ingredient.nutrition_information.scale(percent / 100.0)
+        fooditem = food_item.with_nutrition_information(name, nutrition_info)
+        with self.lock:
+            if self.generation == generation: # Otherwise something changed while the ingredients were looked up
+                self.memo[name] = fooditem
+        return fooditem
+
+    # Stores the provided recipe in the backend, replacing any recipe of the same name.
+    def define(self, recipe):
+        with self.lock:
+            self.load_if_necessary()
+            self.backend.save_recipe(recipe)
+            self.link(recipe)
+
+    # Drops the memoized nutrition of the recipes using any of the given ingredient names, after those food items
+    # were added, replaced or removed. Returns the number of recipes whose nutrition was dropped.
+    def invalidate(self, ingredient_names):
+        invalidated = 0
+        with self.lock:
+            self.generation += 1
+            for ingredient_name in ingredient_names:
+                for recipe_name in self.dependents.get(ingredient_name, ()):
+                    if self.memo.pop(recipe_name, None) is not None:
+                        invalidated += 1
+        return invalidated
\ No newline at end of file
@@ -0,0 +1,345 @@
+import argparse
+import array
+import columnar_history
+import concurrent.futures
+import csv
+import fileutils
+import food_item
+import heapq
+import io
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import status
+import storage
+import struct
+import sys
+import threading
+
+REFERENCE_FILENAME='reference_foods.fimref'
+# File layout, every section starting on an 8 byte boundary and every number in the byte order of the builder:
+#   header        magic, format version, byte order, then the number of food items
+#   name offsets  items + 1 uint64 byte offsets into the UTF-8 blob of every name, the names sorted by their bytes
+#   values        4 float64 per item, the calories, carbs, fats and proteins of the item with the same index
+#   name blob     every name, one after the other
+MAGIC=b'FIMREF\x00\x00'
+FORMAT_VERSION=1
+HEADER=struct.Struct('<8sIIQ')
+VALUES_PER_ITEM=4
+# Column headers of the dump recognized for each field, once lowercased with units in parentheses and punctuation dropped.
+# Dumps without a recognized header are read as name,calories,carbs,fats,proteins like data/custom_foods.csv.
+NAME_HEADERS={'name', 'food', 'food_name', 'description', 'food_description', 'long_desc', 'shrt_desc'}
+VALUE_HEADERS=[
+    {'calories', 'cal', 'kcal', 'energy', 'energy_kcal', 'energ_kcal'},
+    {'carbs', 'carb', 'carbohydrate', 'carbohydrates', 'carbohydrate_by_difference', 'carbohydrt'},
+    {'fats', 'fat', 'total_fat', 'total_lipid', 'lipid_tot'},
+    {'proteins', 'protein'}]
+DEFAULT_COLUMNS=[0, 1, 2, 3, 4]
+HEADER_UNITS=re.compile('\\([^)]*\\)')
+NAME_SEPARATORS=re.compile('[\\W_]+')
+# Smallest part of the dump parsed by a single worker, so that small dumps are not split for nothing.
+MIN_CHUNK_BYTES=1024 * 1024
+CHUNKS_PER_WORKER=4
+
+# Open reference catalogs, keyed by filepath, along with the signature of the file they were opened from. See current.
+OPEN_CATALOGS={}
+OPEN_CATALOGS_LOCK=threading.Lock()
+
+# Simple class to hold the outcome of building a reference catalog from a dump.
+class BuildSummary:
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.items = 0
+
+    def to_string(self):
+        return 'Wrote {0} reference food items from {1} rows, ignoring {2} invalid rows and {3} duplicate names.'.format(
+            self.items, self.rows, self.skipped, self.duplicates)
+
+# Returns the filepath to the reference catalog, data/reference_foods.fimref.
+def reference_filepath():
+    return fileutils.custom_filepath(REFERENCE_FILENAME)
+
+# Returns the provided food description as a food name usable in commands, e.g. "Cheese, cheddar" as "cheese_cheddar".
+def normalize_name(description):
+    return NAME_SEPARATORS.sub('_', description.lower()).strip('_')
+
+# Returns the provided column header lowercased, without units in parentheses or punctuation, e.g. "Lipid_Tot_(g)" as "lipid_tot".
+def normalize_header(header):
+    return normalize_name(HEADER_UNITS.sub('', header))
+
+# Returns the indexes of the name, calories, carbs, fats and proteins columns named by the header row,
+# or None if it does not name all of them.
+def header_columns(header_row):
+    headers = [normalize_header(header) for header in header_row]
+    columns = []
+    for accepted_headers in [NAME_HEADERS] + VALUE_HEADERS:
+        matching = [index for index, header in enumerate(headers) if header in accepted_headers]
+        if len(matching) == 0:
+            return None
+        columns.append(matching[0])
+    return columns
+
+# Attempts to parse a row of the dump into a (name, values) pair, where values is the (calories, carbs, fats, proteins)
+# tuple. Returns None if the name is empty or a value is missing, negative or not a finite number.
+def parse_row(row, columns):
+    try:
+        name = normalize_name(row[columns[0]])
+        values = tuple(float(row[column]) for column in columns[1:])
+    except (IndexError, ValueError):
+        return None
+    if name == '' or not all(math.isfinite(value) and value >= 0 for value in values):
+        return None
+    return (name, values)
+
+# Runs in a worker process. Parses the rows of the dump at source_filepath which start between the byte offsets
+# start and end, using the provided column indexes. Rows are assumed not to span lines.
+# Returns a (rows, skipped, items) tuple, where items are the parsed (name, values) pairs sorted by name, keeping
+# the order of the dump between rows of the same name.
+def parse_chunk(source_filepath, start, end, columns):
+    rows = 0
+    skipped = 0
+    items = []
+    with fileutils.open_file(source_filepath, 'rb') as input:
+        input.seek(start)
+        if start > 0: # The row under way at start belongs to the chunk before
+            input.seek(start - 1)
+            input.readline()
+        position = input.tell()
+        lines = []
+        while position < end:
+            line = input.readline()
+            if line == b'':
+                break
+            position += len(line)
+            lines.append(line.decode('utf-8', 'replace'))
+    for row in csv.reader(lines):
+        if len(row) == 0:
+            continue
+        rows += 1
+        item = parse_row(row, columns)
+        if item is None:
+            skipped += 1
+        else:
+            items.append(item)
+    items.sort(key=lambda item: item[0])
+    return (rows, skipped, items)
+
+# Returns the (start, end) byte offsets the dump at source_filepath is split into from offset start, about one per
+# CHUNKS_PER_WORKER per worker but none smaller than MIN_CHUNK_BYTES.
+def chunk_offsets(source_filepath, start, workers):
+    size = os.path.getsize(source_filepath)
+    chunk_bytes = max(MIN_CHUNK_BYTES, (size - start) // (workers * CHUNKS_PER_WORKER) + 1)
+    return [(offset, min(offset + chunk_bytes, size)) for offset in range(start, size, chunk_bytes)]
+
+# Parses the CSV dump at source_filepath, e.g. a locally provided USDA-style export, and writes its food items to a
+# read-only reference catalog at target_filepath, replacing it atomically. The dump is split into chunks of rows which
+# are parsed and sorted in parallel on a pool of `workers` processes, one per core by default, then merged by name.
+# Names are normalized with normalize_name, and if a name appears more than once the last row is used. Values are
+# taken as they appear in the dump, e.g. per 100g for a USDA export.
+# Returns a BuildSummary, or a Status indicating why the catalog could not be built.
+def build_reference_catalog(source_filepath, target_filepath, workers=None):
+    try:
+        with fileutils.open_file(source_filepath, 'rb') as input:
+            first_line = input.readline()
+    except OSError as error:
+        return status.Status(False, 'Unable to read {0}: {1}'.format(source_filepath, error))
+    header_row = next(csv.reader([first_line.decode('utf-8-sig', 'replace')]), [])
+    columns = header_columns(header_row)
+    data_start = len(first_line) if columns is not None else 0
+    columns = DEFAULT_COLUMNS if columns is None else columns
+
+    workers = workers or os.cpu_count() or 1
+    chunks = chunk_offsets(source_filepath, data_start, workers)
+    if len(chunks) <= 1 or workers == 1:
+        parsed_chunks = [parse_chunk(source_filepath, start, end, columns) for start, end in chunks]
+    else:
+        # Workers only need the filepath and byte range of their chunk, so they are spawned rather than forked: a fork
+        # of a process with other threads running, such as the daemon's, may copy locks those threads hold forever
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=multiprocessing.get_context('spawn')) as executor:
+            parsed_chunks = list(executor.map(parse_chunk, *zip(*[(source_filepath, start, end, columns) for start, end in chunks])))
+
+    summary = BuildSummary()
+    name_offsets = array.array('Q', [0])
+    values = array.array('d')
+    blob = io.BytesIO()
+    previous_name = None
+    for rows, skipped, _ in parsed_chunks:
+        summary.rows += rows
+        summary.skipped += skipped
+    # Merging is stable, so rows of the same name stay in the order of the dump and the last one replaces the others
+    for name, item_values in heapq.merge(*[items for _, _, items in parsed_chunks], key=lambda item: item[0]):
+        if name == previous_name:
+            summary.duplicates += 1
+            values[-VALUES_PER_ITEM:] = array.array('d', item_values)
+            continue
+        previous_name = name
+        encoded_name = name.encode()
+        blob.write(encoded_name)
+        name_offsets.append(name_offsets[-1] + len(encoded_name))
+        values.extend(item_values)
+    summary.items = len(name_offsets) - 1
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, columnar_history.BYTE_ORDERS[sys.byteorder], summary.items)
+    try:
+        fileutils.instantiate_path_if_necessary(os.path.dirname(target_filepath) or '.')
+        with storage.atomic_writer(target_filepath, 'wb') as output:
+            position = 0
+            for section in [header, name_offsets.tobytes(), values.tobytes(), blob.getvalue()]:
+                output.write(b'\0' * (columnar_history.aligned(position) - position))
+                position = columnar_history.aligned(position)
+                output.write(section)
+                position += len(section)
+    except OSError as error:
+        return status.Status(False, 'Unable to write {0}: {1}'.format(target_filepath, error))
+    return summary
+
+# Returns a dictionary mapping each section name to its (start, end) byte offsets, for a file of the given number of items.
+def section_offsets(items):
+    name_offsets_start = columnar_history.aligned(HEADER.size)
+    values_start = columnar_history.aligned(name_offsets_start + 8 * (items + 1))
+    blob_start = columnar_history.aligned(values_start + 8 * VALUES_PER_ITEM * items)
+    return {'name_offsets': (name_offsets_start, name_offsets_start + 8 * (items + 1)),
+        'values': (values_start, values_start + 8 * VALUES_PER_ITEM * items), 'name_blob': (blob_start, None)}
+
+# Memory maps a reference catalog written by build_reference_catalog, see open_reference_catalog. Names are looked up
+# by binary search over the sorted name offsets, so only the pages touched by a lookup are ever read from disk,
+# however large the catalog is.
+class ReferenceCatalog:
+    def __init__(self, file_object, mapped, items):
+        self.file = file_object
+        self.mapped = mapped
+        self.buffer = memoryview(mapped)
+        self.items = items
+        offsets = section_offsets(items)
+        self.name_offsets = self.buffer[offsets['name_offsets'][0]:offsets['name_offsets'][1]].cast('Q')
+        self.values = self.buffer[offsets['values'][0]:offsets['values'][1]].cast('d')
+        self.blob_start = offsets['name_blob'][0]
+
+    def __len__(self):
+        return self.items
+
+    # Returns the UTF-8 encoded name of the item at the given index.
+    def name_bytes(self, index):
+        return bytes(self.buffer[self.blob_start + self.name_offsets[index]:self.blob_start + self.name_offsets[index + 1]])
+
+    # Returns the index of the first item whose name is not before the UTF-8 encoded name.
+    def lower_bound(self, encoded_name):
+        low = 0
+        high = self.items
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_bytes(middle) < encoded_name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # Returns the food item at the given index.
+    def food_item_at(self, index):
+        start = index * VALUES_PER_ITEM
+        return food_item.FoodItem(self.name_bytes(index).decode(), *self.values[start:start + VALUES_PER_ITEM])
+
+    # Returns the food item with the given name, normalized with normalize_name, or None if there is none.
+    def get(self, food_name):
+        encoded_name = normalize_name(food_name).encode()
+        index = self.lower_bound(encoded_name)
+        if index < self.items and self.name_bytes(index) == encoded_name:
+            return self.food_item_at(index)
+        return None
+
+    # Returns up to limit food items whose names start with the given prefix, in name order.
+    def starting_with(self, prefix, limit):
+        encoded_prefix = normalize_name(prefix).encode()
+        fooditems = []
+        index = self.lower_bound(encoded_prefix)
+        while index < self.items and len(fooditems) < limit and self.name_bytes(index).startswith(encoded_prefix):
+            fooditems.append(self.food_item_at(index))
+            index += 1
+        return fooditems
+
+    # Unmaps the file. If views of it are still referenced, the mapping is only released once they are garbage collected.
+    def close(self):
+        for view in [self.name_offsets, self.values, self.buffer]:
+            view.release()
+        try:
+            self.mapped.close()
+        except BufferError: # Views are still exported
+            pass
+        self.file.close()
+
+# Opens the reference catalog at filepath, written by build_reference_catalog on a machine of the same byte order.
+# Returns a ReferenceCatalog, or a Status indicating why the file could not be read.
+def open_reference_catalog(filepath):
+    try:
+        file_object = fileutils.open_file(filepath, 'rb')
+    except OSError as error:
+        return status.Status(False, 'Unable to open {0}: {1}'.format(filepath, error))
+    try:
+        mapped = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as error: # ValueError for an empty file
+        file_object.close()
+        return status.Status(False, 'Unable to map {0}: {1}'.format(filepath, error))
+    problem = None
+    if len(mapped) < HEADER.size:
+        problem = 'it is too short'
+    else:
+        magic, version, byte_order, items = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            problem = 'it is not a reference catalog'
+        elif version != FORMAT_VERSION:
+            problem = 'its format version {0} is not supported'.format(version)
+        elif byte_order != columnar_history.BYTE_ORDERS[sys.byteorder]:
+            problem = 'it was built on a machine of a different byte order'
+        elif section_offsets(items)['name_blob'][0] > len(mapped):
+            problem = 'it is truncated'
+    if problem is not None:
+        mapped.close()
+        file_object.close()
+        return status.Status(False, 'Unable to read {0}: {1}.'.format(filepath, problem))
+    return ReferenceCatalog(file_object, mapped, items)
+
+# Returns a value identifying the reference catalog file, which changes whenever it is rebuilt, or None if there is none.
+def signature():
+    return fileutils.file_signature(reference_filepath())
+
+# Returns the ReferenceCatalog at data/reference_foods.fimref, or None if there is none or it cannot be read.
+# The catalog is opened once and shared, and opened again once it is rebuilt. A catalog which was replaced is not
+# closed, since lookups may still be running on other threads: it is unmapped once garbage collected.
+def current():
+    filepath = reference_filepath()
+    file_signature = fileutils.file_signature(filepath)
+    if file_signature is None:
+        return None
+    with OPEN_CATALOGS_LOCK:
+        opened = OPEN_CATALOGS.get(filepath)
+        if opened is None or opened[0] != file_signature:
+            catalog = open_reference_catalog(filepath)
+            opened = OPEN_CATALOGS[filepath] = (file_signature, None if isinstance(catalog, status.Status) else catalog)
+        return opened[1]
+
+# Returns the reference food item with the given name, or None if there is no reference catalog or no such item.
+def get_food_item(food_name):
+    catalog = current()
+    return None if catalog is None else catalog.get(food_name)
+
+# Returns up to limit reference food items whose names start with the given prefix, in name order.
+def search_food_items(prefix, limit):
+    catalog = current()
+    return [] if catalog is None or limit <= 0 else catalog.starting_with(prefix, limit)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the read-only reference catalog of food items, looked up after the custom food items, from a CSV dump.')
+    parser.add_argument('source_filepath', help='CSV dump with a header naming the description, energy, carbohydrate, fat and protein columns, '
+        'or rows formatted like data/custom_foods.csv')
+    parser.add_argument('--output', help='reference catalog to write, data/{0} by default'.format(REFERENCE_FILENAME))
+    parser.add_argument('--workers', type=int, help='number of worker processes, one per core by default')
+    args = parser.parse_args()
+    result = build_reference_catalog(args.source_filepath, args.output or reference_filepath(), args.workers)
+    if isinstance(result, status.Status):
+        print(result.error())
+        raise SystemExit(1)
+    print(result.to_string())
\ No newline at end of file
@@ -0,0 +1,328 @@
+import datetime
+import fileutils
+import food_item
+import food_search
+import nutrition_batch
+import nutrition_information
+import nutrition_rollup
+import os
+import recipes
+import sqlite3
+import status
+import storage
+import threading
+
+DATABASE_FILENAME='food_in_me.db'
+DEFAULT_USER=''
+SCHEMA='''
+CREATE TABLE IF NOT EXISTS foods (
+    name TEXT PRIMARY KEY,
+    calories REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fats REAL NOT NULL,
+    proteins REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS consumption (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    calories REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fats REAL NOT NULL,
+    proteins REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS consumption_user_day ON consumption (user, day);
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS foods_inserted AFTER INSERT ON foods BEGIN UPDATE catalog_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS foods_deleted AFTER DELETE ON foods BEGIN UPDATE catalog_version SET version = version + 1; END;
+CREATE TABLE IF NOT EXISTS recipes_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL);
+INSERT OR IGNORE INTO recipes_version (id, version) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS recipe_foods_inserted AFTER INSERT ON foods BEGIN UPDATE recipes_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS recipe_foods_updated AFTER UPDATE ON foods BEGIN UPDATE recipes_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS recipe_foods_deleted AFTER DELETE ON foods BEGIN UPDATE recipes_version SET version = version + 1; END;
+CREATE TABLE IF NOT EXISTS goals (
+    user TEXT PRIMARY KEY,
+    calories REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fats REAL NOT NULL,
+    proteins REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS recipes (
+    name TEXT PRIMARY KEY,
+    ingredients TEXT NOT NULL);
+CREATE TRIGGER IF NOT EXISTS recipes_inserted AFTER INSERT ON recipes BEGIN UPDATE recipes_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS recipes_updated AFTER UPDATE ON recipes BEGIN UPDATE recipes_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS recipes_deleted AFTER DELETE ON recipes BEGIN UPDATE recipes_version SET version = version + 1; END;
+CREATE TABLE IF NOT EXISTS trends (
+    user TEXT PRIMARY KEY,
+    state TEXT NOT NULL);
+'''
+
+# Returns the key identifying the current user's rows, see fileutils.set_current_user.
+def current_user_key():
+    user_name = fileutils.current_user()
+    return DEFAULT_USER if user_name is None else user_name
+
+# Returns the provided date as the ISO formatted string stored in the database, which sorts chronologically.
+def date_key(date):
+    return datetime.date(date.year, date.month, date.day).isoformat()
+
+# Returns the version of the set of food names, which is bumped whenever a food item is inserted or deleted.
+def catalog_version(connection):
+    return connection.execute('SELECT version FROM catalog_version').fetchone()[0]
+
+# Returns a NutritionInformation object from the calories, carbs, fats and proteins of a database row.
+def row_to_nutrition_information(row):
+    return nutrition_information.NutritionInformation(row[0], row[1], row[2], row[3])
+
+# Stores all data in a single SQLite database in WAL mode, so readers never block the writer. The catalog
+# is keyed by food name and consumption is indexed by (user, day), so that day and range reports are
+# answered with indexed SQL aggregates rather than by reading files.
+class SqliteBackend:
+    def __init__(self, database_filepath):
+        self.database_filepath = database_filepath
+        self.connections = threading.local()
+        self.search_lock = threading.Lock()
+        self.search_index = None
+        self.search_version = None
+
+    # Returns this thread's connection to the database, creating the schema on first use.
+    def connection(self):
+        connection = getattr(self.connections, 'connection', None)
+        if connection is None:
+            fileutils.instantiate_path_if_necessary(os.path.dirname(self.database_filepath))
+            connection = sqlite3.connect(self.database_filepath, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous={0}'.format('FULL' if storage.FSYNC else 'OFF'))
+            connection.executescript(SCHEMA)
+            self.connections.connection = connection
+        return connection
+
+    # Runs the provided function(connection) inside a single write transaction, returning its result.
+    def transaction(self, function):
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = function(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    # Opens the database and builds the search index ahead of the first request.
+    def warm(self):
+        self.search_food_items('', 0)
+
+    # There is no background work to wait for, since every write is committed before returning.
+    def wait_for_background_work(self):
+        pass
+
+    # Returns the food item with the given food_name, or None if it does not exist.
+    def get_food_item(self, food_name):
+        row = self.connection().execute('SELECT name, calories, carbs, fats, proteins FROM foods WHERE name = ?', (food_name,)).fetchone()
+        return None if row is None else food_item.FoodItem(*row)
+
+    # Returns whether the food item with the given food_name exists in the catalog.
+    def food_item_exists(self, food_name):
+        return self.connection().execute('SELECT 1 FROM foods WHERE name = ?', (food_name,)).fetchone() is not None
+
+    # Returns every food item in the catalog.
+    def food_items(self):
+        return [food_item.FoodItem(*row) for row in self.connection().execute('SELECT name, calories, carbs, fats, proteins FROM foods ORDER BY rowid')]
+
+    # Adds the provided food item to the catalog, replacing any existing item of the same name.
+    def add_food_item(self, fooditem):
+        def add(connection):
+            previous_version = catalog_version(connection)
+            connection.execute('INSERT OR REPLACE INTO foods (name, calories, carbs, fats, proteins) VALUES (?, ?, ?, ?, ?)',
+                (fooditem.name, fooditem.calories(), fooditem.carbs(), fooditem.fats(), fooditem.proteins()))
+            return (previous_version, catalog_version(connection))
+        self.update_search_index(*self.transaction(add), added=[fooditem.name])
+        return status.Status(True)
+
+    # Replaces the values of an existing food item.
+    def replace_food_item(self, fooditem):
+        cursor = self.connection().execute('UPDATE foods SET calories = ?, carbs = ?, fats = ?, proteins = ? WHERE name = ?',
+            (fooditem.calories(), fooditem.carbs(), fooditem.fats(), fooditem.proteins(), fooditem.name))
+        if cursor.rowcount == 0:
+            return status.Status(False, 'Food item {0} was not found and could not be replaced.'.format(fooditem.name))
+        return status.Status(True)
+
+    # Removes the food item with the given food_name from the catalog.
+    def remove_food_item(self, food_name):
+        def remove(connection):
+            previous_version = catalog_version(connection)
+            removed = connection.execute('DELETE FROM foods WHERE name = ?', (food_name,)).rowcount
+            return (removed, previous_version, catalog_version(connection))
+        removed, previous_version, version = self.transaction(remove)
+        if removed == 0:
+            return status.Status(False, 'Food item {0} was not found and could not be removed.'.format(food_name))
+        self.update_search_index(previous_version, version, removed=[food_name])
+        return status.Status(True)
+
+    # Applies a change made by this process to the search index, provided that the index was up to date with
+    # previous_version, or otherwise leaves the index to be rebuilt by the next search.
+    def update_search_index(self, previous_version, version, added=(), removed=()):
+        with self.search_lock:
+            if self.search_index is None or self.search_version != previous_version:
+                return
+            self.search_index.add_all(added)
+            for name in removed:
+                self.search_index.remove(name)
+            self.search_version = version
+
+    # Returns up to limit food items whose names match the query, ranked best first, see food_search.
+    # The in-memory search index is rebuilt whenever food items were inserted or deleted by another connection.
+    def search_food_items(self, query, limit):
+        connection = self.connection()
+        version = catalog_version(connection)
+        with self.search_lock:
+            if self.search_index is None or self.search_version != version:
+                connection.execute('BEGIN')
+                try:
+                    self.search_version = catalog_version(connection)
+                    self.search_index = food_search.FoodSearchIndex(name for (name,) in connection.execute('SELECT name FROM foods'))
+                finally:
+                    connection.execute('COMMIT')
+            names = self.search_index.search(query, limit)
+        if len(names) == 0:
+            return []
+        rows = connection.execute('SELECT name, calories, carbs, fats, proteins FROM foods WHERE name IN ({0})'.format(', '.join('?' * len(names))), names)
+        fooditems = {row[0]: food_item.FoodItem(*row) for row in rows}
+        return [fooditems[name] for name in names if name in fooditems]
+
+    # Merges the provided dictionary of food items, keyed by name, into the catalog in a single transaction.
+    # Existing items are replaced if overwrite is True, or kept otherwise.
+    # Returns an (added, overwritten, skipped) tuple of counts, or a Status if the catalog could not be written.
+    def merge_food_items(self, fooditems, overwrite):
+        def merge(connection):
+            previous_version = catalog_version(connection)
+            existing = set(name for (name,) in connection.execute('SELECT name FROM foods'))
+            matching = sum(1 for name in fooditems if name in existing)
+            conflict = 'DO UPDATE SET calories = excluded.calories, carbs = excluded.carbs, fats = excluded.fats, proteins = excluded.proteins' \
+                if overwrite else 'DO NOTHING'
+            connection.executemany('INSERT INTO foods (name, calories, carbs, fats, proteins) VALUES (?, ?, ?, ?, ?) ON CONFLICT (name) ' + conflict,
+                ((fooditem.name, fooditem.calories(), fooditem.carbs(), fooditem.fats(), fooditem.proteins()) for fooditem in fooditems.values()))
+            return (previous_version, catalog_version(connection), (len(fooditems) - matching, matching if overwrite else 0, 0 if overwrite else matching))
+        try:
+            previous_version, version, counts = self.transaction(merge)
+        except sqlite3.Error as error:
+            return status.Status(False, error)
+        self.update_search_index(previous_version, version, added=fooditems)
+        return counts
+
+    # Checkpoints the write-ahead log back into the database file.
+    def compact_food_items(self):
+        try:
+            self.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as error:
+            return status.Status(False, error)
+        return status.Status(True)
+
+    # Returns a value which changes whenever a food item or recipe is added, changed or removed by any process.
+    def recipes_version(self):
+        return self.connection().execute('SELECT version FROM recipes_version').fetchone()[0]
+
+    # Returns every recipe, see recipes.Recipe, in the order they were first defined.
+    def recipes(self):
+        parsed_recipes = [recipes.parse_recipe('{0},{1}'.format(name, ingredients))
+            for name, ingredients in self.connection().execute('SELECT name, ingredients FROM recipes ORDER BY rowid')]
+        return [recipe for recipe in parsed_recipes if recipe is not None]
+
+    # Stores the provided recipe, replacing any recipe of the same name.
+    def save_recipe(self, recipe):
+        self.connection().execute('INSERT INTO recipes (name, ingredients) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET ingredients = excluded.ingredients',
+            (recipe.name, recipe.ingredients_to_csv()))
+
+    # Records each of the given (consumed food item name, NutritionInformation) pairs for the user on consumed_date,
+    # in a single transaction.
+    def record_foods_eaten(self, consumed_date, consumptions):
+        user = current_user_key()
+        day = date_key(consumed_date)
+        self.transaction(lambda connection: connection.executemany(
+            'INSERT INTO consumption (user, day, name, calories, carbs, fats, proteins) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((user, day, food_name, consumed.calories, consumed.carbs, consumed.fats, consumed.proteins) for food_name, consumed in consumptions)))
+
+    # Returns a NutritionInformation object aggregating the food consumed on the provided date,
+    # or an error status if nothing was recorded that day.
+    # If detailed_results is provided as an empty dictionary, each individual item name will be added.
+    def get_daily_nutrition_information(self, status_date, detailed_results=None):
+        connection = self.connection()
+        key = (current_user_key(), date_key(status_date))
+        row = connection.execute('SELECT COUNT(*), TOTAL(calories), TOTAL(carbs), TOTAL(fats), TOTAL(proteins) FROM consumption '
+            'WHERE user = ? AND day = ?', key).fetchone()
+        if row[0] == 0:
+            return status.Status(False, 'No entries recorded for {0}'.format(fileutils.datetime_to_string(status_date)))
+        if detailed_results is not None:
+            for item_row in connection.execute('SELECT name, TOTAL(calories), TOTAL(carbs), TOTAL(fats), TOTAL(proteins) FROM consumption '
+                    'WHERE user = ? AND day = ? GROUP BY name ORDER BY MIN(id)', key):
+                detailed_results[item_row[0]] = row_to_nutrition_information(item_row[1:])
+        return row_to_nutrition_information(row[1:])
+
+    # Returns the chronological (date, DailyRollup) pairs of every day between start_date and end_date inclusive
+    # which has entries, from per-day SQL aggregates.
+    def daily_rollups(self, start_date, end_date):
+        daily_rollups = []
+        for row in self.connection().execute('SELECT day, COUNT(*), TOTAL(calories), TOTAL(carbs), TOTAL(fats), TOTAL(proteins) FROM consumption '
+                'WHERE user = ? AND day BETWEEN ? AND ? GROUP BY day ORDER BY day', (current_user_key(), date_key(start_date), date_key(end_date))):
+            daily_rollups.append((datetime.date.fromisoformat(row[0]), nutrition_rollup.DailyRollup(0, row[1], row_to_nutrition_information(row[2:]))))
+        return daily_rollups
+
+    # Returns the (daily, weekly, monthly, overall) summaries between start_date and end_date inclusive,
+    # from per-day SQL aggregates. See nutrition_rollup.summarize_range.
+    def summarize_range(self, start_date, end_date):
+        return nutrition_rollup.summarize_daily_rollups(start_date, end_date, self.daily_rollups(start_date, end_date))
+
+    # Sets the daily goal nutritional values for the user, overriding the previous entry if applicable.
+    def set_goals(self, calories, carbs, fats, proteins):
+        self.connection().execute('INSERT INTO goals (user, calories, carbs, fats, proteins) VALUES (?, ?, ?, ?, ?) ON CONFLICT (user) '
+            'DO UPDATE SET calories = excluded.calories, carbs = excluded.carbs, fats = excluded.fats, proteins = excluded.proteins',
+            (current_user_key(), calories, carbs, fats, proteins))
+
+    # Returns a NutritionInformation object representing the daily nutrition goals of the user,
+    # or a Status object indicating that information could not be retrieved.
+    def get_goal_nutrition_information(self):
+        row = self.connection().execute('SELECT calories, carbs, fats, proteins FROM goals WHERE user = ?', (current_user_key(),)).fetchone()
+        if row is None:
+            return status.Status(False, 'Missing nutrition goal. Consider setting your nutrition goals with the "set-goal" command.')
+        return row_to_nutrition_information(row)
+
+    # Replaces the user's goal trends state, see goal_trends, with update(state) inside a single write transaction.
+    # update receives the stored state, or None if there is none, and returns the new state or None to leave it as is.
+    def update_trends(self, update):
+        def update_state(connection):
+            row = connection.execute('SELECT state FROM trends WHERE user = ?', (current_user_key(),)).fetchone()
+            state = update(None if row is None else row[0])
+            if state is not None:
+                connection.execute('INSERT OR REPLACE INTO trends (user, state) VALUES (?, ?)', (current_user_key(), state))
+        self.transaction(update_state)
+
+    # Returns the names of every user with data, where None is the default single user.
+    def user_names(self):
+        rows = self.connection().execute('SELECT user FROM consumption GROUP BY user UNION SELECT user FROM goals')
+        return sorted((None if user == DEFAULT_USER else user for (user,) in rows), key=lambda user_name: user_name or '')
+
+    # Returns the sorted dates which have entries for the current user.
+    def consumption_dates(self):
+        rows = self.connection().execute('SELECT DISTINCT day FROM consumption WHERE user = ? ORDER BY day', (current_user_key(),))
+        return [datetime.date.fromisoformat(day) for (day,) in rows]
+
+    # Returns a NutritionBatch of the entries recorded for the current user on the given date, in order.
+    def consumption_entries(self, date):
+        rows = self.connection().execute('SELECT name, calories, carbs, fats, proteins FROM consumption WHERE user = ? AND day = ? ORDER BY id',
+            (current_user_key(), date_key(date)))
+        batch = nutrition_batch.NutritionBatch()
+        for row in rows:
+            batch.append_values(*row)
+        return batch
+
+    # Closes this thread's connection to the database.
+    def close(self):
+        connection = getattr(self.connections, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.connections.connection = None
\ No newline at end of file
@@ -0,0 +1,212 @@
+import contextlib
+import instrumentation
+import os
+import stat
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError: # Advisory locks are only available on Unix, elsewhere only threads are serialized
+    fcntl = None
+
+LOCK_EXTENSION='.lock'
+TEMP_EXTENSION='.tmp'
+# Whether writes are flushed to disk before they are reported as done.
+FSYNC=True
+
+# The process umask, applied to new files written through temporary files, which are otherwise private.
+UMASK=os.umask(0)
+os.umask(UMASK)
+
+# Pending appends to each filepath, see append.
+APPEND_GROUPS={}
+APPEND_GROUPS_LOCK=threading.Lock()
+# Thread locks guarding each locked filepath, so that threads are serialized even without advisory locks.
+THREAD_LOCKS={}
+THREAD_LOCKS_LOCK=threading.Lock()
+# The lock filepaths held by the current thread, so that locked() can be re-entered.
+HELD_LOCKS=threading.local()
+
+# Simple class to hold the appends to a single file which are waiting to be committed together.
+class AppendGroup:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.committing = False
+
+# Simple class to hold a single append waiting for its group to be committed.
+class PendingAppend:
+    def __init__(self, data, context):
+        self.data = data
+        self.context = context
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Flushes the provided open file to disk if FSYNC is enabled.
+def sync(file_object):
+    file_object.flush()
+    if FSYNC:
+        os.fsync(file_object.fileno())
+
+# Flushes the directory entry of a newly created or replaced file to disk if FSYNC is enabled.
+def sync_directory(dirpath):
+    if not FSYNC or not hasattr(os, 'O_DIRECTORY'):
+        return
+    dir_fd = os.open(dirpath, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+# Returns the thread lock guarding the given lock filepath.
+def thread_lock(lock_filepath):
+    with THREAD_LOCKS_LOCK:
+        if lock_filepath not in THREAD_LOCKS:
+            THREAD_LOCKS[lock_filepath] = threading.RLock()
+        return THREAD_LOCKS[lock_filepath]
+
+# Takes an exclusive advisory lock over the provided open file, waiting for other processes to release it.
+def lock_file(file_object):
+    if fcntl is not None:
+        fcntl.flock(file_object.fileno(), fcntl.LOCK_EX)
+
+# Releases the advisory lock taken with lock_file.
+def unlock_file(file_object):
+    if fcntl is not None:
+        fcntl.flock(file_object.fileno(), fcntl.LOCK_UN)
+
+# Context manager holding an exclusive advisory lock over filepath, shared by every thread and process using it.
+# The lock is taken on a separate filepath + '.lock' file, so that it survives filepath being atomically replaced.
+# Lock files are left in place once released, as removing one could let two processes lock different files at once.
+# They hold no data, and are ignored by git under data/.
+# Re-entering the lock from the thread already holding it does not wait.
+@contextlib.contextmanager
+def locked(filepath):
+    lock_filepath = filepath + LOCK_EXTENSION
+    held_locks = getattr(HELD_LOCKS, 'filepaths', None)
+    if held_locks is None:
+        held_locks = HELD_LOCKS.filepaths = set()
+    if lock_filepath in held_locks:
+        yield
+        return
+    with thread_lock(lock_filepath):
+        with instrumentation.counted(open(lock_filepath, 'a')) as lock_output:
+            lock_file(lock_output)
+            held_locks.add(lock_filepath)
+            try:
+                yield
+            finally:
+                held_locks.discard(lock_filepath)
+                unlock_file(lock_output)
+
+# Context manager yielding a (file object, temp filepath) pair for a new, uniquely named temporary file next to
+# filepath, opened with the given mode. The file is flushed to disk once the block completes, ready to be swapped in
+# with os.replace, and is removed if the block raises. Concurrent writers never share a temporary file.
+@contextlib.contextmanager
+def temp_writer(filepath, mode='w'):
+    dirpath = os.path.dirname(filepath) or '.'
+    temp_fd, temp_filepath = tempfile.mkstemp(dir=dirpath, prefix=os.path.basename(filepath) + '.', suffix=TEMP_EXTENSION)
+    try:
+        if os.path.exists(filepath): # Keep the permissions of the file being replaced rather than the private temp file's
+            os.chmod(temp_filepath, stat.S_IMODE(os.stat(filepath).st_mode))
+        else:
+            os.chmod(temp_filepath, 0o666 & ~UMASK)
+        with instrumentation.counted(os.fdopen(temp_fd, mode)) as file_output:
+            yield (file_output, temp_filepath)
+            sync(file_output)
+    except BaseException:
+        remove_if_exists(temp_filepath)
+        raise
+
+# Context manager yielding a file object, opened with the given mode, whose contents replace filepath once the
+# block completes, see temp_writer. Readers see either the old or the new contents, never a partial write.
+# If the block raises, filepath is left untouched.
+@contextlib.contextmanager
+def atomic_writer(filepath, mode='w'):
+    with temp_writer(filepath, mode) as (file_output, temp_filepath):
+        yield file_output
+    replace(temp_filepath, filepath)
+
+# Atomically moves the file at source_filepath over target_filepath, flushing the directory entry to disk.
+def replace(source_filepath, target_filepath):
+    try:
+        os.replace(source_filepath, target_filepath)
+    except BaseException:
+        remove_if_exists(source_filepath)
+        raise
+    sync_directory(os.path.dirname(target_filepath) or '.')
+
+# Removes the file at filepath if it exists.
+def remove_if_exists(filepath):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+# Atomically replaces the contents of filepath with the provided string, see atomic_writer.
+def atomic_write(filepath, contents):
+    with atomic_writer(filepath) as file_output:
+        file_output.write(contents)
+
+# Appends the provided string to filepath under its advisory lock and returns the (start, end) byte offsets
+# it was written at. Appends to the same filepath made concurrently by other threads are coalesced into a
+# single write and fsync (group commit): the first thread to arrive commits everything queued, while the
+# others wait for their data to be committed.
+# If provided, on_commit(previous_size, current_size, contexts) is called once per commit while the lock is
+# still held, with the context of every append in the commit, e.g. to update a summary of the file.
+def append(filepath, contents, context=None, on_commit=None):
+    with APPEND_GROUPS_LOCK:
+        if filepath not in APPEND_GROUPS:
+            APPEND_GROUPS[filepath] = AppendGroup()
+        group = APPEND_GROUPS[filepath]
+    pending = PendingAppend(contents.encode(), context)
+    with group.lock:
+        group.pending.append(pending)
+        leader = not group.committing
+        group.committing = True
+    if leader:
+        while True:
+            with group.lock:
+                batch = group.pending
+                group.pending = []
+                if len(batch) == 0:
+                    group.committing = False
+                    break
+            commit_appends(filepath, batch, on_commit)
+    else:
+        pending.done.wait()
+    if pending.error is not None:
+        raise pending.error
+    return pending.result
+
+# Context manager yielding filepath opened for binary appends, under the thread lock and advisory lock taken by
+# every append to it. Since appended files are never replaced, the advisory lock is taken on filepath itself.
+@contextlib.contextmanager
+def locked_appender(filepath):
+    with thread_lock(filepath):
+        with instrumentation.counted(open(filepath, 'ab')) as output:
+            lock_file(output)
+            try:
+                yield output
+            finally:
+                unlock_file(output)
+
+# Writes a batch of pending appends to filepath with a single write and fsync, then wakes their threads.
+def commit_appends(filepath, batch, on_commit):
+    try:
+        with locked_appender(filepath) as output:
+            previous_size = os.fstat(output.fileno()).st_size
+            output.write(b''.join(pending.data for pending in batch))
+            sync(output)
+            offset = previous_size
+            for pending in batch:
+                pending.result = (offset, offset + len(pending.data))
+                offset += len(pending.data)
+            if on_commit is not None:
+                on_commit(previous_size, offset, [pending.context for pending in batch])
+    except Exception as error:
+        for pending in batch:
+            pending.error = error
+    for pending in batch:
+        pending.done.set()
\ No newline at end of file
@@ -0,0 +1,173 @@
+import consumption_layout
+import csv_backend
+import fileutils
+import nutrition_rollup
+import os
+import sqlite_backend
+import status
+import storage
+import threading
+
+CSV_BACKEND='csv'
+SQLITE_BACKEND='sqlite'
+BACKEND_NAMES=[CSV_BACKEND, SQLITE_BACKEND]
+CONFIG_FILENAME='config.csv'
+BACKEND_CONFIG_KEY='storage_backend'
+# Overrides the backend chosen in data/config.csv when set, e.g. FOOD_IN_ME_STORAGE_BACKEND=sqlite.
+BACKEND_ENVIRONMENT_VARIABLE='FOOD_IN_ME_STORAGE_BACKEND'
+
+# Open backends, keyed by backend name and data directory, see current.
+BACKENDS={}
+BACKENDS_LOCK=threading.Lock()
+
+# Returns the filepath to the configuration file.
+def config_filepath():
+    return fileutils.custom_filepath(CONFIG_FILENAME)
+
+# Returns the key,value settings stored in the configuration file.
+def read_config():
+    config = {}
+    if os.path.exists(config_filepath()):
+        with fileutils.open_file(config_filepath(), 'r') as input:
+            for line in input:
+                setting = line.strip().split(',', 1)
+                if len(setting) == 2:
+                    config[setting[0]] = setting[1]
+    return config
+
+# Stores the provided setting in the configuration file, keeping any others.
+def write_config_setting(key, value):
+    fileutils.instantiate_path_if_necessary(fileutils.custom_filepath(''))
+    with storage.locked(config_filepath()):
+        config = read_config()
+        config[key] = value
+        storage.atomic_write(config_filepath(), ''.join('{0},{1}\n'.format(k, v) for k, v in config.items()))
+
+# Returns the name of the configured storage backend, "csv" unless configured otherwise.
+def configured_backend_name():
+    backend_name = os.environ.get(BACKEND_ENVIRONMENT_VARIABLE)
+    if backend_name is None:
+        backend_name = read_config().get(BACKEND_CONFIG_KEY, CSV_BACKEND)
+    return backend_name.lower()
+
+# Selects the storage backend used from now on, by name.
+# Returns a Status indicating whether the name is supported.
+def set_configured_backend_name(backend_name):
+    if backend_name not in BACKEND_NAMES:
+        return status.Status(False, 'Unsupported storage backend "{0}". Supported backends are: {1}'.format(backend_name, ', '.join(BACKEND_NAMES)))
+    write_config_setting(BACKEND_CONFIG_KEY, backend_name)
+    return status.Status(True)
+
+# Returns a new backend of the given name over the current data directory, or None if the name is not supported.
+def create_backend(backend_name):
+    if backend_name == CSV_BACKEND:
+        return csv_backend.CsvBackend()
+    if backend_name == SQLITE_BACKEND:
+        return sqlite_backend.SqliteBackend(fileutils.custom_filepath(sqlite_backend.DATABASE_FILENAME))
+    return None
+
+# Returns the configured backend over the current data directory. Backends are opened once and shared,
+# so that their caches, such as the in-memory food catalog, stay warm between calls.
+def current():
+    backend_name = configured_backend_name()
+    key = (backend_name, fileutils.custom_filepath(''))
+    with BACKENDS_LOCK:
+        if key not in BACKENDS:
+            backend = create_backend(backend_name)
+            if backend is None:
+                raise ValueError('Unsupported storage backend "{0}" in {1}'.format(backend_name, config_filepath()))
+            BACKENDS[key] = backend
+        return BACKENDS[key]
+
+# Copies every food item, recipe, consumption entry and goal from the source backend into the target backend,
+# for the default user and every user under data/users/.
+# Returns a (foods, users, entries) tuple of counts copied, or a Status if the copy failed.
+def copy_backend(source, target):
+    fooditems = {fooditem.name: fooditem for fooditem in source.food_items()}
+    merged = target.merge_food_items(fooditems, True)
+    if isinstance(merged, status.Status):
+        return merged
+    for recipe in source.recipes():
+        target.save_recipe(recipe)
+    previous_user = fileutils.current_user()
+    user_names = source.user_names()
+    entries = 0
+    try:
+        for user_name in user_names:
+            fileutils.set_current_user(user_name)
+            for date in source.consumption_dates():
+                consumptions = source.consumption_entries(date)
+                if len(consumptions) > 0:
+                    target.record_foods_eaten(date, consumptions)
+                    entries += len(consumptions)
+            goal = source.get_goal_nutrition_information()
+            if not isinstance(goal, status.Status):
+                target.set_goals(goal.calories, goal.carbs, goal.fats, goal.proteins)
+    except Exception as error:
+        return status.Status(False, error)
+    finally:
+        fileutils.set_current_user(previous_user)
+    return (len(fooditems), len(user_names), entries)
+
+# Returns the names of the users of the CSV backend with day files still in the flat layout, see consumption_layout.
+def legacy_layout_users(source):
+    previous_user = fileutils.current_user()
+    try:
+        legacy_users = []
+        for user_name in source.user_names():
+            fileutils.set_current_user(user_name)
+            if len(consumption_layout.legacy_day_filenames()) > 0:
+                legacy_users.append(user_name)
+        return legacy_users
+    finally:
+        fileutils.set_current_user(previous_user)
+
+# Moves the day files of the default user and every user under data/users/ from the flat layout, where they were
+# named m-d-yyyy.csv, into year/month partitions named by ISO date, and builds the manifest of each partition.
+# The data directory is migrated in place, and running the migration again after an interruption completes it.
+# Returns a (users, days) tuple of counts migrated, or a Status if a migrated day file could not be parsed.
+def migrate_consumption_layout():
+    source = csv_backend.CsvBackend()
+    previous_user = fileutils.current_user()
+    users = 0
+    days = 0
+    try:
+        for user_name in source.user_names():
+            fileutils.set_current_user(user_name)
+            migrated_dates = consumption_layout.migrate_legacy_day_files()
+            partitions = {}
+            for date in migrated_dates:
+                partitions.setdefault((date.year, date.month), []).append(date)
+            for (year, month), dates in partitions.items():
+                rebuilt = nutrition_rollup.rebuild_rollups(year, month, dates)
+                if isinstance(rebuilt, status.Status):
+                    return rebuilt
+            if len(migrated_dates) > 0:
+                users += 1
+                days += len(migrated_dates)
+    finally:
+        fileutils.set_current_user(previous_user)
+    return (users, days)
+
+# Migrates the CSV files under data/ into a new SQLite database at data/food_in_me.db, and configures it as the
+# storage backend. The CSV files are left untouched. Refuses to run if the database already exists, so that
+# entries are never copied twice.
+# Returns a (foods, users, entries) tuple of counts migrated, or a Status if the migration failed.
+def migrate_to_sqlite():
+    database_filepath = fileutils.custom_filepath(sqlite_backend.DATABASE_FILENAME)
+    if os.path.exists(database_filepath):
+        return status.Status(False, '{0} already exists. Remove it first to migrate again.'.format(database_filepath))
+    source = csv_backend.CsvBackend()
+    if len(legacy_layout_users(source)) > 0:
+        return status.Status(False, 'Some day files are still in the old layout. Run "migrate-layout" first.')
+    target = sqlite_backend.SqliteBackend(database_filepath)
+    try:
+        migrated = copy_backend(source, target)
+    finally:
+        target.close()
+    if isinstance(migrated, status.Status):
+        for suffix in ['', '-wal', '-shm']:
+            storage.remove_if_exists(database_filepath + suffix)
+        return migrated
+    set_configured_backend_name(SQLITE_BACKEND)
+    return migrated
\ No newline at end of file
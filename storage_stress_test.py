@@ -0,0 +1,134 @@
+import argparse
+import csv_backend
+import datetime
+import fileutils
+import food_catalog
+import food_processor
+import glob
+import multiprocessing
+import nutrition_rollup
+import os
+import shutil
+import storage
+import tempfile
+import threading
+
+STRESS_DATES=[datetime.date(2024, 1, 1), datetime.date(2024, 1, 2), datetime.date(2024, 1, 3)]
+
+# Returns the calories of the seeded food item with the given index.
+def seeded_calories(food_index):
+    return float(100 + food_index)
+
+# Returns the (food_index, date) eaten by the given worker thread on its iteration.
+def scheduled_entry(process_index, thread_index, iteration, foods):
+    return ((process_index * 31 + thread_index * 7 + iteration) % foods, STRESS_DATES[(thread_index + iteration) % len(STRESS_DATES)])
+
+# Records entries from a single thread, adding a uniquely named food item to the catalog every tenth iteration
+# and occasionally compacting the catalog, so that day files, the catalog log and compaction all contend.
+def run_thread(process_index, thread_index, entries, foods, errors):
+    for iteration in range(entries):
+        food_index, date = scheduled_entry(process_index, thread_index, iteration, foods)
+        result = food_processor.try_process_food_eaten('stress_food_{0}'.format(food_index), 100, date)
+        if not result.okay():
+            errors.append(str(result.error()))
+        if iteration % 10 == 0:
+            result = food_processor.try_add_food_item('added_{0}_{1}_{2}-1-2-3-4'.format(process_index, thread_index, iteration))
+            if not result.okay():
+                errors.append(str(result.error()))
+        if thread_index == 0 and iteration % 50 == 25:
+            food_processor.compact_food_items() # May legitimately lose a race with another compaction
+
+# Runs the threads of a single worker process, exiting with a non-zero status if any write failed.
+def run_process(data_dirpath, process_index, threads, entries, foods):
+    fileutils.set_custom_data_dirpath(data_dirpath)
+    errors = []
+    workers = [threading.Thread(target=run_thread, args=(process_index, thread_index, entries, foods, errors)) for thread_index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    food_processor.backend().wait_for_background_work()
+    for error in errors[:10]:
+        print('Process {0}: {1}'.format(process_index, error))
+    raise SystemExit(1 if errors else 0)
+
+# Checks that every entry and food item written by the workers is present exactly once.
+# Returns a list of problems found, which is empty if nothing was lost or corrupted.
+def verify(data_dirpath, processes, threads, entries, foods):
+    problems = []
+    expected_entries = {date: 0 for date in STRESS_DATES}
+    expected_calories = {date: 0.0 for date in STRESS_DATES}
+    for process_index in range(processes):
+        for thread_index in range(threads):
+            for iteration in range(entries):
+                food_index, date = scheduled_entry(process_index, thread_index, iteration, foods)
+                expected_entries[date] += 1
+                expected_calories[date] += seeded_calories(food_index)
+    for date in STRESS_DATES:
+        day_filepath = csv_backend.day_filepath(date)
+        with open(day_filepath, 'r') as input:
+            lines = input.read().splitlines()
+        calories = 0.0
+        for line in lines:
+            fields = line.split(',')
+            if len(fields) != 5:
+                problems.append('Corrupted line in {0}: {1}'.format(day_filepath, line))
+                continue
+            calories += float(fields[1])
+        if len(lines) != expected_entries[date]:
+            problems.append('{0} has {1} entries, expected {2}'.format(day_filepath, len(lines), expected_entries[date]))
+        if abs(calories - expected_calories[date]) > 1e-6 * expected_calories[date]:
+            problems.append('{0} totals {1} calories, expected {2}'.format(day_filepath, calories, expected_calories[date]))
+        rollup = nutrition_rollup.get_daily_rollup(date)
+        if rollup.entries != len(lines) or abs(rollup.nutrition_information.calories - calories) > 1e-6 * calories:
+            problems.append('Rollup for {0} does not match its day file'.format(day_filepath))
+
+    catalog = food_catalog.FoodCatalog(csv_backend.CUSTOM_FOOD_ITEM_FILENAME)
+    for process_index in range(processes):
+        for thread_index in range(threads):
+            for iteration in range(0, entries, 10):
+                name = 'added_{0}_{1}_{2}'.format(process_index, thread_index, iteration)
+                if not catalog.contains(name):
+                    problems.append('Food item {0} was lost from the catalog'.format(name))
+    leftovers = glob.glob(os.path.join(data_dirpath, '**', '*' + storage.TEMP_EXTENSION), recursive=True)
+    if leftovers:
+        problems.append('Temporary files were left behind: {0}'.format(', '.join(leftovers)))
+    return problems
+
+# Example invocation: python storage_stress_test.py --processes 4 --threads 8 --entries 200
+# Several worker processes, each with several threads, write to the same day files and catalog of a scratch
+# data directory at once. Afterwards every entry and food item is checked to be present exactly once.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that concurrent writers never lose or corrupt entries.')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--entries', type=int, default=200, help='entries recorded by each thread')
+    parser.add_argument('--foods', type=int, default=50)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch data directory for inspection')
+    args = parser.parse_args()
+
+    data_dirpath = tempfile.mkdtemp(prefix='food_in_me_stress_')
+    fileutils.set_custom_data_dirpath(data_dirpath)
+    for food_index in range(args.foods):
+        food_processor.try_add_food_item('stress_food_{0}-{1}-1-1-1'.format(food_index, seeded_calories(food_index)))
+
+    workers = [multiprocessing.Process(target=run_process, args=(data_dirpath, process_index, args.threads, args.entries, args.foods))
+        for process_index in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    problems = verify(data_dirpath, args.processes, args.threads, args.entries, args.foods)
+    if any(worker.exitcode != 0 for worker in workers):
+        problems.append('At least one worker process reported failed writes')
+
+    total = args.processes * args.threads * args.entries
+    if problems:
+        for problem in problems:
+            print(problem)
+        print('FAILED: {0} problems found across {1} entries. Data kept in {2}'.format(len(problems), total, data_dirpath))
+        raise SystemExit(1)
+    print('OK: {0} entries and {1} food items from {2} processes x {3} threads were all recorded exactly once.'.format(
+        total, args.processes * args.threads * len(range(0, args.entries, 10)), args.processes, args.threads))
+    if not args.keep:
+        shutil.rmtree(data_dirpath)
\ No newline at end of file
@@ -0,0 +1,35 @@
+import os
+import sys
+
+# The modules live flat in the repository root, next to this directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fileutils
+import food_processor
+import pytest
+import reference_catalog
+import storage
+import storage_backend
+
+# Points every data file at a fresh scratch directory, with no open backends, recipe books or reference catalogs
+# carried over from another test, and selects the default user.
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(fileutils, 'CUSTOM_DATA_FILEPATH', fileutils.CUSTOM_DATA_FILEPATH)
+    monkeypatch.setattr(storage_backend, 'BACKENDS', {})
+    monkeypatch.setattr(food_processor, 'RECIPE_BOOKS', {})
+    monkeypatch.setattr(reference_catalog, 'OPEN_CATALOGS', {})
+    monkeypatch.setattr(storage, 'FSYNC', False)
+    monkeypatch.delenv(storage_backend.BACKEND_ENVIRONMENT_VARIABLE, raising=False)
+    fileutils.set_custom_data_dirpath(str(tmp_path))
+    fileutils.set_current_user(None)
+    yield tmp_path
+    for backend in storage_backend.BACKENDS.values():
+        backend.close()
+    fileutils.set_current_user(None)
+
+# Selects each storage backend in turn, over a fresh data directory, and returns its name.
+@pytest.fixture(params=storage_backend.BACKEND_NAMES)
+def backend_name(request, data_dir, monkeypatch):
+    monkeypatch.setenv(storage_backend.BACKEND_ENVIRONMENT_VARIABLE, request.param)
+    return request.param
\ No newline at end of file
@@ -0,0 +1,119 @@
+import consumption_layout
+import datetime
+import fileutils
+import food_item
+import food_processor
+import nutrition_rollup
+import os
+import pytest
+import storage_backend
+
+SEPTEMBER_20=datetime.date(2024, 9, 20)
+OCTOBER_2=datetime.date(2024, 10, 2)
+LEGACY_ENTRIES={SEPTEMBER_20: 'apple,95,25,0.5,0.5\negg,78,0.5,5,6\n', OCTOBER_2: 'toast,80,14,1,3\n'}
+
+# Writes the day files of LEGACY_ENTRIES for the given user in the flat layout, with a rollups/ directory alongside them.
+def write_legacy_layout(user_name=None):
+    fileutils.set_current_user(user_name)
+    dirpath = fileutils.user_consumption_dirpath()
+    for date, entries in LEGACY_ENTRIES.items():
+        with open(consumption_layout.legacy_day_filepath(date), 'w') as output:
+            output.write(entries)
+    os.makedirs(dirpath + consumption_layout.LEGACY_ROLLUP_DIRNAME)
+    with open(dirpath + consumption_layout.LEGACY_ROLLUP_DIRNAME + '9-20-2024.csv', 'w') as output:
+        output.write('stale rollup\n')
+    fileutils.set_current_user(None)
+
+# Returns the (entries, calories) of the day's manifest rollup, after checking it matches the size of its day file.
+def manifest_totals(date):
+    rollup = nutrition_rollup.read_manifest(date.year, date.month)[date]
+    assert rollup.source_size == os.path.getsize(consumption_layout.day_filepath(date))
+    return (rollup.entries, rollup.nutrition_information.calories)
+
+# Returns the names of every file left in the current user's directory tree which is not a day file or manifest.
+def leftover_files():
+    leftovers = []
+    for dirpath, _, filenames in os.walk(fileutils.user_consumption_dirpath()):
+        leftovers += [filename for filename in filenames if consumption_layout.parse_day_filename(filename) is None
+            and filename != nutrition_rollup.MANIFEST_FILENAME and not filename.endswith('.lock')]
+    return leftovers
+
+# Legacy day files move into their partitions with a manifest of their rollups, and the legacy rollups are removed.
+def test_migration_moves_day_files(data_dir):
+    write_legacy_layout()
+    write_legacy_layout('alice')
+    assert storage_backend.migrate_consumption_layout() == (2, 4)
+    for user_name in [None, 'alice']:
+        fileutils.set_current_user(user_name)
+        assert consumption_layout.legacy_day_filenames() == []
+        assert not os.path.exists(fileutils.user_consumption_dirpath() + consumption_layout.LEGACY_ROLLUP_DIRNAME)
+        assert consumption_layout.consumption_dates() == [SEPTEMBER_20, OCTOBER_2]
+        assert manifest_totals(SEPTEMBER_20) == (2, 173)
+        assert manifest_totals(OCTOBER_2) == (1, 80)
+        assert leftover_files() == []
+
+# Running the migration again finds nothing left to move and changes nothing.
+def test_migration_is_idempotent(data_dir):
+    write_legacy_layout()
+    storage_backend.migrate_consumption_layout()
+    with open(consumption_layout.day_filepath(SEPTEMBER_20), 'rb') as input:
+        contents = input.read()
+    assert storage_backend.migrate_consumption_layout() == (0, 0)
+    with open(consumption_layout.day_filepath(SEPTEMBER_20), 'rb') as input:
+        assert input.read() == contents
+    assert manifest_totals(SEPTEMBER_20) == (2, 173)
+
+# Entries already recorded in the partitioned layout are kept, with the legacy entries appended after them.
+def test_migration_merges_into_existing_day_files(data_dir):
+    write_legacy_layout()
+    food_processor.backend().record_foods_eaten(SEPTEMBER_20, [('pear', food_item.FoodItem('pear', 100, 27, 0.5, 0.5).nutrition_information)])
+    assert storage_backend.migrate_consumption_layout() == (1, 2)
+    with open(consumption_layout.day_filepath(SEPTEMBER_20), 'r') as input:
+        assert [line.split(',')[0] for line in input.read().splitlines()] == ['pear', 'apple', 'egg']
+    assert manifest_totals(SEPTEMBER_20) == (3, 273)
+    assert food_processor.backend().get_daily_nutrition_information(SEPTEMBER_20).calories == 273
+
+# A migration interrupted between linking a day file into its partition and unlinking the legacy file completes
+# without recording its entries twice.
+def test_migration_resumes_after_linking(data_dir):
+    write_legacy_layout()
+    os.link(consumption_layout.legacy_day_filepath(SEPTEMBER_20), consumption_layout.day_filepath(SEPTEMBER_20, True))
+    assert storage_backend.migrate_consumption_layout() == (1, 2)
+    assert manifest_totals(SEPTEMBER_20) == (2, 173)
+    assert leftover_files() == []
+
+# A merge interrupted once the legacy day file is staged, or once its entries are appended, resumes on the next run,
+# appending the entries exactly once, even with more entries recorded in between.
+@pytest.mark.parametrize('interrupted_after_append', [False, True])
+def test_migration_resumes_interrupted_merges(data_dir, monkeypatch, interrupted_after_append):
+    write_legacy_layout()
+    pear = food_item.FoodItem('pear', 100, 27, 0.5, 0.5).nutrition_information
+    food_processor.backend().record_foods_eaten(SEPTEMBER_20, [('pear', pear)])
+    append_staged_day_file = consumption_layout.append_staged_day_file
+    remove = os.remove
+    with pytest.MonkeyPatch.context() as crash:
+        # Stands in for a crash, either before the staged entries are appended or before the staged file is removed
+        def interrupted_append(output, target_filepath, staged_filepath, offset):
+            if interrupted_after_append:
+                crash.setattr(os, 'remove', interrupted_remove)
+                append_staged_day_file(output, target_filepath, staged_filepath, offset)
+            raise KeyboardInterrupt()
+        def interrupted_remove(filepath):
+            if filepath.endswith(consumption_layout.STAGED_DAY_FILE_SUFFIX):
+                raise KeyboardInterrupt()
+            remove(filepath)
+        crash.setattr(consumption_layout, 'append_staged_day_file', interrupted_append)
+        with pytest.raises(KeyboardInterrupt):
+            storage_backend.migrate_consumption_layout()
+    assert len(consumption_layout.staged_day_files()) == 1
+
+    food_processor.backend().record_foods_eaten(SEPTEMBER_20, [('pear', pear)])
+    assert storage_backend.migrate_consumption_layout() == (1, 1) # October 2 was moved before the interruption
+    with open(consumption_layout.day_filepath(SEPTEMBER_20), 'r') as input:
+        names = [line.split(',')[0] for line in input.read().splitlines()]
+    assert names == (['pear', 'apple', 'egg', 'pear'] if interrupted_after_append else ['pear', 'pear', 'apple', 'egg'])
+    assert manifest_totals(SEPTEMBER_20) == (4, 373)
+    assert consumption_layout.staged_day_files() == []
+    assert leftover_files() == []
+    assert food_processor.backend().get_daily_nutrition_information(OCTOBER_2).calories == 80
+    assert storage_backend.migrate_consumption_layout() == (0, 0)
\ No newline at end of file
@@ -0,0 +1,138 @@
+import food_catalog
+import food_item
+import os
+import pytest
+
+CATALOG_FILENAME='foods.csv'
+
+# Returns a catalog over the scratch data directory which compacts on the calling thread, so that tests see its result.
+@pytest.fixture
+def catalog(data_dir):
+    return food_catalog.FoodCatalog(CATALOG_FILENAME, background_compaction=False)
+
+# Returns a second catalog over the same files, standing in for another process reading them.
+def reopened():
+    return food_catalog.FoodCatalog(CATALOG_FILENAME, background_compaction=False)
+
+# Returns the (name, calories, carbs, fats, proteins) values of every item, sorted by name, for comparison.
+def values_of(catalog):
+    catalog.refresh_if_necessary()
+    return sorted((fooditem.name, fooditem.calories(), fooditem.carbs(), fooditem.fats(), fooditem.proteins()) for fooditem in catalog.items.values())
+
+# Returns the lines of the file at filepath, without their line endings.
+def lines_of(filepath):
+    with open(filepath, 'r') as input:
+        return input.read().splitlines()
+
+# Upserts and tombstones are appended to the log, where the last write for a name wins in every reader.
+def test_log_records_are_replayed_in_order(catalog):
+    catalog.add(food_item.FoodItem('apple', 95, 25, 0.3, 0.5))
+    catalog.add(food_item.FoodItem('banana', 105, 27, 0.4, 1.3))
+    assert catalog.replace(food_item.FoodItem('apple', 80, 20, 0.2, 0.4)).okay()
+    assert catalog.remove('banana').okay()
+
+    assert not os.path.exists(catalog.filepath())
+    assert len(lines_of(catalog.log_filepath())) == 4
+    assert values_of(catalog) == [('apple', 80, 20, 0.2, 0.4)]
+    assert values_of(reopened()) == values_of(catalog)
+
+# Changes made through another catalog over the same files are picked up without reloading the catalog file.
+def test_records_appended_by_others_are_replayed(catalog):
+    catalog.add(food_item.FoodItem('apple', 95, 25, 0.3, 0.5))
+    other = reopened()
+    assert other.get('apple') is not None
+    catalog.remove('apple')
+    catalog.add(food_item.FoodItem('kiwi', 42, 10, 0.4, 0.8))
+    assert other.get('apple') is None
+    assert other.get('kiwi').calories() == 42
+
+# Replacing or removing an item which does not exist fails without writing a record.
+def test_missing_items_cannot_be_replaced_or_removed(catalog):
+    assert not catalog.replace(food_item.FoodItem('apple', 95, 25, 0.3, 0.5)).okay()
+    catalog.add(food_item.FoodItem('kiwi', 42, 10, 0.4, 0.8))
+    log_size = catalog.log_size()
+    assert not catalog.replace(food_item.FoodItem('apple', 95, 25, 0.3, 0.5)).okay()
+    assert not catalog.remove('apple').okay()
+    assert catalog.log_size() == log_size
+
+# A record whose trailing newline has not been written yet is only applied once it is complete.
+def test_partially_written_records_are_ignored(catalog):
+    catalog.add(food_item.FoodItem('apple', 95, 25, 0.3, 0.5))
+    with open(catalog.log_filepath(), 'a') as log_output:
+        log_output.write('+,kiwi,42,10,0.4')
+    assert catalog.get('kiwi') is None
+    with open(catalog.log_filepath(), 'a') as log_output:
+        log_output.write(',0.8\n')
+    assert catalog.get('kiwi').proteins() == 0.8
+
+# Compaction folds the log into the catalog file, which then holds a single row per item and no tombstoned items.
+def test_compaction_round_trip(catalog):
+    for index in range(10):
+        catalog.add(food_item.FoodItem('food_{0}'.format(index), index, 1, 2, 3))
+    catalog.replace(food_item.FoodItem('food_3', 300, 1, 2, 3))
+    catalog.remove('food_5')
+    expected = values_of(catalog)
+
+    assert catalog.compact().okay()
+    assert not os.path.exists(catalog.log_filepath())
+    assert catalog.log_offset == 0
+    assert catalog.stored_rows == 9
+    rows = lines_of(catalog.filepath())
+    assert rows[0] == food_item.CSV_HEADER
+    assert len(rows) == 10
+    assert values_of(catalog) == expected
+    assert values_of(reopened()) == expected
+
+    catalog.add(food_item.FoodItem('food_10', 10, 1, 2, 3))
+    assert values_of(reopened()) == values_of(catalog)
+
+# A reader holding the catalog from before a compaction sees the same items afterwards.
+def test_compaction_is_seen_by_other_readers(catalog):
+    catalog.add(food_item.FoodItem('apple', 95, 25, 0.3, 0.5))
+    catalog.add(food_item.FoodItem('kiwi', 42, 10, 0.4, 0.8))
+    other = reopened()
+    expected = values_of(other)
+    catalog.compact()
+    assert values_of(other) == expected
+    catalog.remove('kiwi')
+    assert values_of(other) == [('apple', 95, 25, 0.3, 0.5)]
+
+# Compaction starts by itself once the log grows past its threshold.
+def test_compaction_starts_once_the_log_is_large(catalog, monkeypatch):
+    monkeypatch.setattr(food_catalog, 'COMPACTION_LOG_BYTES', 200)
+    for index in range(20):
+        catalog.add(food_item.FoodItem('food_{0}'.format(index), index, 1, 2, 3))
+    assert catalog.log_size() < 200
+    assert os.path.exists(catalog.filepath())
+    assert len(values_of(reopened())) == 20
+
+# Rows of the catalog file which cannot be parsed, and the later rows of a name, survive rewrites of the file,
+# except for the rows of names which were removed.
+def test_compaction_preserves_unparsed_and_duplicate_rows(catalog):
+    with open(catalog.filepath(), 'w') as output:
+        output.write('\n'.join([food_item.CSV_HEADER, 'apple,95,25,0.3,0.5', 'not a food item', 'apple,1,1,1,1',
+            'kiwi,42,10,0.4,0.8', 'kiwi,2,2,2,2']) + '\n')
+    assert catalog.get('apple').calories() == 95
+    catalog.remove('kiwi')
+    catalog.add(food_item.FoodItem('pear', 100, 27, 0.2, 0.6))
+    assert catalog.compact().okay()
+
+    rows = lines_of(catalog.filepath())
+    assert 'not a food item' in rows
+    apple_rows = [food_item.parse_food_item(row, ',') for row in rows if row.startswith('apple,')]
+    assert [fooditem.calories() for fooditem in apple_rows] == [95, 1]
+    assert not any(row.startswith('kiwi,') for row in rows)
+    assert values_of(reopened()) == [('apple', 95, 25, 0.3, 0.5), ('pear', 100, 27, 0.2, 0.6)]
+
+# Merging rewrites the catalog file once, keeping or overwriting existing items, and empties the log.
+def test_merge(catalog):
+    catalog.add(food_item.FoodItem('apple', 95, 25, 0.3, 0.5))
+    merged = catalog.merge({'apple': food_item.FoodItem('apple', 1, 1, 1, 1), 'kiwi': food_item.FoodItem('kiwi', 42, 10, 0.4, 0.8)}, False)
+    assert merged == (1, 0, 1)
+    assert not os.path.exists(catalog.log_filepath())
+    assert values_of(reopened()) == [('apple', 95, 25, 0.3, 0.5), ('kiwi', 42, 10, 0.4, 0.8)]
+
+    merged = catalog.merge({'apple': food_item.FoodItem('apple', 1, 1, 1, 1)}, True)
+    assert merged == (0, 1, 0)
+    assert values_of(reopened()) == [('apple', 1, 1, 1, 1), ('kiwi', 42, 10, 0.4, 0.8)]
+    assert [fooditem.name for fooditem in catalog.search('kiw', 5)] == ['kiwi']
\ No newline at end of file
@@ -0,0 +1,103 @@
+import food_search
+import random
+
+NAMES=['apple', 'apple_pie', 'green_apple', 'applesauce', 'pineapple', 'banana', 'banana_bread', 'chicken_breast',
+    'chicken_noodle_soup', 'bread', 'broccoli', 'brown_rice']
+
+# Returns the Levenshtein distance between a and b, computed in full.
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+        previous = current
+    return previous[-1]
+
+# The bounded distance is exact up to its bound, and bound + 1 beyond it.
+def test_bounded_edit_distance_matches_levenshtein():
+    rng = random.Random(7)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abc_') for _ in range(rng.randint(0, 9)))
+        b = ''.join(rng.choice('abc_') for _ in range(rng.randint(0, 9)))
+        for max_distance in range(4):
+            assert food_search.bounded_edit_distance(a, b, max_distance) == min(edit_distance(a, b), max_distance + 1), (a, b, max_distance)
+
+# Edge cases of the bound: identical strings, empty strings, and lengths too far apart to be compared.
+def test_bounded_edit_distance_edges():
+    assert food_search.bounded_edit_distance('apple', 'apple', 0) == 0
+    assert food_search.bounded_edit_distance('', 'ab', 2) == 2
+    assert food_search.bounded_edit_distance('', 'abc', 2) == 3
+    assert food_search.bounded_edit_distance('apple', 'apply', 0) == 1
+    assert food_search.bounded_edit_distance('kitten', 'sitting', 2) == 3
+    assert food_search.bounded_edit_distance('kitten', 'sitting', 3) == 3
+
+# Short queries allow no typos, medium ones a single typo and long ones two.
+def test_allowed_typos():
+    assert [food_search.allowed_typos(length) for length in [1, 2, 3, 7, 8, 20]] == [0, 0, 1, 1, 2, 2]
+
+# A query matches the start of any word of a name, with names starting with it ranked first, then shorter names.
+def test_prefix_matches_rank_name_starts_first():
+    index = food_search.FoodSearchIndex(NAMES)
+    assert index.prefix_matches('apple') == ['apple', 'apple_pie', 'applesauce', 'green_apple']
+    assert index.prefix_matches('Chicken B') == ['chicken_breast']
+    assert index.prefix_matches('bre') == ['bread', 'banana_bread', 'chicken_breast']
+    assert index.prefix_matches('apple', 2) == ['apple', 'apple_pie']
+    assert index.prefix_matches('zucchini') == []
+
+# Prefixes shorter than, as long as and longer than the trie depth are all found within the shared buckets.
+def test_prefix_matches_across_trie_depths():
+    index = food_search.FoodSearchIndex(NAMES)
+    for length in range(1, len('chicken_noodle') + 1):
+        query = 'chicken_noodle'[:length]
+        expected = sorted(name for name in NAMES if any(key.startswith(query) for key in food_search.word_keys(name)))
+        assert sorted(index.prefix_matches(query, len(NAMES))) == expected, query
+
+# Fuzzy matches are within the typos allowed for the query's length, ranked by distance.
+def test_fuzzy_matches_respect_the_typo_bound():
+    index = food_search.FoodSearchIndex(NAMES)
+    assert index.fuzzy_matches('banan') == ['banana']
+    assert index.fuzzy_matches('brocoli') == ['broccoli']
+    assert index.fuzzy_matches('brocolli') == ['broccoli']
+    assert index.fuzzy_matches('bnaaan') == []
+    assert index.fuzzy_matches('chiken_brest') == ['chicken_breast']
+    assert index.fuzzy_matches('chikn_brst') == []
+    assert index.fuzzy_matches('ap') == []
+
+# Every name within the allowed typos is found by the trigram filter, however rare its trigrams.
+def test_fuzzy_matches_find_every_name_within_bound():
+    rng = random.Random(11)
+    names = [''.join(rng.choice('abcdefgh') for _ in range(rng.randint(3, 12))) for _ in range(300)]
+    index = food_search.FoodSearchIndex(names)
+    for query in names[:50]:
+        typo = rng.randrange(len(query))
+        query = query[:typo] + rng.choice('xyz') + query[typo + 1:]
+        max_distance = food_search.allowed_typos(len(query))
+        expected = set(name for name in names if edit_distance(query, name) <= max_distance)
+        assert set(index.fuzzy_matches(query, len(names))) == expected, query
+
+# Search returns prefix matches ahead of fuzzy ones, without duplicates and up to the limit.
+def test_search_combines_prefix_and_fuzzy_matches():
+    index = food_search.FoodSearchIndex(NAMES)
+    assert index.search('brea') == ['bread', 'banana_bread', 'chicken_breast']
+    assert index.search('bred') == ['bread']
+    assert index.search('apple', 3) == ['apple', 'apple_pie', 'applesauce']
+    assert index.search('', 5) == []
+    assert index.search('apple', 0) == []
+
+# Removed names are no longer found by prefix or typo, and adding names one at a time matches adding them at once.
+def test_add_and_remove():
+    index = food_search.FoodSearchIndex()
+    for name in NAMES:
+        index.add(name)
+    index.add('apple')
+    assert index.size() == len(NAMES)
+    bulk_index = food_search.FoodSearchIndex(NAMES)
+    for query in ['a', 'app', 'bread', 'chicken_n', 'brocoli']:
+        assert index.search(query) == bulk_index.search(query)
+    index.remove('broccoli')
+    index.remove('apple')
+    index.remove('missing')
+    assert index.size() == len(NAMES) - 2
+    assert index.search('brocoli') == []
+    assert 'apple' not in index.search('apple')
\ No newline at end of file
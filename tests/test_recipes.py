@@ -0,0 +1,117 @@
+import food_item
+import food_processor
+import recipes
+import reference_catalog
+import status
+import storage_backend
+
+INGREDIENTS={'egg': food_item.FoodItem('egg', 78, 0.5, 5, 6), 'toast': food_item.FoodItem('toast', 80, 14, 1, 3)}
+
+# Stands in for a storage backend holding the provided recipes, whose version is changed by hand.
+class FakeBackend:
+    def __init__(self, saved_recipes):
+        self.saved_recipes = saved_recipes
+        self.version = 0
+
+    def recipes(self):
+        return list(self.saved_recipes)
+
+    def save_recipe(self, recipe):
+        self.saved_recipes.append(recipe)
+
+# Returns an ingredient lookup over INGREDIENTS which records the name of every ingredient looked up.
+def counting_lookup(lookups):
+    def get_ingredient(name):
+        lookups.append(name)
+        return INGREDIENTS.get(name)
+    return get_ingredient
+
+# Returns a RecipeBook over a FakeBackend holding a breakfast of two eggs and a toast.
+def breakfast_book():
+    backend = FakeBackend([recipes.Recipe('breakfast', [('egg', 200.0), ('toast', 100.0)])])
+    return recipes.RecipeBook(backend, lambda: backend.version)
+
+# The nutrition of a recipe is computed once, then served from the memo until one of its ingredients changes.
+def test_nutrition_is_memoized_until_an_ingredient_changes():
+    book = breakfast_book()
+    lookups = []
+    assert book.food_item('breakfast', counting_lookup(lookups)).calories() == 236
+    assert book.food_item('breakfast', counting_lookup(lookups)).calories() == 236
+    assert lookups == ['egg', 'toast']
+    assert book.invalidate(['banana']) == 0
+    book.food_item('breakfast', counting_lookup(lookups))
+    assert len(lookups) == 2
+    assert book.invalidate(['egg']) == 1
+    book.food_item('breakfast', counting_lookup(lookups))
+    assert len(lookups) == 4
+
+# A change of version, e.g. made by another process, drops every memoized nutrition and reloads the recipes.
+def test_version_changes_drop_the_memo():
+    book = breakfast_book()
+    lookups = []
+    book.food_item('breakfast', counting_lookup(lookups))
+    book.backend.saved_recipes.append(recipes.Recipe('eggs', [('egg', 300.0)]))
+    assert book.get('eggs') is None
+    book.backend.version += 1
+    assert book.food_item('eggs', counting_lookup(lookups)).calories() == 234
+    book.food_item('breakfast', counting_lookup(lookups))
+    assert lookups == ['egg', 'toast', 'egg', 'egg', 'toast']
+
+# Nutrition computed while one of its ingredients changes is returned but not memoized, as it may be stale.
+def test_nutrition_computed_during_a_change_is_not_memoized():
+    book = breakfast_book()
+    lookups = []
+    def changing_lookup(name):
+        book.invalidate([name])
+        return counting_lookup(lookups)(name)
+    assert book.food_item('breakfast', changing_lookup).calories() == 236
+    book.food_item('breakfast', counting_lookup(lookups))
+    assert lookups == ['egg', 'toast', 'egg', 'toast']
+
+# Redefining a recipe replaces its edges in the dependency graph along with its memoized nutrition.
+def test_redefined_recipes_drop_their_old_ingredients():
+    book = breakfast_book()
+    lookups = []
+    book.food_item('breakfast', counting_lookup(lookups))
+    book.define(recipes.Recipe('breakfast', [('toast', 200.0)]))
+    assert book.food_item('breakfast', counting_lookup(lookups)).calories() == 160
+    assert book.invalidate(['egg']) == 0
+    assert book.invalidate(['toast']) == 1
+
+# Returns the calories of the named recipe as looked up through the configured backend.
+def recipe_calories(name):
+    return food_processor.try_get_food_item(name).calories()
+
+# Changes made through food_processor, or by another process through a backend of its own, are seen by the next lookup.
+def test_recipes_follow_changes_to_their_ingredients(backend_name):
+    for fooditem in INGREDIENTS.values():
+        food_processor.try_save_food_item(fooditem)
+    assert food_processor.try_add_recipe('breakfast', ['egg:200', 'toast']).calories() == 236
+    assert recipe_calories('breakfast') == 236
+
+    food_processor.try_save_food_item(food_item.FoodItem('egg', 70, 0.5, 5, 6), True)
+    assert recipe_calories('breakfast') == 220
+
+    other_process = storage_backend.create_backend(backend_name)
+    try:
+        other_process.replace_food_item(food_item.FoodItem('toast', 100, 14, 1, 3))
+        assert recipe_calories('breakfast') == 240
+        other_process.save_recipe(recipes.Recipe('eggs', [('egg', 300.0)]))
+        assert recipe_calories('eggs') == 210
+        other_process.remove_food_item('toast')
+        assert food_processor.try_get_food_item('breakfast') is None
+    finally:
+        other_process.close()
+
+# Rebuilding the reference catalog changes the nutrition of the recipes using its food items.
+def test_recipes_follow_reference_catalog_rebuilds(backend_name, data_dir):
+    source_filepath = str(data_dir / 'reference.csv')
+    # Writes the reference catalog dump with the given calories for oats, and builds the catalog from it
+    def build_reference(calories):
+        with open(source_filepath, 'w') as output:
+            output.write('oats,{0},66,7,17\n'.format(calories))
+        assert not isinstance(reference_catalog.build_reference_catalog(source_filepath, reference_catalog.reference_filepath(), 1), status.Status)
+    build_reference(389)
+    assert food_processor.try_add_recipe('porridge', ['oats:50']).calories() == 194.5
+    build_reference(400)
+    assert recipe_calories('porridge') == 200
\ No newline at end of file
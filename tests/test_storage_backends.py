@@ -0,0 +1,98 @@
+import datetime
+import fileutils
+import food_item
+import food_processor
+import goal_trends
+import nutrition_accessor
+import status
+import storage_backend
+
+# Values are multiples of a half, so that totals are exact whichever order a backend sums them in.
+FOODS=[('apple', 95, 25, 0.5, 0.5), ('banana', 105, 27, 0.5, 1.5), ('egg', 78, 0.5, 5, 6), ('toast', 80, 14, 1, 3)]
+MEALS=[(None, datetime.date(2024, 9, 29), 'apple', 100), (None, datetime.date(2024, 9, 29), 'egg', 200),
+    (None, datetime.date(2024, 9, 30), 'toast', 50), (None, datetime.date(2024, 10, 1), 'breakfast', 100),
+    (None, datetime.date(2024, 10, 1), 'apple', 100), ('alice', datetime.date(2024, 10, 1), 'banana', 100)]
+
+# Returns the values of the provided NutritionInformation as a tuple, for comparison.
+def values(nutrition_info):
+    return (nutrition_info.calories, nutrition_info.carbs, nutrition_info.fats, nutrition_info.proteins)
+
+# Returns the values of the provided PeriodSummary as a tuple, for comparison.
+def period_values(summary):
+    return (summary.label, summary.days, summary.entries, values(summary.total))
+
+# Runs the same sequence of operations through the configured backend, returning everything it reads back.
+def run_scenario():
+    observed = {}
+    for fooditem in FOODS:
+        assert food_processor.try_save_food_item(food_item.FoodItem(*fooditem)).okay()
+    assert food_processor.try_save_food_item(food_item.FoodItem('egg', 70, 0.5, 5, 6), True).okay()
+    assert food_processor.try_save_food_item(food_item.FoodItem('kiwi', 42, 10, 0.5, 1)).okay()
+    assert food_processor.remove_food_item('kiwi').okay()
+    observed['merged'] = food_processor.backend().merge_food_items({'apple': food_item.FoodItem('apple', 1, 1, 1, 1),
+        'pear': food_item.FoodItem('pear', 100, 27, 0.5, 0.5)}, False)
+    observed['foods'] = sorted((fooditem.name,) + values(fooditem.nutrition_information) for fooditem in food_processor.backend().food_items())
+    observed['search'] = [fooditem.name for fooditem in food_processor.try_search_food_items('ap')]
+    observed['fuzzy search'] = [fooditem.name for fooditem in food_processor.try_search_food_items('bananna')]
+    observed['recipe'] = values(food_processor.try_add_recipe('breakfast', ['egg:200', 'toast']).nutrition_information)
+
+    nutrition_accessor.set_goals(300, 60, 10, 10)
+    for user_name, date, food_name, percent in MEALS:
+        fileutils.set_current_user(user_name)
+        assert food_processor.try_process_food_eaten(food_name, percent, date).okay()
+    fileutils.set_current_user(None)
+
+    for date in [datetime.date(2024, 9, 29), datetime.date(2024, 10, 1)]:
+        report = nutrition_accessor.get_status_report(date, True)
+        observed[('report', date)] = (values(report.total), values(report.goal_delta()),
+            [(name, values(nutrition_info)) for name, nutrition_info in report.breakdown.items()])
+    observed['missing report'] = nutrition_accessor.get_status_report(datetime.date(2024, 9, 28)).okay()
+    daily, weekly, monthly, overall = nutrition_accessor.summarize_range(datetime.date(2024, 9, 1), datetime.date(2024, 10, 31))
+    observed['range'] = ([period_values(summary) for summary in daily], [period_values(summary) for summary in weekly],
+        [period_values(summary) for summary in monthly], period_values(overall))
+    observed['rollups'] = [(date, rollup.entries, values(rollup.nutrition_information))
+        for date, rollup in food_processor.backend().daily_rollups(datetime.date(2024, 9, 30), datetime.date(2024, 10, 1))]
+    observed['dates'] = food_processor.backend().consumption_dates()
+    observed['entries'] = [(name, values(nutrition_info)) for name, nutrition_info in food_processor.backend().consumption_entries(datetime.date(2024, 10, 1))]
+    trends = nutrition_accessor.get_trends()
+    observed['trends'] = (trends.latest_date, trends.adherence(), [(average.days, values(average.total)) for average in trends.averages])
+    observed['rebuilt trends'] = goal_trends.rebuild_trends(food_processor.backend()).to_csv()
+    observed['users'] = food_processor.backend().user_names()
+
+    fileutils.set_current_user('alice')
+    observed['alice'] = (values(nutrition_accessor.get_daily_nutrition_information(datetime.date(2024, 10, 1))),
+        isinstance(nutrition_accessor.get_goal_nutrition_information(), status.Status))
+    fileutils.set_current_user(None)
+    return observed
+
+# Returns what run_scenario reads back through the named backend, over its own subdirectory of the data directory.
+def scenario_through(backend_name, data_dir, monkeypatch):
+    monkeypatch.setenv(storage_backend.BACKEND_ENVIRONMENT_VARIABLE, backend_name)
+    fileutils.set_custom_data_dirpath(str(data_dir / backend_name))
+    return run_scenario()
+
+# Both backends give the same answers to the same sequence of operations.
+def test_backends_agree(data_dir, monkeypatch):
+    csv_observed = scenario_through(storage_backend.CSV_BACKEND, data_dir, monkeypatch)
+    sqlite_observed = scenario_through(storage_backend.SQLITE_BACKEND, data_dir, monkeypatch)
+    assert set(csv_observed) == set(sqlite_observed)
+    for key in csv_observed:
+        assert csv_observed[key] == sqlite_observed[key], key
+
+# The scenario itself reads back what was written, so that agreeing backends are also right.
+def test_scenario_results(backend_name):
+    observed = run_scenario()
+    assert observed['merged'] == (1, 0, 1)
+    assert observed['foods'] == [('apple', 95, 25, 0.5, 0.5), ('banana', 105, 27, 0.5, 1.5), ('egg', 70, 0.5, 5, 6), ('pear', 100, 27, 0.5, 0.5),
+        ('toast', 80, 14, 1, 3)]
+    assert observed['search'] == ['apple']
+    assert observed['fuzzy search'] == ['banana']
+    assert observed['recipe'] == (220, 15, 11, 15)
+    assert observed[('report', datetime.date(2024, 9, 29))][0] == (235, 26, 10.5, 12.5)
+    assert observed[('report', datetime.date(2024, 10, 1))][2] == [('breakfast', (220, 15, 11, 15)), ('apple', (95, 25, 0.5, 0.5))]
+    assert not observed['missing report']
+    assert [label for label, _, _, _ in observed['range'][1]] == ['Week of 9-23-2024', 'Week of 9-30-2024']
+    assert observed['range'][3][1:] == (3, 5, (590, 73, 22.5, 29.5))
+    assert observed['dates'] == [datetime.date(2024, 9, 29), datetime.date(2024, 9, 30), datetime.date(2024, 10, 1)]
+    assert observed['users'] == [None, 'alice']
+    assert observed['alice'] == ((105, 27, 0.5, 1.5), True)
\ No newline at end of file